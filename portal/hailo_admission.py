@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Admission control in front of the HVAC ensemble
+Coalesces concurrent diagnose() requests for the same equipment and input
+into one ensemble run (single-flight) and checks each request's deadline
+against the predicted wait, answering requests that cannot make it from the
+cache or with a gate-only partial diagnosis instead of queueing them behind
+the device
+"""
+
+import copy
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# What to do with a request whose deadline cannot be met
+OVERLOAD_POLICIES = ('degrade', 'shed')
+
+DEFAULT_DEADLINE_MS = float(os.environ.get('APOLLO_DEADLINE_MS', 0)) or None
+
+# Results older than the cache TTL are still preferred to shedding, up to this age
+STALE_SECONDS = float(os.environ.get('APOLLO_STALE_SECONDS', 900))
+
+# Weight of the newest observation in the service time averages
+EWMA_ALPHA = 0.2
+
+# Cascade threshold above any sigmoid confidence: the gate never escalates,
+# so only the gate models run (unless one of them fails)
+GATE_ONLY_THRESHOLD = 2.0
+
+
+class AdmissionRejected(Exception):
+    """A request was shed because its deadline could not be met"""
+
+
+class AdmissionController:
+    """Single-flight and deadline admission for diag.diagnose()
+
+    Requests are identical when equipment ID, mode, cascade threshold,
+    cache use and the prepared input row all match; the first becomes the
+    leader and runs the ensemble, the rest wait for its result. A request's
+    predicted latency is the mode's recent service time stretched by the
+    ensemble runs already executing, shared across `parallelism` workers.
+    When that exceeds the time left before the deadline, the 'degrade'
+    policy answers from the cache (accepting entries up to stale_seconds
+    old), then with a cascade gate-only run if that is predicted to fit,
+    and sheds otherwise; the 'shed' policy sheds straight away.
+    """
+
+    def __init__(self, diag, parallelism=4, default_deadline_ms=DEFAULT_DEADLINE_MS, policy='degrade',
+                 stale_seconds=STALE_SECONDS, clock=time.monotonic):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f'Unknown overload policy: {policy}')
+        self.diag = diag
+        self.parallelism = max(1, parallelism)
+        self.default_deadline_ms = default_deadline_ms
+        self.policy = policy
+        self.stale_seconds = stale_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.running = 0
+        self.service_ms = {}
+        self.stats = {
+            'admitted': 0,
+            'coalesced': 0,
+            'degraded_cache': 0,
+            'degraded_partial': 0,
+            'shed': 0,
+            'deadline_missed': 0,
+        }
+
+    def flight_key(self, input_row, mode, cascade_threshold, equipment_id, use_cache):
+        return (equipment_id, mode, cascade_threshold, bool(use_cache), input_row.tobytes())
+
+    def predict_ms(self, mode, running=None):
+        """Expected latency of a new run in this mode, or None before any run has been timed"""
+        with self.lock:
+            service_ms = self.service_ms.get(mode)
+            running = self.running if running is None else running
+        if service_ms is None:
+            return None
+        return service_ms * (1 + running / self.parallelism)
+
+    def _observe(self, mode, elapsed_ms):
+        with self.lock:
+            previous = self.service_ms.get(mode)
+            self.service_ms[mode] = elapsed_ms if previous is None else previous + EWMA_ALPHA * (elapsed_ms - previous)
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def diagnose(self, sensor_data, mode='sequential', cascade_threshold=None, equipment_id=None, use_cache=True,
+                 deadline_ms=None, received_at=None):
+        """diag.diagnose() behind single-flight and deadline admission
+
+        deadline_ms counts from received_at (a clock() reading taken when
+        the request arrived, default now). Results carry an 'admission'
+        block saying how they were produced; raises AdmissionRejected when
+        the request is shed.
+        """
+        start = self.clock() if received_at is None else received_at
+        deadline_ms = self.default_deadline_ms if deadline_ms is None else deadline_ms
+        deadline = None if deadline_ms is None else start + deadline_ms / 1000.0
+        input_row = self.diag.prepare_sensor_data(sensor_data)[0]
+        key = self.flight_key(input_row, mode, cascade_threshold, equipment_id, use_cache)
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                flight.started = self.clock()
+                running = self.running
+        if leader:
+            remaining_ms = self._remaining_ms(deadline)
+            predicted = self.predict_ms(mode, running)
+            if remaining_ms is not None and predicted is not None and predicted > remaining_ms:
+                return self._overloaded(sensor_data, input_row, mode, cascade_threshold, equipment_id,
+                                        remaining_ms, predicted)
+            with self.lock:
+                # Another leader may have registered while we were deciding
+                existing = self.flights.get(key)
+                if existing is None:
+                    self.flights[key] = flight
+                    self.running += 1
+                    self.stats['admitted'] += 1
+                else:
+                    flight, leader = existing, False
+            if leader:
+                return self._lead(key, flight, sensor_data, mode, cascade_threshold, equipment_id, use_cache)
+
+        return self._follow(flight, sensor_data, input_row, mode, cascade_threshold, equipment_id, deadline)
+
+    def _remaining_ms(self, deadline):
+        if deadline is None:
+            return None
+        return (deadline - self.clock()) * 1000.0
+
+    def _lead(self, key, flight, sensor_data, mode, cascade_threshold, equipment_id, use_cache):
+        try:
+            result = self.diag.diagnose(sensor_data, mode=mode, cascade_threshold=cascade_threshold,
+                                        equipment_id=equipment_id, use_cache=use_cache)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                self.running -= 1
+        flight.set_result(result)
+        # Cache hits say nothing about how long the device takes
+        if not result.get('cache', {}).get('hit'):
+            self._observe(mode, (self.clock() - flight.started) * 1000.0)
+        result = copy.deepcopy(result)
+        result['admission'] = {'outcome': 'admitted'}
+        return result
+
+    def _follow(self, flight, sensor_data, input_row, mode, cascade_threshold, equipment_id, deadline):
+        self._count('coalesced')
+        remaining_ms = self._remaining_ms(deadline)
+        try:
+            result = flight.result(timeout=None if remaining_ms is None else max(0.0, remaining_ms) / 1000.0)
+        except FutureTimeout:
+            self._count('deadline_missed')
+            return self._overloaded(sensor_data, input_row, mode, cascade_threshold, equipment_id, 0.0, None,
+                                    allow_partial=False)
+        result = copy.deepcopy(result)
+        result['admission'] = {'outcome': 'coalesced'}
+        return result
+
+    def _overloaded(self, sensor_data, input_row, mode, cascade_threshold, equipment_id, remaining_ms, predicted_ms,
+                    allow_partial=True):
+        """Answer a request that would miss its deadline"""
+        detail = {
+            'remaining_ms': round(max(remaining_ms, 0.0), 2),
+            'predicted_ms': None if predicted_ms is None else round(predicted_ms, 2),
+        }
+        if self.policy == 'degrade':
+            cache = self.diag.cache
+            if cache is not None:
+                key = cache.make_key(equipment_id, input_row, (mode, cascade_threshold))
+                cached = cache.get(key, max_age_s=max(self.stale_seconds, cache.ttl_seconds))
+                if cached is not None:
+                    self._count('degraded_cache')
+                    cached['admission'] = dict(detail, outcome='cache')
+                    return cached
+
+            partial_ms = self.predict_ms('partial')
+            if allow_partial and (partial_ms is None or partial_ms <= remaining_ms):
+                started = self.clock()
+                with self.lock:
+                    self.running += 1
+                try:
+                    # Not attributed to the unit: a gate-only run is not a full diagnosis
+                    # and must not be recorded as one
+                    result = self.diag.diagnose(sensor_data, mode='cascade', cascade_threshold=GATE_ONLY_THRESHOLD,
+                                                equipment_id=None, use_cache=False)
+                finally:
+                    with self.lock:
+                        self.running -= 1
+                    self._observe('partial', (self.clock() - started) * 1000.0)
+                self._count('degraded_partial')
+                result['admission'] = dict(detail, outcome='partial')
+                return result
+
+        self._count('shed')
+        if predicted_ms is None:
+            raise AdmissionRejected('Deadline passed while waiting for an identical in-flight request')
+        raise AdmissionRejected(f"Deadline cannot be met: {detail['remaining_ms']} ms left, "
+                                f"{detail['predicted_ms']} ms predicted")
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats,
+                        in_flight=len(self.flights),
+                        running=self.running,
+                        service_ms={mode: round(ms, 2) for mode, ms in self.service_ms.items()},
+                        policy=self.policy,
+                        default_deadline_ms=self.default_deadline_ms)
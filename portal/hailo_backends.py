@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Inference backends for the HVAC diagnostic ensemble
+HailoBackend drives a Hailo-8 through HailoRT; SimulatedBackend is a NumPy
+stand-in with the same interface for development machines without an NPU
+"""
+
+import os
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from hailo_features import FEATURE_SCHEMA, INPUT_FEATURES
+from hailo_metrics import METRICS
+from hailo_quant import PROBABILITY_PARAMS, UINT8_MAX, QuantParams, Quantizer, dequantize, quant_params_from_info
+
+# Try to import Hailo modules if available
+try:
+    from hailo_platform import HEF, VDevice, HailoStreamInterface, InferVStreams, ConfigureParams, InputVStreamParams, OutputVStreamParams, FormatType
+    HAILO_AVAILABLE = True
+except ImportError:
+    HAILO_AVAILABLE = False
+
+# Exchange UINT8 instead of FLOAT32 with the device (see hailo_quant)
+QUANTIZED_IO = os.environ.get('APOLLO_QUANTIZED_IO', '0').lower() in ('1', 'true', 'yes')
+
+
+class ModelPipeline:
+    """Per-model inference pipeline created once and reused for every call
+
+    Subclasses set up their device resources in __init__ and release them in
+    close(). infer() takes a (N, 32) float32 array and returns (N, outputs)
+    float32; quantized pipelines convert to and from uint8 on the way.
+    """
+
+    def __init__(self, backend, model_name):
+        self.backend = backend
+        self.model_name = model_name
+        # Frames per device transfer; infer() accepts any N and splits by this
+        self.batch_size = 1
+        # True when the device exchanges uint8 and the host does the conversion
+        self.quantized = False
+        self.setup_time_ms = 0.0
+        self.calls = 0
+        self.switches = 0
+        self.closed = False
+
+    def infer(self, input_data):
+        raise NotImplementedError
+
+    def activate(self):
+        """Make this model's network group the active one on the device"""
+
+    def deactivate(self):
+        """Release the device so another network group can be activated"""
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class InferenceBackend:
+    """Interface shared by all device backends
+
+    A backend owns the device handle, loads one ModelPipeline per model and
+    tracks which network group is currently active. With manual activation
+    only one network group can run at a time, so switching is serialized under
+    the backend lock and counted on the pipeline being activated.
+    """
+
+    name = 'base'
+    device_name = 'Unknown'
+    requires_model_files = True
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.manual_activation = True
+        self.active = None
+        self.is_open = False
+
+    def open(self):
+        self.is_open = True
+
+    def parse_model(self, model_name, model_path):
+        """Read and validate a model file without touching the device
+
+        Safe to call from several threads at once; the result is passed to
+        configure_model().
+        """
+        return model_path
+
+    def configure_model(self, model_name, parsed):
+        """Configure a parsed model on the device and return its ModelPipeline"""
+        raise NotImplementedError
+
+    def load_model(self, model_name, model_path):
+        return self.configure_model(model_name, self.parse_model(model_name, model_path))
+
+    def ensure_active(self, pipeline):
+        """Activate pipeline if needed; returns True when a switch happened"""
+        if not self.manual_activation or self.active is pipeline:
+            return False
+        with METRICS.timer('activation', pipeline.model_name):
+            if self.active is not None:
+                self.active.deactivate()
+                self.active = None
+            pipeline.activate()
+        self.active = pipeline
+        pipeline.switches += 1
+        return True
+
+    def release(self, pipeline):
+        """Deactivate pipeline if it currently owns the device"""
+        with self.lock:
+            if self.active is pipeline:
+                pipeline.deactivate()
+                self.active = None
+
+    def get_temperature(self):
+        return None
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class HailoPipeline(ModelPipeline):
+    """Holds vstream params, vstream names and an open InferVStreams pipeline
+
+    With quantized=True the vstreams carry UINT8 and the HEF's quantization
+    parameters, read once here, are applied on the host.
+    """
+
+    def __init__(self, backend, model_name, network_group, batch_size=1, quantized=False):
+        super().__init__(backend, model_name)
+        start_time = time.perf_counter()
+
+        self.network_group = network_group
+        self.batch_size = max(1, batch_size)
+        self.quantized = quantized
+        format_type = FormatType.UINT8 if quantized else FormatType.FLOAT32
+        self.input_params = InputVStreamParams.make(network_group, format_type=format_type)
+        self.output_params = OutputVStreamParams.make(network_group, format_type=format_type)
+        input_info = network_group.get_input_vstream_infos()[0]
+        output_info = network_group.get_output_vstream_infos()[0]
+        self.input_name = input_info.name
+        self.output_name = output_info.name
+        if quantized:
+            self.quantizer = Quantizer(quant_params_from_info(input_info), INPUT_FEATURES)
+            self.output_quant = quant_params_from_info(output_info)
+
+        self._infer_vstreams = InferVStreams(network_group, self.input_params, self.output_params)
+        self._pipeline = self._infer_vstreams.__enter__()
+        self._activation = None
+
+        self.setup_time_ms = (time.perf_counter() - start_time) * 1000
+
+    def infer(self, input_data):
+        if not self.quantized:
+            return self._infer(input_data)
+        with self.quantizer.lock:
+            with METRICS.timer('quantize', self.model_name):
+                input_data = self.quantizer.quantize(input_data)
+            output = self._infer(input_data)
+        with METRICS.timer('dequantize', self.model_name):
+            return dequantize(output, self.output_quant)
+
+    def _infer(self, input_data):
+        if self.backend.manual_activation:
+            with self.backend.lock:
+                self.backend.ensure_active(self)
+                with METRICS.timer('device_infer', self.model_name):
+                    output = self._pipeline.infer({self.input_name: input_data})
+        else:
+            # HailoRT's model scheduler multiplexes network groups itself
+            with METRICS.timer('device_infer', self.model_name):
+                output = self._pipeline.infer({self.input_name: input_data})
+        self.calls += 1
+        return output[self.output_name]
+
+    def activate(self):
+        self._activation = self.network_group.activate()
+        self._activation.__enter__()
+
+    def deactivate(self):
+        if self._activation is not None:
+            activation, self._activation = self._activation, None
+            activation.__exit__(None, None, None)
+
+    def close(self):
+        if self.closed:
+            return
+        self.backend.release(self)
+        try:
+            self._infer_vstreams.__exit__(None, None, None)
+        except Exception as e:
+            print(f"Error closing pipeline for {self.model_name}: {e}", file=sys.stderr)
+        super().close()
+
+
+class HailoBackend(InferenceBackend):
+    """Hailo-8 accelerator accessed through a HailoRT VDevice"""
+
+    name = 'hailo'
+    device_name = 'Hailo-8'
+
+    def __init__(self, batch_size=None, device_id=None, quantized=False):
+        super().__init__()
+        self.target = None
+        # None keeps the batch size compiled into each HEF
+        self.batch_size = batch_size
+        # PCIe address such as '0000:01:00.0'; None lets HailoRT pick the device
+        self.device_id = device_id
+        # Exchange UINT8 with the device and (de)quantize on the host
+        self.quantized = quantized
+
+    def open(self):
+        # Create VDevice (virtual device)
+        params = VDevice.create_params()
+        # Don't set scheduling algorithm directly - use default. When the
+        # HailoRT model scheduler is active it owns activation and switching.
+        algorithm = getattr(params, 'scheduling_algorithm', None)
+        self.manual_activation = algorithm is None or str(algorithm).endswith('NONE')
+        if self.device_id:
+            self.target = VDevice(params, device_ids=[self.device_id])
+        else:
+            self.target = VDevice(params)
+        self.is_open = True
+
+    def parse_model(self, model_name, model_path):
+        return HEF(model_path)
+
+    def configure_model(self, model_name, hef):
+        configure_params = ConfigureParams.create_from_hef(hef, interface=HailoStreamInterface.PCIe)
+        if self.batch_size:
+            for params in configure_params.values():
+                params.batch_size = self.batch_size
+        batch_size = max(getattr(params, 'batch_size', 1) or 1 for params in configure_params.values())
+        network_group = self.target.configure(hef, configure_params)[0]
+        return HailoPipeline(self, model_name, network_group, batch_size=batch_size, quantized=self.quantized)
+
+    def get_temperature(self):
+        if self.target is not None and hasattr(self.target, 'get_chip_temperature'):
+            return self.target.get_chip_temperature()
+        return None
+
+    def close(self):
+        if self.target is not None:
+            try:
+                self.target.release()
+            except Exception as e:
+                print(f"Error releasing Hailo device: {e}", file=sys.stderr)
+            self.target = None
+        super().close()
+
+
+def simulated_weights(model_name):
+    """Weights of the simulated network, seeded from the model name so every process agrees"""
+    rng = np.random.default_rng(zlib.crc32(model_name.encode('utf-8')))
+    w1 = rng.normal(0.0, 0.05, size=(INPUT_FEATURES, 16)).astype(np.float32)
+    b1 = rng.normal(0.0, 0.1, size=16).astype(np.float32)
+    w2 = rng.normal(0.0, 0.5, size=(16, 1)).astype(np.float32)
+    b2 = np.float32(rng.normal(-1.0, 0.5))
+    return w1, b1, w2, b2
+
+
+def simulated_quant_params():
+    """Per-feature input quantization standing in for a HEF's calibration
+
+    Each schema feature gets a range around its default; reserved columns
+    cover [0, 1].
+    """
+    low = np.zeros(INPUT_FEATURES, dtype=np.float32)
+    high = np.ones(INPUT_FEATURES, dtype=np.float32)
+    for spec in FEATURE_SCHEMA:
+        span = max(abs(spec.default * spec.scale), 1.0)
+        low[spec.index] = -max(span, 25.0)
+        high[spec.index] = max(4.0 * span, 100.0)
+    scale = (high - low) / np.float32(UINT8_MAX)
+    return QuantParams(scale.astype(np.float32), np.rint(-low / scale).astype(np.float32))
+
+
+class SimulatedPipeline(ModelPipeline):
+    """Deterministic 32-16-1 sigmoid network standing in for a compiled HEF
+
+    When the backend is quantized the simulated device exchanges uint8 like
+    a HEF with UINT8 vstreams: it dequantizes the input with
+    simulated_quant_params() and quantizes its sigmoid output to 1/255 steps.
+    """
+
+    def __init__(self, backend, model_name, weights=None):
+        super().__init__(backend, model_name)
+        start_time = time.perf_counter()
+
+        self.w1, self.b1, self.w2, self.b2 = weights or simulated_weights(model_name)
+        self.batch_size = backend.batch_size
+        self.latency_s = backend.model_latency_ms(model_name) / 1000.0
+        self.quantized = backend.quantized
+        if self.quantized:
+            self.input_quant = simulated_quant_params()
+            self.quantizer = Quantizer(self.input_quant, INPUT_FEATURES)
+            self.output_quant = PROBABILITY_PARAMS
+
+        if backend.setup_ms:
+            time.sleep(backend.setup_ms / 1000.0)
+        self.setup_time_ms = (time.perf_counter() - start_time) * 1000
+
+    def activate(self):
+        if self.backend.switch_ms:
+            time.sleep(self.backend.switch_ms / 1000.0)
+
+    def infer(self, input_data):
+        with self.backend.lock:
+            self.backend.ensure_active(self)
+            if not self.quantized:
+                return self._infer(input_data)
+            with METRICS.timer('quantize', self.model_name):
+                input_data = self.quantizer.quantize(input_data)
+            output = self._infer(input_data)
+        with METRICS.timer('dequantize', self.model_name):
+            return dequantize(output, self.output_quant)
+
+    def _infer(self, input_data):
+        with METRICS.timer('device_infer', self.model_name):
+            if self.latency_s:
+                # One device round-trip per batch_size frames
+                transfers = -(-len(input_data) // self.batch_size)
+                time.sleep(self.latency_s * transfers)
+            if self.quantized:
+                x = dequantize(input_data, self.input_quant)
+            else:
+                x = np.asarray(input_data, dtype=np.float32)
+            # Scale raw engineering units down before the dense layers
+            x = x / np.float32(1000.0)
+            hidden = np.tanh(x @ self.w1 + self.b1)
+            logits = hidden @ self.w2 + self.b2
+            probs = (1.0 / (1.0 + np.exp(-logits))).astype(np.float32)
+            if self.quantized:
+                probs = np.rint(probs * np.float32(UINT8_MAX)).astype(np.uint8)
+        self.calls += 1
+        return probs
+
+
+class SimulatedBackend(InferenceBackend):
+    """NumPy stand-in for the Hailo-8 with configurable per-model latency
+
+    latency_ms may be a number applied to every model or a dict keyed by
+    model name and is charged once per device transfer of batch_size frames.
+    parse_ms, setup_ms and switch_ms emulate model file parsing, pipeline
+    creation and network group activation costs; quantized switches the
+    pipelines to uint8 device I/O.
+    """
+
+    name = 'simulated'
+    device_name = 'Simulated Hailo-8'
+    requires_model_files = False
+
+    def __init__(self, latency_ms=0.0, setup_ms=0.0, switch_ms=0.0, batch_size=8, parse_ms=0.0, quantized=False):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self.parse_ms = parse_ms
+        self.setup_ms = setup_ms
+        self.switch_ms = switch_ms
+
+    def model_latency_ms(self, model_name):
+        if isinstance(self.latency_ms, dict):
+            return float(self.latency_ms.get(model_name, 0.0))
+        return float(self.latency_ms or 0.0)
+
+    def parse_model(self, model_name, model_path):
+        if self.parse_ms:
+            time.sleep(self.parse_ms / 1000.0)
+        return simulated_weights(model_name)
+
+    def configure_model(self, model_name, weights):
+        return SimulatedPipeline(self, model_name, weights)
+
+
+def create_backend(name=None):
+    """Create the backend named by `name` or the APOLLO_BACKEND environment variable"""
+    name = (name or os.environ.get('APOLLO_BACKEND', 'hailo')).lower()
+    if name == 'simulated':
+        return SimulatedBackend(latency_ms=float(os.environ.get('APOLLO_SIM_LATENCY_MS', 0.0)), quantized=QUANTIZED_IO)
+    if name == 'cpu':
+        from hailo_cpu import CpuBackend
+        return CpuBackend()
+    if name == 'hailo':
+        if not HAILO_AVAILABLE:
+            raise RuntimeError('hailo_platform is not installed')
+        batch_size = int(os.environ.get('APOLLO_HEF_BATCH_SIZE', 0))
+        return HailoBackend(batch_size=batch_size or None, quantized=QUANTIZED_IO)
+    raise ValueError(f'Unknown inference backend: {name}')
+
+
+def model_file_size_mb(model_path):
+    """Size of a model file in MB, or None if it does not exist"""
+    path = Path(model_path)
+    if not path.exists():
+        return None
+    return round(path.stat().st_size / (1024 * 1024), 2)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Historical backfill for the HVAC ensemble
+Streams stored sensor_readings from the portal's SQLite database in bounded
+chunks, runs them through the ensemble in batches and writes the diagnoses
+to model_inferences, checkpointing progress so an interrupted run resumes
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hailo_features import FEATURE_INDEX, FEATURE_SCHEMA, INPUT_FEATURES, features_from_columns, normalize_sensor_name
+
+DEFAULT_DB = os.environ.get('APOLLO_SENSOR_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sensor_data.db'))
+
+# Leading number of a stored reading; the portal has written values such as
+# '76.61' or '76.61330.0000' (a reading with a suffix appended)
+_NUMBER = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+
+_CHECKPOINT_TABLE = '''
+    CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+      run_name TEXT PRIMARY KEY,
+      last_id INTEGER NOT NULL,
+      rows_done INTEGER NOT NULL,
+      updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def parse_reading_value(value):
+    """Float value of a stored reading, or None if it is missing or not a number"""
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        match = _NUMBER.match(str(value))
+        if match is None:
+            return None
+        number = float(match.group(1))
+    return number if math.isfinite(number) else None
+
+
+def parse_sensor_values(text):
+    """Decode a sensor_values column into {schema feature: float}
+
+    Accepts both layouts the portal has stored: an object mapping sensor
+    name to value, and a list of reading objects with 'name' and 'value'.
+    Sensors outside the schema and unparseable values are dropped, so the
+    feature takes its schema default.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if isinstance(data, list):
+        data = {item.get('name'): item.get('value') for item in data if isinstance(item, dict)}
+    if not isinstance(data, dict):
+        return {}
+
+    readings = {}
+    for name, value in data.items():
+        key = normalize_sensor_name(name)
+        if key in FEATURE_INDEX:
+            number = parse_reading_value(value)
+            if number is not None:
+                readings[key] = number
+    return readings
+
+
+def pivot_rows(rows, columns, out):
+    """Fill preallocated feature columns from (id, equipment_id, timestamp, sensor_values) rows
+
+    Returns the (N, 32) input batch as a view of `out`.
+    """
+    count = len(rows)
+    for spec in FEATURE_SCHEMA:
+        columns[spec.name][:count] = spec.default
+    for position, row in enumerate(rows):
+        for name, value in parse_sensor_values(row[3]).items():
+            columns[name][position] = value
+    return features_from_columns({name: values[:count] for name, values in columns.items()}, count=count, out=out)
+
+
+def iter_chunks(conn, chunk_size, after_id=0, equipment_id=None, since=None, until=None):
+    """Yield lists of sensor_readings rows in id order, chunk_size at a time
+
+    Keyset pagination (id > last seen id) keeps memory bounded and never
+    holds a read cursor open across the writes between chunks.
+    """
+    conditions = ['id > ?']
+    params = []
+    if equipment_id is not None:
+        conditions.append('equipment_id = ?')
+        params.append(equipment_id)
+    if since is not None:
+        conditions.append('timestamp >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('timestamp < ?')
+        params.append(until)
+    query = (f"SELECT id, equipment_id, timestamp, sensor_values FROM sensor_readings "
+             f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?")
+
+    last_id = after_id
+    while True:
+        rows = conn.execute(query, [last_id] + params + [chunk_size]).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def load_checkpoint(conn, run_name):
+    conn.execute(_CHECKPOINT_TABLE)
+    row = conn.execute('SELECT last_id, rows_done FROM backfill_checkpoints WHERE run_name = ?',
+                       (run_name,)).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def inference_rows(rows, results, inference_time_ms):
+    """model_inferences parameter tuples in the shape server.js stores"""
+    for row, result in zip(rows, results):
+        reading_id, equipment_id, timestamp = row[0], row[1], row[2]
+        result.pop('batch_size', None)
+        result['equipmentId'] = equipment_id
+        result['timestamp'] = datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        result['readingId'] = reading_id
+        result['backfill'] = True
+        result['inferenceTimeMs'] = inference_time_ms
+        yield equipment_id, json.dumps(result), inference_time_ms, timestamp
+
+
+def run_backfill(diag, conn, chunk_size=512, mode='simultaneous', run_name='default', restart=False,
+                 equipment_id=None, since=None, until=None, limit=None, dry_run=False, progress=None):
+    """Diagnose stored readings in chunks and write them to model_inferences
+
+    Each chunk's inserts and its checkpoint commit in one transaction, so a
+    resumed run neither skips nor duplicates readings. Returns a summary dict.
+    """
+    if restart and not dry_run:
+        with conn:
+            conn.execute(_CHECKPOINT_TABLE)
+            conn.execute('DELETE FROM backfill_checkpoints WHERE run_name = ?', (run_name,))
+    last_id, rows_done = (0, 0) if dry_run else load_checkpoint(conn, run_name)
+    resumed_from = last_id
+
+    columns = {spec.name: np.empty(chunk_size, dtype=np.float64) for spec in FEATURE_SCHEMA}
+    batch_buffer = np.empty((chunk_size, INPUT_FEATURES), dtype=np.float32)
+
+    processed = 0
+    inference_s = 0.0
+    start_time = time.perf_counter()
+    for rows in iter_chunks(conn, chunk_size, last_id, equipment_id, since, until):
+        if limit is not None:
+            rows = rows[:limit - processed]
+            if not rows:
+                break
+
+        input_batch = pivot_rows(rows, columns, batch_buffer)
+        inference_start = time.perf_counter()
+        results = diag.diagnose_batch(input_batch, mode=mode)
+        batch_s = time.perf_counter() - inference_start
+        inference_s += batch_s
+
+        last_id = rows[-1][0]
+        processed += len(rows)
+        if not dry_run:
+            per_row_ms = round(batch_s * 1000 / len(rows), 3)
+            with conn:
+                conn.executemany(
+                    "INSERT INTO model_inferences (equipment_id, model_output, inference_time_ms, timestamp) "
+                    "VALUES (?, ?, ?, datetime(?, 'unixepoch'))",
+                    inference_rows(rows, results, per_row_ms))
+                conn.execute(
+                    "INSERT INTO backfill_checkpoints (run_name, last_id, rows_done, updated_at) "
+                    "VALUES (?, ?, ?, datetime('now')) "
+                    "ON CONFLICT(run_name) DO UPDATE SET last_id = excluded.last_id, "
+                    "rows_done = excluded.rows_done, updated_at = excluded.updated_at",
+                    (run_name, last_id, rows_done + processed))
+
+        if progress is not None:
+            elapsed = time.perf_counter() - start_time
+            progress({
+                'rows': processed,
+                'last_id': last_id,
+                'rows_per_s': round(processed / elapsed, 1) if elapsed > 0 else None,
+            })
+        if limit is not None and processed >= limit:
+            break
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        'run_name': run_name,
+        'mode': mode,
+        'dry_run': dry_run,
+        'resumed_from_id': resumed_from,
+        'last_id': last_id,
+        'rows': processed,
+        'rows_total': rows_done + processed,
+        'elapsed_s': round(elapsed, 3),
+        'inference_s': round(inference_s, 3),
+        'rows_per_s': round(processed / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def backfill_main(diag, argv):
+    """Entry point for `hailo_inference.py backfill [options]`"""
+    parser = argparse.ArgumentParser(prog='hailo_inference.py backfill')
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite sensor database')
+    parser.add_argument('--chunk-size', type=int, default=512, help='Readings per batch and transaction')
+    parser.add_argument('--mode', choices=('sequential', 'simultaneous', 'cascade'), default='simultaneous')
+    parser.add_argument('--run-name', default='default', help='Checkpoint name; reruns resume from it')
+    parser.add_argument('--restart', action='store_true', help='Discard the checkpoint and start over')
+    parser.add_argument('--equipment-id', type=int, help='Only this equipment unit')
+    parser.add_argument('--since', type=float, help='Only readings at or after this Unix time')
+    parser.add_argument('--until', type=float, help='Only readings before this Unix time')
+    parser.add_argument('--limit', type=int, help='Stop after this many readings')
+    parser.add_argument('--dry-run', action='store_true', help='Run inference without writing results')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(json.dumps({'error': f'Sensor database not found: {args.db}'}))
+        sys.exit(1)
+    if not diag.initialize():
+        print(json.dumps({'error': 'Failed to initialize Hailo device'}))
+        sys.exit(1)
+
+    def report_progress(status):
+        print(f"backfill: {status['rows']} rows, last id {status['last_id']}, {status['rows_per_s']} rows/s",
+              file=sys.stderr)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        summary = run_backfill(diag, conn, chunk_size=max(1, args.chunk_size), mode=args.mode,
+                               run_name=args.run_name, restart=args.restart, equipment_id=args.equipment_id,
+                               since=args.since, until=args.until, limit=args.limit, dry_run=args.dry_run,
+                               progress=report_progress)
+    except (sqlite3.Error, KeyboardInterrupt) as e:
+        print(json.dumps({'error': f'Backfill stopped: {e or "interrupted"}'}))
+        sys.exit(1)
+    finally:
+        conn.close()
+        diag.close()
+    print(json.dumps(summary))
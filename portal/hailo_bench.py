@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the HVAC inference engine
+Runs against the simulated backend by default so it works on plain Linux
+(CI, dev machines) and emits JSON for regression tracking
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from hailo_backends import HailoBackend, SimulatedBackend
+from hailo_daemon import InferenceDaemon, start_socket, stop_socket
+from hailo_features import FEATURE_SCHEMA, INPUT_FEATURES
+from hailo_inference import MODEL_PATHS, HailoHVACDiagnostics
+from hailo_registry import LOAD_POLICIES
+from hailo_wire import BinaryClient
+
+BENCHMARKS = (
+    'prepare_sensor_data',
+    'prepare_sensor_batch',
+    'run_inference',
+    'diagnose_sequential',
+    'diagnose_simultaneous',
+    'diagnose_cascade',
+    'diagnose_batch',
+    'cold_start',
+    'first_diagnosis',
+    'wire',
+    'quantized',
+)
+
+# Batch sizes for the JSON vs binary wire protocol round-trip benchmark
+WIRE_ROWS = (1, 64, 1024)
+
+
+def summarize(samples_ms, units_per_call=1):
+    """Latency percentiles (ms) and throughput for a list of per-call timings"""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    total_s = samples.sum() / 1000.0
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(float(samples.mean()), 4),
+        'min_ms': round(float(samples.min()), 4),
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+        'max_ms': round(float(samples.max()), 4),
+        'calls_per_s': round(len(samples) / total_s, 2) if total_s > 0 else None,
+        'units_per_s': round(len(samples) * units_per_call / total_s, 2) if total_s > 0 else None,
+    }
+
+
+def measure(func, iterations, warmup=0):
+    """Call func() warmup + iterations times; returns per-call timings in ms"""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def sample_readings(count, seed=0):
+    """Plausible randomized sensor dicts around the schema defaults"""
+    rng = np.random.default_rng(seed)
+    readings = []
+    for _ in range(count):
+        readings.append({
+            spec.name: float(spec.default * rng.uniform(0.8, 1.2)) if spec.unit != 'bool' else float(rng.integers(0, 2))
+            for spec in FEATURE_SCHEMA
+        })
+    return readings
+
+
+def parse_latency(value):
+    """'2.5' -> 2.5 for every model; 'apollo=1,gaia=3' -> per-model dict"""
+    if '=' not in value:
+        return float(value)
+    latency = {}
+    for item in value.split(','):
+        name, ms = item.split('=', 1)
+        latency[name.strip()] = float(ms)
+    return latency
+
+
+def measure_wire(diag, readings, sizes, iterations, warmup):
+    """Daemon round-trips of diagnose_batch over NDJSON vs the binary frame protocol
+
+    Both clients start from what they would naturally hold - sensor dicts for
+    JSON, float32 rows for binary - and end with decoded results.
+    """
+    results = {}
+    daemon = InferenceDaemon(diag, max_workers=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, binary_path = os.path.join(tmp, 'json.sock'), os.path.join(tmp, 'binary.sock')
+        servers = [start_socket(daemon, json_path), start_socket(daemon, binary_path, binary=True)]
+        json_client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        json_client.connect(json_path)
+        json_stream = json_client.makefile('rwb')
+        binary_client = BinaryClient(binary_path)
+        try:
+            for count in sizes:
+                batch = readings[:count]
+                rows = diag.prepare_sensor_batch(batch)
+                request = {'id': 1, 'cmd': 'diagnose_batch', 'sensor_batch': batch, 'mode': 'simultaneous'}
+                sizes_seen = {}
+
+                def json_round_trip():
+                    line = (json.dumps(request) + '\n').encode('utf-8')
+                    json_stream.write(line)
+                    json_stream.flush()
+                    response = json_stream.readline()
+                    sizes_seen['json'] = (len(line), len(response))
+                    return json.loads(response)['result']
+
+                def binary_round_trip():
+                    return binary_client.diagnose(rows, mode='simultaneous')
+
+                results[f'wire_json_{count}'] = dict(
+                    summarize(measure(json_round_trip, iterations, warmup), count),
+                    request_bytes=sizes_seen['json'][0], response_bytes=sizes_seen['json'][1])
+                results[f'wire_binary_{count}'] = dict(
+                    summarize(measure(binary_round_trip, iterations, warmup), count),
+                    request_bytes=4 + 20 + rows.nbytes, response_bytes=4 + 16 + count * (len(MODEL_PATHS) + 1) * 4)
+        finally:
+            binary_client.close()
+            json_stream.close()
+            json_client.close()
+            for server in servers:
+                stop_socket(server)
+            # The benchmark owns diag; only stop the daemon's worker pool
+            daemon.executor.shutdown(wait=True)
+    return results
+
+
+def measure_quantized(config, readings, iterations, warmup):
+    """UINT8 device I/O against FLOAT32 on the same batch: accuracy and throughput
+
+    Accuracy compares the ensemble's confidences, per-model fault flags and
+    final verdicts; throughput times diagnose_columnar() so result dict
+    building does not hide the transfer and conversion costs.
+    """
+    count = len(readings)
+    runs = {}
+    for io_format, quantized in (('float32', False), ('uint8', True)):
+        diag = HailoHVACDiagnostics(backend=make_backend(dict(config, quantized=quantized)), load_policy='eager')
+        if not diag.initialize():
+            raise RuntimeError('Failed to initialize inference backend')
+        try:
+            rows = diag.prepare_sensor_batch(readings)
+            columnar = diag.diagnose_columnar(rows, mode='simultaneous')
+            runs[io_format] = {
+                'confidences': columnar.confidences(),
+                'verdict': columnar.verdict,
+                'timing': summarize(measure(lambda: diag.diagnose_columnar(rows, mode='simultaneous'),
+                                            iterations, warmup), count),
+            }
+        finally:
+            diag.close()
+
+    reference, quantized = runs['float32'], runs['uint8']
+    reported = ~np.isnan(reference['confidences']) & ~np.isnan(quantized['confidences'])
+    error = np.abs(reference['confidences'] - quantized['confidences'])[reported]
+    flags_match = (reference['confidences'] > 0.5) == (quantized['confidences'] > 0.5)
+    return {
+        'quantized_float32': dict(reference['timing'], input_bytes_per_row=4 * INPUT_FEATURES),
+        'quantized_uint8': dict(quantized['timing'], input_bytes_per_row=INPUT_FEATURES),
+        'quantized_accuracy': {
+            'rows': count,
+            'max_abs_error': round(float(error.max()), 6) if error.size else None,
+            'mean_abs_error': round(float(error.mean()), 6) if error.size else None,
+            'fault_flag_agreement': round(float(flags_match[reported].mean()), 6) if error.size else None,
+            'verdict_agreement': round(float((reference['verdict'] == quantized['verdict']).mean()), 6),
+        },
+    }
+
+
+def make_backend(config):
+    if config.get('backend', 'simulated') == 'hailo':
+        return HailoBackend(quantized=config.get('quantized', False))
+    return SimulatedBackend(
+        latency_ms=config.get('latency_ms', 0.0),
+        setup_ms=config.get('setup_ms', 0.0),
+        switch_ms=config.get('switch_ms', 0.0),
+        batch_size=config.get('hef_batch_size', 8),
+        parse_ms=config.get('parse_ms', 0.0),
+        quantized=config.get('quantized', False),
+    )
+
+
+def run_benchmarks(config=None):
+    """Run the selected benchmarks and return a JSON-serializable report
+
+    config keys: iterations, warmup, batch_size, latency_ms, parse_ms,
+    setup_ms, switch_ms, hef_batch_size, load_policy, wire_rows, quantized
+    (uint8 device I/O for every benchmark but 'quantized', which compares
+    both), backend ('simulated' or 'hailo'), only.
+    """
+    config = dict(config or {})
+    iterations = config.get('iterations', 200)
+    warmup = config.get('warmup', 10)
+    batch_size = config.get('batch_size', 32)
+    selected = config.get('only') or BENCHMARKS
+
+    wire_rows = config.get('wire_rows') or WIRE_ROWS
+    readings = sample_readings(max(batch_size, 1))
+    single = readings[0]
+    results = {}
+
+    load_policy = config.get('load_policy', 'eager')
+    diag = HailoHVACDiagnostics(backend=make_backend(config), load_policy='eager')
+    if not diag.initialize():
+        raise RuntimeError('Failed to initialize inference backend')
+    try:
+        input_data = diag.prepare_sensor_data(single)
+        first_model = next((name for name in MODEL_PATHS if name in diag.pipelines), None)
+        results['model_loading'] = diag.load_report()
+
+        if 'prepare_sensor_data' in selected:
+            results['prepare_sensor_data'] = summarize(
+                measure(lambda: diag.prepare_sensor_data(single), iterations, warmup))
+        if 'prepare_sensor_batch' in selected:
+            results['prepare_sensor_batch'] = summarize(
+                measure(lambda: diag.prepare_sensor_batch(readings[:batch_size]), iterations, warmup), batch_size)
+        if 'run_inference' in selected and first_model:
+            results['run_inference'] = dict(summarize(
+                measure(lambda: diag.run_inference(first_model, input_data), iterations, warmup)), model=first_model)
+        for mode in ('sequential', 'simultaneous', 'cascade'):
+            if f'diagnose_{mode}' in selected:
+                results[f'diagnose_{mode}'] = summarize(
+                    measure(lambda: diag.diagnose(single, mode=mode, use_cache=False), iterations, warmup))
+        if 'diagnose_batch' in selected:
+            results['diagnose_batch'] = dict(summarize(
+                measure(lambda: diag.diagnose_batch(readings[:batch_size], mode='simultaneous'), iterations, warmup),
+                batch_size),
+                batch_size=batch_size)
+        if 'wire' in selected:
+            results.update(measure_wire(diag, sample_readings(max(wire_rows)), wire_rows, max(5, iterations // 10), min(warmup, 3)))
+    finally:
+        diag.close()
+
+    if 'quantized' in selected:
+        results.update(measure_quantized(config, readings[:batch_size], iterations, warmup))
+
+    if 'cold_start' in selected:
+        def cold_start():
+            cold = HailoHVACDiagnostics(backend=make_backend(config), load_policy=load_policy)
+            cold.initialize()
+            cold.close()
+        results['cold_start'] = dict(summarize(measure(cold_start, max(1, iterations // 20))),
+                                     load_policy=load_policy)
+    if 'first_diagnosis' in selected:
+        # Startup plus the first simultaneous diagnosis: what a freshly
+        # started service makes its first caller wait for
+        def first_diagnosis():
+            cold = HailoHVACDiagnostics(backend=make_backend(config), load_policy=load_policy)
+            cold.initialize()
+            cold.diagnose(single, mode='simultaneous', use_cache=False)
+            cold.close()
+        results['first_diagnosis'] = dict(summarize(measure(first_diagnosis, max(1, iterations // 20))),
+                                          load_policy=load_policy)
+
+    return {
+        'config': {
+            'backend': config.get('backend', 'simulated'),
+            'iterations': iterations,
+            'warmup': warmup,
+            'batch_size': batch_size,
+            'latency_ms': config.get('latency_ms', 0.0),
+            'parse_ms': config.get('parse_ms', 0.0),
+            'setup_ms': config.get('setup_ms', 0.0),
+            'switch_ms': config.get('switch_ms', 0.0),
+            'hef_batch_size': config.get('hef_batch_size', 8),
+            'load_policy': load_policy,
+            'quantized': config.get('quantized', False),
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+        },
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+
+def bench_main(argv):
+    """Entry point for `hailo_inference.py bench [options]`"""
+    parser = argparse.ArgumentParser(prog='hailo_inference.py bench')
+    parser.add_argument('--backend', choices=('simulated', 'hailo'), default='simulated')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32, help='Units per diagnose_batch call')
+    parser.add_argument('--latency-ms', type=parse_latency, default=0.0,
+                        help="Simulated per-transfer latency: '2' or 'apollo=1,gaia=3'")
+    parser.add_argument('--parse-ms', type=float, default=0.0, help='Simulated model file parse cost')
+    parser.add_argument('--setup-ms', type=float, default=0.0, help='Simulated pipeline setup cost')
+    parser.add_argument('--switch-ms', type=float, default=0.0, help='Simulated network-group switch cost')
+    parser.add_argument('--hef-batch-size', type=int, default=8, help='Simulated frames per device transfer')
+    parser.add_argument('--load-policy', choices=LOAD_POLICIES, default='eager',
+                        help='Model loading policy for cold_start and first_diagnosis')
+    parser.add_argument('--wire-rows', type=lambda value: tuple(int(n) for n in value.split(',')),
+                        default=WIRE_ROWS, help="Batch sizes for the wire benchmark, e.g. '1,64,1024'")
+    parser.add_argument('--quantized', action='store_true', help='Use uint8 device I/O for the other benchmarks')
+    parser.add_argument('--only', action='append', choices=BENCHMARKS, help='Run only these benchmarks')
+    parser.add_argument('--output', help='Write the JSON report to this file as well as stdout')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks({
+        'backend': args.backend,
+        'iterations': args.iterations,
+        'warmup': args.warmup,
+        'batch_size': args.batch_size,
+        'latency_ms': args.latency_ms,
+        'parse_ms': args.parse_ms,
+        'setup_ms': args.setup_ms,
+        'switch_ms': args.switch_ms,
+        'hef_batch_size': args.hef_batch_size,
+        'load_policy': args.load_policy,
+        'wire_rows': args.wire_rows,
+        'quantized': args.quantized,
+        'only': args.only,
+    })
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    sys.stdout.flush()
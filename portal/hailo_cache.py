@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Diagnosis result cache for long-running inference processes
+Keys are the equipment ID plus the model input quantized to per-feature
+tolerances, so readings from a stable unit reuse the previous ensemble run
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from hailo_features import FEATURE_SCHEMA, INPUT_FEATURES
+
+# Quantization step per feature unit - readings closer than this are treated
+# as identical for caching purposes
+DEFAULT_TOLERANCES = {
+    'degF': 0.5,
+    'inH2O': 0.02,
+    'CFM': 10.0,
+    'A': 0.2,
+    'W': 25.0,
+    '%RH': 1.0,
+    '%': 1.0,
+    'bool': 0.5,
+}
+
+
+def build_tolerance_steps(tolerances=None):
+    """Per-column quantization steps from unit defaults and per-feature overrides
+
+    `tolerances` may map feature names or units to a step size.
+    """
+    tolerances = tolerances or {}
+    steps = np.ones(INPUT_FEATURES, dtype=np.float64)
+    for spec in FEATURE_SCHEMA:
+        step = tolerances.get(spec.name, tolerances.get(spec.unit, DEFAULT_TOLERANCES.get(spec.unit, 1.0)))
+        if step <= 0:
+            raise ValueError(f'Tolerance for {spec.name} must be positive')
+        steps[spec.index] = step
+    return steps
+
+
+class DiagnosisCache:
+    """Thread-safe TTL + LRU cache of diagnose() results"""
+
+    def __init__(self, ttl_seconds=120.0, max_entries=4096, tolerances=None, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.steps = build_tolerance_steps(tolerances)
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def make_key(self, equipment_id, input_row, variant=None):
+        """Build a cache key, or None when the input cannot be cached (NaN/inf)"""
+        row = np.asarray(input_row, dtype=np.float64).reshape(-1)
+        if not np.all(np.isfinite(row)):
+            return None
+        quantized = np.floor(row / self.steps + 0.5).astype(np.int64)
+        return (equipment_id, variant, quantized.tobytes())
+
+    def get(self, key, max_age_s=None):
+        """Return a copy of the cached result tagged with its age, or None
+
+        max_age_s overrides the TTL for this lookup, e.g. to accept a stale
+        result rather than none at all.
+        """
+        if key is None:
+            return None
+        now = self.clock()
+        max_age_s = self.ttl_seconds if max_age_s is None else max_age_s
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, result = entry
+            if now - stored_at > max_age_s:
+                if now - stored_at > self.ttl_seconds:
+                    del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        result = copy.deepcopy(result)
+        result['cache'] = {'hit': True, 'age_ms': round((now - stored_at) * 1000, 2)}
+        return result
+
+    def put(self, key, result):
+        if key is None:
+            return
+        result = copy.deepcopy(result)
+        result.pop('cache', None)
+        with self.lock:
+            self.entries[key] = (self.clock(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+NumPy CPU engine for the HVAC diagnostic ensemble
+Runs each model's exported dense layers on the host, behind the same
+backend interface as the Hailo-8, so the stack works on machines without an
+NPU and can take overflow batches when the device is saturated
+
+Exported weights are one .npz per model (beside its HEF, or in
+APOLLO_CPU_WEIGHTS_DIR as <model>.npz) holding:
+
+    weight_0, bias_0, ... weight_k, bias_k   dense layers, (in, out) and (out,)
+    activation                              one name per layer (ACTIVATIONS)
+    input_scale, input_shift                optional (32,) input transform
+
+Batch norm is folded into the preceding layer at export time and dropout
+is dropped, so a model is a plain chain of dense layers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from hailo_backends import InferenceBackend, ModelPipeline, simulated_weights
+from hailo_features import INPUT_FEATURES
+from hailo_metrics import METRICS
+
+# Directory of <model>.npz files; unset looks beside each model's HEF
+WEIGHTS_DIR = os.environ.get('APOLLO_CPU_WEIGHTS_DIR') or None
+
+# Fall back to the CPU engine when the device backend cannot be opened
+CPU_FALLBACK = os.environ.get('APOLLO_CPU_FALLBACK', '1').lower() in ('1', 'true', 'yes')
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    'sigmoid': _sigmoid,
+}
+
+
+def weights_path(model_name, model_path, weights_dir=None):
+    """Where a model's exported weights live"""
+    weights_dir = weights_dir or WEIGHTS_DIR
+    if weights_dir:
+        return str(Path(weights_dir) / f'{model_name}.npz')
+    return str(Path(model_path).with_suffix('.npz'))
+
+
+def available_weights(model_paths, weights_dir=None):
+    """{model_name: weights path} for the models whose weights file exists"""
+    paths = {name: weights_path(name, path, weights_dir) for name, path in model_paths.items()}
+    return {name: path for name, path in paths.items() if os.path.exists(path)}
+
+
+class DenseNetwork:
+    """A chain of dense layers evaluated in float32"""
+
+    def __init__(self, layers, input_scale=None, input_shift=None):
+        self.layers = []
+        for weight, bias, activation in layers:
+            if activation not in ACTIVATIONS:
+                raise ValueError(f'Unknown activation: {activation}')
+            self.layers.append((np.asarray(weight, dtype=np.float32), np.asarray(bias, dtype=np.float32),
+                                activation))
+        if not self.layers:
+            raise ValueError('Network has no layers')
+        if self.layers[0][0].shape[0] != INPUT_FEATURES:
+            raise ValueError(f'First layer takes {self.layers[0][0].shape[0]} inputs, expected {INPUT_FEATURES}')
+        for (weight, _, _), (following, _, _) in zip(self.layers, self.layers[1:]):
+            if weight.shape[1] != following.shape[0]:
+                raise ValueError(f'Layer shapes do not chain: {weight.shape} then {following.shape}')
+        self.input_scale = None if input_scale is None else np.asarray(input_scale, dtype=np.float32)
+        self.input_shift = None if input_shift is None else np.asarray(input_shift, dtype=np.float32)
+
+    @property
+    def outputs(self):
+        return self.layers[-1][0].shape[1]
+
+    def __call__(self, input_data):
+        """(N, 32) inputs -> (N, outputs) float32"""
+        x = np.asarray(input_data, dtype=np.float32)
+        if self.input_scale is not None:
+            x = x * self.input_scale
+        if self.input_shift is not None:
+            x = x + self.input_shift
+        for weight, bias, activation in self.layers:
+            x = ACTIVATIONS[activation](x @ weight + bias)
+        return x.astype(np.float32, copy=False)
+
+
+def load_weights(path):
+    """DenseNetwork from an exported .npz"""
+    with np.load(path, allow_pickle=False) as data:
+        activations = [str(name) for name in data['activation']]
+        layers = [(data[f'weight_{i}'], data[f'bias_{i}'], activation) for i, activation in enumerate(activations)]
+        return DenseNetwork(layers, data['input_scale'] if 'input_scale' in data else None,
+                            data['input_shift'] if 'input_shift' in data else None)
+
+
+def save_weights(path, network):
+    """Write a DenseNetwork in the exported .npz layout"""
+    arrays = {'activation': np.array([activation for _, _, activation in network.layers])}
+    for i, (weight, bias, _) in enumerate(network.layers):
+        arrays[f'weight_{i}'] = weight
+        arrays[f'bias_{i}'] = bias
+    if network.input_scale is not None:
+        arrays['input_scale'] = network.input_scale
+    if network.input_shift is not None:
+        arrays['input_shift'] = network.input_shift
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def simulated_network(model_name):
+    """The SimulatedBackend's network for model_name as a DenseNetwork"""
+    w1, b1, w2, b2 = simulated_weights(model_name)
+    scale = np.full(INPUT_FEATURES, 1.0 / 1000.0, dtype=np.float32)
+    return DenseNetwork([(w1, b1, 'tanh'), (w2, np.atleast_1d(b2), 'sigmoid')], input_scale=scale)
+
+
+class CpuPipeline(ModelPipeline):
+    """One model's DenseNetwork; infer() never waits on a device"""
+
+    def __init__(self, backend, model_name, network):
+        super().__init__(backend, model_name)
+        start_time = time.perf_counter()
+        self.network = network
+        self.batch_size = backend.batch_size
+        self.setup_time_ms = (time.perf_counter() - start_time) * 1000
+
+    def infer(self, input_data):
+        with METRICS.timer('cpu_infer', self.model_name):
+            output = self.network(input_data)
+        self.calls += 1
+        return output
+
+
+class CpuBackend(InferenceBackend):
+    """Host CPU running exported weights with NumPy
+
+    No network groups to switch, so the scheduler runs every model's queue
+    in parallel. Models whose weights file is missing fail to load like a
+    missing HEF would.
+    """
+
+    name = 'cpu'
+    device_name = 'CPU (NumPy)'
+    requires_model_files = False
+
+    def __init__(self, weights_dir=None, batch_size=64):
+        super().__init__()
+        self.manual_activation = False
+        self.weights_dir = weights_dir or WEIGHTS_DIR
+        self.batch_size = batch_size
+
+    def parse_model(self, model_name, model_path):
+        path = weights_path(model_name, model_path, self.weights_dir)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Weights not found: {path}')
+        return load_weights(path)
+
+    def configure_model(self, model_name, network):
+        return CpuPipeline(self, model_name, network)
+
+
+def export_main(argv):
+    """Entry point for `hailo_inference.py export_weights --simulated [--out DIR]`"""
+    from hailo_inference import MODEL_PATHS
+
+    parser = argparse.ArgumentParser(prog='hailo_inference.py export_weights')
+    parser.add_argument('--simulated', action='store_true', required=True,
+                        help="Export the simulated backend's networks (development machines)")
+    parser.add_argument('--out', default=WEIGHTS_DIR, help='Output directory (default: beside each HEF)')
+    args = parser.parse_args(argv)
+
+    exported = {}
+    for model_name, model_path in MODEL_PATHS.items():
+        path = weights_path(model_name, model_path, args.out)
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            save_weights(path, simulated_network(model_name))
+            exported[model_name] = path
+        except OSError as e:
+            print(f"Could not export {model_name}: {e}", file=sys.stderr)
+            exported[model_name] = {'error': str(e)}
+    print(json.dumps(exported))
@@ -0,0 +1,699 @@
+#!/usr/bin/env python3
+"""
+Persistent inference daemon for the Hailo-8 8-model ensemble
+Initializes the device once and serves newline-delimited JSON requests
+over stdin/stdout or a Unix domain socket
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from hailo_admission import DEFAULT_DEADLINE_MS, OVERLOAD_POLICIES, AdmissionController, AdmissionRejected
+from hailo_cache import DiagnosisCache
+from hailo_metrics import METRICS, profile_call
+from hailo_rollup import ROLLUP_FILE, SITE_MAP_FILE, FleetRollup, load_site_map, unit_id
+from hailo_streaming import StreamingDiagnoser
+from hailo_telemetry import STATUS_FILE, TelemetryCollector
+from hailo_wire import decode_request, encode_error, encode_response, read_frame
+
+DEFAULT_SOCKET = os.environ.get('APOLLO_SOCKET', '/tmp/apollo-inference.sock')
+
+
+class InferenceDaemon:
+    """Dispatches NDJSON requests to a long-lived HailoHVACDiagnostics instance
+
+    Each request is a JSON object such as
+        {"id": 7, "cmd": "diagnose", "sensor_data": {...}, "mode": "simultaneous"}
+    and each response echoes the request id:
+        {"id": 7, "result": {...}}  or  {"id": 7, "error": "..."}
+    Responses may arrive out of order when several requests are in flight.
+    With an AdmissionController, diagnose requests may carry "deadline_ms"
+    (counted from arrival) and shed requests answer {"error": ..., "shed": true}.
+    With a SensorRingReader, diagnose_latest runs the newest ring row of
+    each requested unit without any sensor data in the request.
+    With a StreamingDiagnoser, diagnose_stream feeds
+        {"cmd": "diagnose_stream", "records": [[equipment_id, timestamp, {...}], ...]}
+    into per-unit sliding windows and answers with the diagnoses that fell due.
+    """
+
+    def __init__(self, diag, max_workers=4, telemetry=None, admission=None, ring=None, stream=None):
+        self.diag = diag
+        self.telemetry = telemetry
+        self.admission = admission
+        self.ring = ring
+        self.stream = stream
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='apollo-infer')
+        self.shutdown_event = threading.Event()
+        self.in_flight = 0
+        self.completed = 0
+        self._counter_lock = threading.Lock()
+
+        # Commands answered inline on the reader thread (cheap, no device access)
+        self.inline_handlers = {
+            'ping': self.handle_ping,
+            'status': self.handle_status,
+            'models': self.handle_models,
+            'cache_stats': self.handle_cache_stats,
+            'cache_clear': self.handle_cache_clear,
+            'metrics': self.handle_metrics,
+            'admission_stats': self.handle_admission_stats,
+            'rollup': self.handle_rollup,
+            'shutdown': self.handle_shutdown,
+        }
+        # Commands dispatched to the worker pool
+        self.handlers = {
+            'diagnose': self.handle_diagnose,
+            'diagnose_batch': self.handle_diagnose_batch,
+            'diagnose_latest': self.handle_diagnose_latest,
+            'diagnose_stream': self.handle_diagnose_stream,
+        }
+
+    def handle_line(self, line, respond):
+        """Parse one request line and answer it inline or on the worker pool
+
+        Returns the Future for pooled requests so callers can wait on them.
+        """
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            respond({'id': None, 'error': 'Invalid JSON request'})
+            return None
+
+        if not isinstance(request, dict):
+            respond({'id': None, 'error': 'Request must be a JSON object'})
+            return None
+
+        request_id = request.get('id')
+        command = request.get('cmd', 'diagnose')
+        # Deadlines count from here, not from when a worker picks the request up
+        request['_received_at'] = time.monotonic()
+
+        if command in self.inline_handlers:
+            self._respond(respond, request_id, self.inline_handlers[command], request)
+            return None
+
+        handler = self.handlers.get(command)
+        if handler is None:
+            respond({'id': request_id, 'error': f'Unknown command: {command}'})
+            return None
+
+        if self.shutdown_event.is_set():
+            respond({'id': request_id, 'error': 'Daemon shutting down'})
+            return None
+
+        with self._counter_lock:
+            self.in_flight += 1
+        try:
+            return self.executor.submit(self._run, handler, request, respond)
+        except RuntimeError:
+            # Executor already shut down
+            with self._counter_lock:
+                self.in_flight -= 1
+            respond({'id': request_id, 'error': 'Daemon shutting down'})
+            return None
+
+    def _run(self, handler, request, respond):
+        """Worker-pool wrapper that always produces exactly one response"""
+        try:
+            if request.get('profile'):
+                self._respond_profiled(respond, request.get('id'), handler, request)
+            else:
+                self._respond(respond, request.get('id'), handler, request)
+        finally:
+            with self._counter_lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def _respond(self, respond, request_id, handler, request):
+        try:
+            result = handler(request)
+            respond({'id': request_id, 'result': result})
+        except AdmissionRejected as e:
+            respond({'id': request_id, 'error': str(e), 'shed': True})
+        except Exception as e:
+            print(f"Request {request_id} failed: {e}", file=sys.stderr)
+            respond({'id': request_id, 'error': str(e)})
+
+    def _respond_profiled(self, respond, request_id, handler, request):
+        """Answer one request captured under cProfile or tracemalloc"""
+        try:
+            kind = request['profile']
+            if kind is True:
+                kind = 'cprofile'
+            elif not isinstance(kind, str):
+                raise ValueError(f"profile must be true, 'cprofile' or 'tracemalloc', not {kind!r}")
+            result, report = profile_call(lambda: handler(request), kind=kind)
+            respond({'id': request_id, 'result': result, 'profile': report})
+        except Exception as e:
+            print(f"Request {request_id} failed: {e}", file=sys.stderr)
+            respond({'id': request_id, 'error': str(e)})
+
+    def handle_ping(self, request):
+        with self._counter_lock:
+            return {'pong': True, 'in_flight': self.in_flight, 'completed': self.completed}
+
+    def handle_status(self, request):
+        # Served from the collector's ring buffer - never waits on hailortcli
+        if self.telemetry is None:
+            return self.diag.get_device_status()
+        return self.telemetry.snapshot()
+
+    def handle_models(self, request):
+        return self.diag.models
+
+    def handle_cache_stats(self, request):
+        if self.diag.cache is None:
+            return {'enabled': False}
+        return dict(self.diag.cache.stats(), enabled=True)
+
+    def handle_metrics(self, request):
+        if request.get('format') == 'prometheus':
+            return self.render_prometheus()
+        snapshot = {'stages': METRICS.snapshot()}
+        if self.diag.scheduler is not None:
+            snapshot['scheduler'] = self.diag.scheduler.snapshot()
+        if self.diag.cache is not None:
+            snapshot['cache'] = self.diag.cache.stats()
+        if self.admission is not None:
+            snapshot['admission'] = self.admission.snapshot()
+        if self.diag.spill is not None:
+            snapshot['spill'] = self.diag.spill.snapshot()
+        return snapshot
+
+    def handle_rollup(self, request):
+        if self.diag.rollup is None:
+            return {'enabled': False}
+        return dict(self.diag.rollup.summary(site=request.get('site'), window_s=request.get('window_s')), enabled=True)
+
+    def handle_admission_stats(self, request):
+        if self.admission is None:
+            return {'enabled': False}
+        return dict(self.admission.snapshot(), enabled=True)
+
+    def render_prometheus(self):
+        """Stage histograms plus scheduler and cache gauges in Prometheus text format"""
+        lines = [METRICS.render_prometheus().rstrip('\n')]
+        if self.diag.scheduler is not None:
+            lines.append('# TYPE apollo_scheduler_queue_depth gauge')
+            lines.append('# TYPE apollo_scheduler_switches_total counter')
+            for model_name, stats in self.diag.scheduler.snapshot().items():
+                lines.append(f'apollo_scheduler_queue_depth{{model="{model_name}"}} {stats["queue_depth"]}')
+                lines.append(f'apollo_scheduler_switches_total{{model="{model_name}"}} {stats["switches"]}')
+        if self.diag.cache is not None:
+            stats = self.diag.cache.stats()
+            lines.append('# TYPE apollo_cache_hits_total counter')
+            lines.append(f'apollo_cache_hits_total {stats["hits"]}')
+            lines.append('# TYPE apollo_cache_misses_total counter')
+            lines.append(f'apollo_cache_misses_total {stats["misses"]}')
+        if self.admission is not None:
+            stats = self.admission.snapshot()
+            lines.append('# TYPE apollo_admission_requests_total counter')
+            for outcome in ('admitted', 'coalesced', 'degraded_cache', 'degraded_partial', 'shed', 'deadline_missed'):
+                lines.append(f'apollo_admission_requests_total{{outcome="{outcome}"}} {stats[outcome]}')
+        if self.diag.spill is not None:
+            stats = self.diag.spill.snapshot()
+            lines.append('# TYPE apollo_spill_batches_total counter')
+            lines.append(f'apollo_spill_batches_total{{engine="device"}} {stats["device_batches"]}')
+            lines.append(f'apollo_spill_batches_total{{engine="cpu"}} {stats["spilled_batches"]}')
+            lines.append('# TYPE apollo_spill_rows_total counter')
+            lines.append(f'apollo_spill_rows_total {stats["spilled_rows"]}')
+        if self.diag.rollup is not None:
+            lines.append('# TYPE apollo_rollup_units gauge')
+            for site in list(self.diag.rollup.sites):
+                units = self.diag.rollup.summary(site=site)['units']
+                for verdict in ('normal', 'watch', 'fault', 'unable'):
+                    lines.append(f'apollo_rollup_units{{site="{site}",verdict="{verdict}"}} {units[verdict]}')
+        with self._counter_lock:
+            lines.append('# TYPE apollo_requests_in_flight gauge')
+            lines.append(f'apollo_requests_in_flight {self.in_flight}')
+        return '\n'.join(lines) + '\n'
+
+    def handle_cache_clear(self, request):
+        if self.diag.cache is not None:
+            self.diag.cache.clear()
+        return {'cleared': self.diag.cache is not None}
+
+    def handle_shutdown(self, request):
+        self.shutdown_event.set()
+        return {'shutting_down': True}
+
+    def handle_diagnose(self, request):
+        sensor_data = request.get('sensor_data')
+        if not isinstance(sensor_data, dict):
+            raise ValueError('No sensor data provided')
+        mode = request.get('mode', 'simultaneous')
+
+        if self.admission is not None:
+            return self.admission.diagnose(
+                sensor_data,
+                mode=mode,
+                cascade_threshold=request.get('cascade_threshold'),
+                equipment_id=request.get('equipment_id'),
+                use_cache=request.get('cache', True),
+                deadline_ms=request.get('deadline_ms'),
+                received_at=request.get('_received_at')
+            )
+
+        # The model scheduler serializes device access and lets concurrent
+        # requests share network-group activations
+        return self.diag.diagnose(
+            sensor_data,
+            mode=mode,
+            cascade_threshold=request.get('cascade_threshold'),
+            equipment_id=request.get('equipment_id'),
+            use_cache=request.get('cache', True)
+        )
+
+    def handle_diagnose_batch(self, request):
+        sensor_batch = request.get('sensor_batch')
+        if not isinstance(sensor_batch, (list, dict)):
+            raise ValueError('sensor_batch must be a list of sensor readings or a dict of feature columns')
+        mode = request.get('mode', 'simultaneous')
+        cascade_threshold = request.get('cascade_threshold')
+        input_batch = self.diag.prepare_sensor_batch(sensor_batch)
+
+        # Check the routing keys before any device time is spent on the batch
+        equipment_ids = request.get('equipment_ids')
+        if equipment_ids is not None:
+            if not isinstance(equipment_ids, list):
+                raise ValueError('equipment_ids must be a list')
+            if len(equipment_ids) != len(input_batch):
+                raise ValueError('equipment_ids must have one entry per reading')
+            equipment_ids = [unit_id(equipment_id) for equipment_id in equipment_ids]
+
+        if equipment_ids is None or self.diag.rollup is None or self.diag.routes_by_equipment:
+            # Sharded diagnostics place each row on the worker that owns its unit
+            results = self.diag.diagnose_batch(input_batch, mode=mode, cascade_threshold=cascade_threshold,
+                                               equipment_ids=equipment_ids)
+            if equipment_ids is not None and self.diag.rollup is not None:
+                for equipment_id, result in zip(equipment_ids, results):
+                    self.diag.rollup.observe(equipment_id, result)
+            return results
+        results = self.diag.diagnose_columnar(input_batch, mode=mode, cascade_threshold=cascade_threshold)
+        self.diag.rollup.observe_columnar(equipment_ids, results)
+        with METRICS.timer('postprocess'):
+            return results.to_dicts()
+
+    def handle_diagnose_latest(self, request):
+        if self.ring is None:
+            raise ValueError('No sensor ring configured (serve --sensor-ring)')
+        equipment_ids = request.get('equipment_ids')
+        if equipment_ids is not None and not isinstance(equipment_ids, list):
+            raise ValueError('equipment_ids must be a list')
+        mode = request.get('mode', 'simultaneous')
+
+        units, timestamps, rows = self.ring.latest_batch(equipment_ids)
+        results = self.diag.diagnose_columnar(rows, mode=mode, cascade_threshold=request.get('cascade_threshold'))
+        if self.diag.rollup is not None:
+            self.diag.rollup.observe_columnar(units, results)
+        with METRICS.timer('postprocess'):
+            results = results.to_dicts()
+        for result, timestamp in zip(results, timestamps.tolist()):
+            del result['batch_size']
+            result['reading_timestamp'] = timestamp
+        return {str(unit): result for unit, result in zip(units, results)}
+
+    def handle_diagnose_stream(self, request):
+        if self.stream is None:
+            raise ValueError('Streaming diagnosis is not enabled')
+        records = request.get('records')
+        if not isinstance(records, list):
+            raise ValueError('records must be a list of [equipment_id, timestamp, sensor_data]')
+        for record in records:
+            if not isinstance(record, list) or len(record) != 3 or not isinstance(record[1], (int, float)) \
+                    or not isinstance(record[2], dict):
+                raise ValueError('Each record must be [equipment_id, timestamp, sensor_data]')
+        results = list(self.stream.process(tuple(record) for record in records))
+        if self.diag.rollup is not None:
+            for result in results:
+                self.diag.rollup.observe(result['equipment_id'], result)
+        return results
+
+    def handle_frame(self, frame):
+        """Answer one binary protocol request frame; returns the response frame"""
+        try:
+            request_id, mode, cascade_threshold, rows = decode_request(frame)
+        except ValueError as e:
+            return encode_error(0, e)
+        if self.shutdown_event.is_set():
+            return encode_error(request_id, 'Daemon shutting down')
+
+        with self._counter_lock:
+            self.in_flight += 1
+        try:
+            # rows is a view of the frame buffer - no copy on the way in
+            confidences, consensus = self.diag.diagnose_matrix(rows, mode=mode, cascade_threshold=cascade_threshold)
+            return encode_response(request_id, confidences, consensus)
+        except Exception as e:
+            print(f"Binary request {request_id} failed: {e}", file=sys.stderr)
+            return encode_error(request_id, e)
+        finally:
+            with self._counter_lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def close(self):
+        """Stop accepting work, drain in-flight requests and release the device"""
+        self.shutdown_event.set()
+        self.executor.shutdown(wait=True)
+        try:
+            if self.telemetry is not None:
+                self.telemetry.stop()
+            if self.diag.rollup is not None:
+                self.diag.rollup.stop()
+        finally:
+            self.diag.close()
+            if self.ring is not None:
+                self.ring.close()
+
+
+def _make_writer(stream, binary=False):
+    """Return a thread-safe callable that writes one JSON object per line"""
+    lock = threading.Lock()
+
+    def respond(message):
+        data = json.dumps(message) + '\n'
+        if binary:
+            data = data.encode('utf-8')
+        with lock:
+            try:
+                stream.write(data)
+                stream.flush()
+            except (BrokenPipeError, ValueError, OSError):
+                # Peer went away; nothing left to deliver to
+                pass
+
+    return respond
+
+
+def serve_stdio(daemon, stdin=None, stdout=None):
+    """Serve requests from stdin, writing responses to stdout, until EOF or shutdown"""
+    stdin = stdin or sys.stdin
+    respond = _make_writer(stdout or sys.stdout)
+
+    respond({'id': None, 'event': 'ready', 'models': daemon.diag.models})
+
+    def reader():
+        for line in stdin:
+            if daemon.shutdown_event.is_set():
+                break
+            if line.strip():
+                daemon.handle_line(line, respond)
+        daemon.shutdown_event.set()
+
+    threading.Thread(target=reader, name='apollo-stdin', daemon=True).start()
+    daemon.shutdown_event.wait()
+
+
+class _UnixRequestHandler(socketserver.StreamRequestHandler):
+    """Reads NDJSON requests from one client connection"""
+
+    def handle(self):
+        daemon = self.server.inference_daemon
+        respond = _make_writer(self.wfile, binary=True)
+        pending = []
+
+        for raw in self.rfile:
+            if daemon.shutdown_event.is_set():
+                break
+            line = raw.decode('utf-8', errors='replace')
+            if not line.strip():
+                continue
+            future = daemon.handle_line(line, respond)
+            if future is not None:
+                pending.append(future)
+                pending = [f for f in pending if not f.done()]
+
+        # Client half-closed: deliver outstanding responses before hanging up
+        for future in pending:
+            future.result()
+
+
+class _BinaryRequestHandler(socketserver.StreamRequestHandler):
+    """Answers length-prefixed binary frames from one client connection in order"""
+
+    def handle(self):
+        daemon = self.server.inference_daemon
+        while not daemon.shutdown_event.is_set():
+            try:
+                frame = read_frame(self.rfile)
+            except ValueError as e:
+                # Framing is lost; report and drop the connection
+                self._send(encode_error(0, e))
+                return
+            if frame is None:
+                return
+            if not self._send(daemon.handle_frame(frame)):
+                return
+
+    def _send(self, data):
+        try:
+            self.wfile.write(data)
+            self.wfile.flush()
+            return True
+        except (BrokenPipeError, ValueError, OSError):
+            return False
+
+
+class _UnixJSONServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, inference_daemon, handler_class=_UnixRequestHandler):
+        self.inference_daemon = inference_daemon
+        super().__init__(path, handler_class)
+
+
+def start_socket(daemon, socket_path, binary=False):
+    """Listen on a Unix domain socket on a background thread; returns the server
+
+    binary=True speaks the hailo_wire frame protocol instead of NDJSON.
+    """
+    if os.path.exists(socket_path):
+        if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+        else:
+            raise RuntimeError(f'{socket_path} exists and is not a socket')
+
+    server = _UnixJSONServer(socket_path, daemon, _BinaryRequestHandler if binary else _UnixRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='apollo-socket', daemon=True)
+    thread.start()
+    protocol = 'binary' if binary else 'NDJSON'
+    print(f"Apollo inference daemon listening on {socket_path} ({protocol})", file=sys.stderr)
+    return server
+
+
+def stop_socket(server):
+    socket_path = server.server_address
+    server.shutdown()
+    server.server_close()
+    try:
+        os.unlink(socket_path)
+    except OSError:
+        pass
+
+
+def serve_socket(daemon, socket_path):
+    """Serve requests on a Unix domain socket until shutdown"""
+    server = start_socket(daemon, socket_path)
+    try:
+        daemon.shutdown_event.wait()
+    finally:
+        stop_socket(server)
+
+
+def serve_metrics_http(daemon, port, host='127.0.0.1'):
+    """Expose GET /metrics in Prometheus text format on a background thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = daemon.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='apollo-metrics', daemon=True).start()
+    print(f"Prometheus metrics on http://{host}:{server.server_address[1]}/metrics", file=sys.stderr)
+    return server
+
+
+def request_daemon(socket_path, message, timeout=10.0):
+    """Send one request to a running daemon's socket and return its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile('r', encoding='utf-8') as reader:
+            return json.loads(reader.readline())
+
+
+def metrics_main(argv):
+    """Entry point for `hailo_inference.py metrics [--socket PATH] [--format json|prometheus]`"""
+    parser = argparse.ArgumentParser(prog='hailo_inference.py metrics')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Socket of a running serve daemon')
+    parser.add_argument('--format', choices=('json', 'prometheus'), default='json')
+    args = parser.parse_args(argv)
+
+    try:
+        response = request_daemon(args.socket, {'id': 'metrics', 'cmd': 'metrics', 'format': args.format})
+    except (OSError, ValueError) as e:
+        print(json.dumps({'error': f'Inference daemon not reachable at {args.socket}: {e}'}))
+        sys.exit(1)
+
+    if args.format == 'prometheus' and 'result' in response:
+        sys.stdout.write(response['result'])
+    else:
+        print(json.dumps(response.get('result', response)))
+
+
+def log_model_report(report):
+    """One stderr line per model with its load state and timings"""
+    print(f"Model loading: {report['policy']} ({', '.join(report['priority'])})", file=sys.stderr)
+    for name, model in report['models'].items():
+        if model['state'] == 'loaded':
+            print(f"  {name}: parse {model['parse_time_ms']} ms, setup {model['setup_time_ms']} ms, "
+                  f"warm-up {model['warmup_time_ms']} ms", file=sys.stderr)
+        else:
+            print(f"  {name}: {model['state']} {model.get('error', '')}".rstrip(), file=sys.stderr)
+
+
+def serve_main(diag, argv):
+    """Entry point for `hailo_inference.py serve [--socket PATH] [--workers N]`"""
+    parser = argparse.ArgumentParser(prog='hailo_inference.py serve')
+    parser.add_argument('--socket', help='Unix domain socket path (default: stdin/stdout)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent in-flight requests')
+    parser.add_argument('--cache-ttl', type=float, default=120.0, help='Result cache TTL in seconds')
+    parser.add_argument('--cache-size', type=int, default=4096, help='Maximum cached results')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the result cache')
+    parser.add_argument('--telemetry-interval', type=float, default=5.0,
+                        help='Seconds between device telemetry samples (0 disables)')
+    parser.add_argument('--status-file', default=STATUS_FILE, help='Where the telemetry snapshot is written')
+    parser.add_argument('--binary-socket', help='Also serve the binary frame protocol on this socket')
+    parser.add_argument('--shards', type=int, default=0, help='Spread the ensemble over this many worker processes')
+    parser.add_argument('--shard-strategy', choices=('equipment', 'models'), default='equipment',
+                        help='Partition shards by equipment unit or by model')
+    parser.add_argument('--shard-devices', help='Comma-separated Hailo device IDs, one worker per device')
+    parser.add_argument('--metrics-port', type=int, default=0, help='Serve Prometheus /metrics on this port')
+    parser.add_argument('--sensor-ring', help='Serve diagnose_latest from this shared-memory sensor ring')
+    parser.add_argument('--no-admission', action='store_true',
+                        help='Run every diagnose request as sent: no coalescing or deadlines')
+    parser.add_argument('--deadline-ms', type=float, help='Deadline for diagnose requests that do not set one')
+    parser.add_argument('--overload-policy', choices=OVERLOAD_POLICIES, default='degrade',
+                        help='Answer requests that would miss their deadline from cache/partial runs, or shed them')
+    parser.add_argument('--spill-threshold-ms', type=float,
+                        help='Run batches on the CPU engine when the device queue has waited longer than this (0 disables)')
+    parser.add_argument('--spill-workers', type=int, help='CPU spill-over worker processes')
+    parser.add_argument('--rollup-file', default=ROLLUP_FILE, help='Where site/model rollups are snapshotted')
+    parser.add_argument('--rollup-interval', type=float, default=60.0, help='Seconds between rollup snapshots')
+    parser.add_argument('--sites', default=SITE_MAP_FILE, help='JSON file mapping equipment IDs to site names')
+    parser.add_argument('--no-rollup', action='store_true', help='Do not keep site/model rollups')
+    parser.add_argument('--stream-window', type=int, default=60, help='Readings kept per unit for diagnose_stream')
+    parser.add_argument('--stream-stride', type=int, default=10,
+                        help='diagnose_stream diagnoses a unit every this many readings')
+    args = parser.parse_args(argv)
+    if args.stream_window < 2 or args.stream_stride < 1:
+        print(json.dumps({'id': None, 'error': '--stream-window must be at least 2 and --stream-stride at least 1'}))
+        sys.exit(1)
+
+    if args.shards or args.shard_devices:
+        from hailo_sharding import ShardedDiagnostics
+        from hailo_backends import QUANTIZED_IO
+        if args.shard_devices:
+            specs = [{'backend': 'hailo', 'device_id': device.strip(), 'quantized': QUANTIZED_IO}
+                     for device in args.shard_devices.split(',')]
+        else:
+            specs = [None] * args.shards
+        diag = ShardedDiagnostics(workers=len(specs), strategy=args.shard_strategy, backend_specs=specs)
+
+    if not args.no_cache:
+        diag.cache = DiagnosisCache(ttl_seconds=args.cache_ttl, max_entries=args.cache_size)
+
+    # Check everything that can be rejected before the device and worker processes are up
+    site_map = None
+    if not args.no_rollup:
+        try:
+            site_map = load_site_map(args.sites)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'id': None, 'error': f'Invalid site map: {e}'}))
+            sys.exit(1)
+    ring = None
+    if args.sensor_ring:
+        from hailo_ring import SensorRingReader
+        try:
+            ring = SensorRingReader(args.sensor_ring)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'id': None, 'error': f'Sensor ring unavailable: {e}'}))
+            sys.exit(1)
+
+    if not diag.initialize():
+        print(json.dumps({'id': None, 'error': 'Failed to initialize Hailo device'}))
+        diag.close()
+        sys.exit(1)
+    log_model_report(diag.load_report())
+
+    from hailo_inference import MODEL_PATHS
+    from hailo_spill import SPILL_THRESHOLD_MS, SPILL_WORKERS, SpillBalancer
+    spill_threshold_ms = SPILL_THRESHOLD_MS if args.spill_threshold_ms is None else args.spill_threshold_ms
+    if spill_threshold_ms > 0 and diag.backend is not None and diag.backend.name != 'cpu':
+        diag.spill = SpillBalancer(MODEL_PATHS, threshold_ms=spill_threshold_ms,
+                                   workers=args.spill_workers or SPILL_WORKERS)
+        if diag.spill.pool is None:
+            print("CPU spill-over disabled: no exported weights found", file=sys.stderr)
+            diag.spill = None
+
+    if not args.no_rollup:
+        diag.rollup = FleetRollup(MODEL_PATHS.keys(), site_map=site_map)
+        diag.rollup.restore(args.rollup_file)
+        diag.rollup.start(args.rollup_file, args.rollup_interval)
+
+    telemetry = None
+    if args.telemetry_interval > 0:
+        telemetry = TelemetryCollector(interval=args.telemetry_interval, status_file=args.status_file).start()
+
+    admission = None
+    if not args.no_admission:
+        admission = AdmissionController(diag, parallelism=args.workers, policy=args.overload_policy,
+                                        default_deadline_ms=args.deadline_ms or DEFAULT_DEADLINE_MS)
+    stream = StreamingDiagnoser(diag, window=args.stream_window, stride=args.stream_stride, batch_size=64)
+    daemon = InferenceDaemon(diag, max_workers=args.workers, telemetry=telemetry, admission=admission, ring=ring,
+                             stream=stream)
+    metrics_server = serve_metrics_http(daemon, args.metrics_port) if args.metrics_port else None
+    binary_server = start_socket(daemon, args.binary_socket, binary=True) if args.binary_socket else None
+
+    def on_signal(signum, frame):
+        daemon.shutdown_event.set()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    try:
+        if args.socket:
+            serve_socket(daemon, args.socket)
+        else:
+            serve_stdio(daemon)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        if binary_server is not None:
+            stop_socket(binary_server)
+        daemon.close()
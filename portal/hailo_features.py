@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Feature schema for the HVAC diagnostic models
+Single source of truth for input feature order, defaults, units and scaling,
+plus vectorized conversion of sensor readings into (N, 32) float32 batches
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+INPUT_FEATURES = 32
+
+FeatureSpec = namedtuple('FeatureSpec', ['name', 'index', 'default', 'unit', 'scale'])
+
+# Model input layout - index is the column in the (N, 32) input tensor.
+# Columns 19-31 are reserved and always zero.
+FEATURE_SCHEMA = (
+    # Temperature features
+    FeatureSpec('supply_air_temp', 0, 20.0, 'degF', 1.0),
+    FeatureSpec('return_air_temp', 1, 22.0, 'degF', 1.0),
+    FeatureSpec('outside_air_temp', 2, 25.0, 'degF', 1.0),
+    FeatureSpec('mixed_air_temp', 3, 21.0, 'degF', 1.0),
+    # Pressure features
+    FeatureSpec('supply_air_pressure', 4, 1.5, 'inH2O', 1.0),
+    FeatureSpec('return_air_pressure', 5, 1.2, 'inH2O', 1.0),
+    FeatureSpec('filter_pressure_drop', 6, 0.3, 'inH2O', 1.0),
+    # Flow features
+    FeatureSpec('supply_air_flow', 7, 1000.0, 'CFM', 1.0),
+    FeatureSpec('return_air_flow', 8, 950.0, 'CFM', 1.0),
+    # Electrical features
+    FeatureSpec('compressor_current', 9, 15.0, 'A', 1.0),
+    FeatureSpec('fan_motor_current', 10, 5.0, 'A', 1.0),
+    FeatureSpec('power_consumption', 11, 3500.0, 'W', 1.0),
+    # Humidity
+    FeatureSpec('supply_air_humidity', 12, 45.0, '%RH', 1.0),
+    FeatureSpec('return_air_humidity', 13, 50.0, '%RH', 1.0),
+    # Setpoints and states
+    FeatureSpec('setpoint_temp', 14, 22.0, 'degF', 1.0),
+    FeatureSpec('damper_position', 15, 50.0, '%', 1.0),
+    FeatureSpec('valve_position', 16, 30.0, '%', 1.0),
+    FeatureSpec('compressor_status', 17, 0.0, 'bool', 1.0),
+    FeatureSpec('fan_status', 18, 1.0, 'bool', 1.0),
+)
+
+FEATURE_NAMES = tuple(spec.name for spec in FEATURE_SCHEMA)
+FEATURE_INDEX = {spec.name: spec.index for spec in FEATURE_SCHEMA}
+
+
+def _build_defaults():
+    defaults = np.zeros(INPUT_FEATURES, dtype=np.float32)
+    for spec in FEATURE_SCHEMA:
+        defaults[spec.index] = spec.default * spec.scale
+    return defaults
+
+
+# Default input row: schema defaults followed by zero padding
+FEATURE_DEFAULTS = _build_defaults()
+FEATURE_DEFAULTS.setflags(write=False)
+
+
+def normalize_sensor_name(name):
+    """Map a configured sensor name to its schema key, e.g. 'Supply Air Temp' -> 'supply_air_temp'
+
+    Mirrors the conversion server.js applies before calling the engine.
+    """
+    return str(name).strip().lower().replace(' ', '_')
+
+
+def _column(values, spec, count):
+    """Convert one feature column to float32 exactly as np.array(list) would"""
+    if spec.scale == 1.0:
+        return np.fromiter(values, dtype=np.float32, count=count)
+    return (np.fromiter(values, dtype=np.float64, count=count) * spec.scale).astype(np.float32)
+
+
+def features_from_records(records, out=None):
+    """Turn a list of sensor dicts into an (N, 32) float32 batch
+
+    Missing readings take the schema default. Pass `out` to reuse a
+    preallocated buffer of at least N rows; the filled view is returned.
+    """
+    count = len(records)
+    batch = _output_buffer(out, count)
+    batch[:, len(FEATURE_SCHEMA):] = 0.0
+
+    for spec in FEATURE_SCHEMA:
+        name, default = spec.name, spec.default
+        batch[:, spec.index] = _column((record.get(name, default) for record in records), spec, count)
+
+    return batch
+
+
+def features_from_columns(columns, count=None, out=None):
+    """Turn a columnar dict of arrays ({feature: values}) into an (N, 32) float32 batch
+
+    Features absent from `columns` take the schema default for every row.
+    """
+    if count is None:
+        lengths = {len(values) for name, values in columns.items() if name in FEATURE_INDEX}
+        if len(lengths) > 1:
+            raise ValueError('Feature columns have different lengths')
+        count = lengths.pop() if lengths else 0
+
+    batch = _output_buffer(out, count)
+    batch[:] = FEATURE_DEFAULTS
+
+    for spec in FEATURE_SCHEMA:
+        values = columns.get(spec.name)
+        if values is None:
+            continue
+        if spec.scale == 1.0:
+            batch[:, spec.index] = np.asarray(values, dtype=np.float32)
+        else:
+            batch[:, spec.index] = np.asarray(values, dtype=np.float64) * spec.scale
+
+    return batch
+
+
+def _output_buffer(out, count):
+    if out is None:
+        return np.empty((count, INPUT_FEATURES), dtype=np.float32)
+    if out.dtype != np.float32 or out.ndim != 2 or out.shape[1] != INPUT_FEATURES or out.shape[0] < count:
+        raise ValueError(f'Output buffer must be float32 with shape (>={count}, {INPUT_FEATURES})')
+    return out[:count]
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Adaptive inference scheduling for the equipment fleet
+Replaces a fixed polling interval with a per-unit cadence driven by each
+unit's last ensemble consensus, runs the units that are due together as one
+batch and keeps the ensemble within a global share of device time
+"""
+
+import argparse
+import heapq
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from hailo_backfill import DEFAULT_DB, parse_sensor_values
+from hailo_results import CONSENSUS_FAULT, CONSENSUS_WATCH, VERDICT_UNABLE
+from hailo_rollup import ROLLUP_FILE, SITE_MAP_FILE, FleetRollup, load_site_map
+
+# Polling interval per cadence tier, in seconds. 'normal' matches the
+# portal's fixed 30 s loop; units stay 'stable' after STABLE_POLLS normal
+# polls in a row and back off to the stable interval.
+TIER_INTERVALS = {
+    'fault': 5.0,
+    'watch': 10.0,
+    'normal': 30.0,
+    'stable': 120.0,
+}
+STABLE_POLLS = 4
+
+# Achieved rates are measured over this many seconds
+RATE_WINDOW_S = 600.0
+
+FLEET_STATUS_FILE = os.environ.get('APOLLO_FLEET_STATUS_FILE', '/tmp/apollo-fleet-status.json')
+
+
+def consensus_tier(consensus, normal_streak):
+    """Cadence tier for a unit's last consensus and its run of normal polls"""
+    if consensus > CONSENSUS_FAULT:
+        return 'fault'
+    if consensus > CONSENSUS_WATCH:
+        return 'watch'
+    return 'stable' if normal_streak >= STABLE_POLLS else 'normal'
+
+
+class UnitState:
+    """Scheduling state of one equipment unit"""
+
+    def __init__(self, equipment_id, due):
+        self.equipment_id = equipment_id
+        self.due = due
+        self.tier = 'normal'
+        self.normal_streak = 0
+        self.consensus = None
+        self.diagnosis = None
+        self.polls = 0
+        self.skipped = 0
+        self.last_poll = None
+        self.poll_times = deque()
+
+
+class DatabaseReadings:
+    """Latest stored sensor reading per unit from the portal's SQLite database"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def equipment_ids(self):
+        return [row[0] for row in self.conn.execute('SELECT DISTINCT equipment_id FROM sensor_readings ORDER BY equipment_id')]
+
+    def latest(self, equipment_ids):
+        """{equipment_id: sensor dict} for the units that have a reading"""
+        placeholders = ','.join('?' * len(equipment_ids))
+        rows = self.conn.execute(
+            f"SELECT equipment_id, sensor_values FROM sensor_readings WHERE id IN "
+            f"(SELECT MAX(id) FROM sensor_readings WHERE equipment_id IN ({placeholders}) GROUP BY equipment_id)",
+            list(equipment_ids)).fetchall()
+        return {equipment_id: parse_sensor_values(values) for equipment_id, values in rows}
+
+
+class RingReadings:
+    """Latest row per unit from the shared-memory sensor ring (see hailo_ring)"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def equipment_ids(self):
+        return sorted(self.reader.latest())
+
+    def latest(self, equipment_ids):
+        """{equipment_id: (32,) float32 model input row} for the units in the ring"""
+        return self.reader.latest_rows(equipment_ids)
+
+
+class FleetScheduler:
+    """Polls every unit at a cadence set by its last consensus, within a device-time budget
+
+    Units wait in a heap keyed on next-due time. Each step takes the units
+    that are due, reads their latest sensor data and diagnoses them as one
+    batch. `budget` is the share of wall-clock time the ensemble may occupy:
+    device time accrues as credit at that rate (banking at most burst_s of
+    it) and each batch spends its measured duration, so the device is never
+    used beyond the budget. When the fleet's target rates would need more
+    than the budget (targets x measured cost per unit), every interval is
+    stretched by the same factor: each unit then gets the same fraction of
+    its target rate, so fault-tier units keep polling several times as
+    often as stable ones and due units still share batches. Beyond
+    max_batch, the units furthest behind in their own intervals go first.
+    `sink` receives (unit, result dict, per-unit inference ms) for every
+    diagnosis.
+    """
+
+    def __init__(self, diag, source, equipment_ids, budget=0.5, mode='simultaneous', max_batch=64,
+                 burst_s=2.0, intervals=None, sink=None, clock=time.monotonic):
+        self.diag = diag
+        self.source = source
+        self.budget = budget
+        self.mode = mode
+        self.max_batch = max(1, max_batch)
+        self.burst_s = burst_s
+        self.intervals = dict(TIER_INTERVALS, **(intervals or {}))
+        self.sink = sink
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+        now = clock()
+        self.started = now
+        self.units = {equipment_id: UnitState(equipment_id, now) for equipment_id in equipment_ids}
+        self.queue = [(now, equipment_id) for equipment_id in self.units]
+        heapq.heapify(self.queue)
+        self.credit_s = burst_s * budget
+        self.refilled_at = now
+        self.device_s = 0.0
+        self.batches = 0
+        # EWMA of device seconds per diagnosed unit, and the interval stretch it implies
+        self.unit_cost_s = None
+        self.stretch = 1.0
+
+    def _refill(self, now):
+        self.credit_s = min(self.burst_s * self.budget, self.credit_s + (now - self.refilled_at) * self.budget)
+        self.refilled_at = now
+
+    def next_wake(self):
+        """Clock time at which step() next has work to do"""
+        with self.lock:
+            if not self.queue:
+                return None
+            wake = self.queue[0][0]
+            if self.credit_s < 0 and self.budget > 0:
+                wake = max(wake, self.refilled_at - self.credit_s / self.budget)
+            return wake
+
+    def step(self):
+        """Diagnose the units that are due, if the budget allows; returns how many ran"""
+        now = self.clock()
+        with self.lock:
+            self._refill(now)
+            if self.credit_s < 0:
+                return 0
+            due = []
+            while self.queue and self.queue[0][0] <= now:
+                due.append(self.units[heapq.heappop(self.queue)[1]])
+            if len(due) > self.max_batch:
+                due.sort(key=lambda unit: (now - unit.due) / self.intervals[unit.tier], reverse=True)
+                for unit in due[self.max_batch:]:
+                    heapq.heappush(self.queue, (unit.due, unit.equipment_id))
+                due = due[:self.max_batch]
+        if not due:
+            return 0
+
+        readings = self.source.latest([unit.equipment_id for unit in due])
+        polled = [unit for unit in due if unit.equipment_id in readings]
+        started = self.clock()
+        results = None
+        if polled:
+            batch = [readings[unit.equipment_id] for unit in polled]
+            if isinstance(batch[0], np.ndarray):
+                batch = np.stack(batch)
+            results = self.diag.diagnose_columnar(batch, mode=self.mode)
+        finished = self.clock()
+
+        with self.lock:
+            spent = finished - started
+            self.credit_s -= spent
+            self.device_s += spent
+            if polled:
+                self.batches += 1
+                cost = spent / len(polled)
+                self.unit_cost_s = cost if self.unit_cost_s is None else 0.8 * self.unit_cost_s + 0.2 * cost
+            for unit in due:
+                if unit.equipment_id not in readings:
+                    # No data yet: look again at the normal cadence
+                    unit.skipped += 1
+                    self._reschedule(unit, finished, self.intervals['normal'])
+            for row, unit in enumerate(polled):
+                self._record(unit, finished, float(results.consensus[row]), results.verdict[row] == VERDICT_UNABLE)
+            self._update_stretch()
+        if polled:
+            if self.diag.rollup is not None:
+                self.diag.rollup.observe_columnar([unit.equipment_id for unit in polled], results)
+            per_unit_ms = round(spent * 1000 / len(polled), 3)
+            for unit, result in zip(polled, results):
+                unit.diagnosis = result['final']['diagnosis']
+                if self.sink is not None:
+                    self.sink(unit, result, per_unit_ms)
+        return len(polled)
+
+    def _record(self, unit, now, consensus, unable=False):
+        unit.consensus = consensus
+        # A run where no model reported says nothing about stability
+        unit.normal_streak = unit.normal_streak + 1 if consensus <= CONSENSUS_WATCH and not unable else 0
+        unit.tier = consensus_tier(consensus, unit.normal_streak)
+        unit.polls += 1
+        unit.last_poll = now
+        unit.poll_times.append(now)
+        while unit.poll_times and now - unit.poll_times[0] > RATE_WINDOW_S:
+            unit.poll_times.popleft()
+        self._reschedule(unit, now, self.intervals[unit.tier])
+
+    def _update_stretch(self):
+        """Scale intervals so the fleet's demanded device time fits the budget"""
+        if not self.unit_cost_s:
+            return
+        demand = self.unit_cost_s * sum(1.0 / self.intervals[unit.tier] for unit in self.units.values())
+        self.stretch = max(1.0, demand / self.budget)
+
+    def _reschedule(self, unit, now, interval):
+        # Anchored to the due time so the cadence does not drift; a unit that
+        # fell behind is due once now rather than for every missed interval
+        unit.due = max(unit.due + interval * self.stretch, now)
+        heapq.heappush(self.queue, (unit.due, unit.equipment_id))
+
+    def run(self, duration=None, on_step=None):
+        """Run until stop() or for `duration` seconds"""
+        end = None if duration is None else self.clock() + duration
+        while not self.stop_event.is_set():
+            self.step()
+            if on_step is not None:
+                on_step(self)
+            now = self.clock()
+            if end is not None and now >= end:
+                break
+            wake = self.next_wake()
+            timeout = 1.0 if wake is None else max(0.0, wake - now)
+            if end is not None:
+                timeout = min(timeout, end - now)
+            self.stop_event.wait(timeout)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def report(self):
+        """Per-unit target vs achieved polling rate plus fleet device-time use"""
+        now = self.clock()
+        with self.lock:
+            elapsed = max(now - self.started, 1e-9)
+            units = {}
+            for equipment_id, unit in self.units.items():
+                interval = self.intervals[unit.tier]
+                # At least one interval, so a single early poll does not read as a burst
+                window = max(min(elapsed, RATE_WINDOW_S), interval * self.stretch)
+                recent = sum(1 for t in unit.poll_times if now - t <= RATE_WINDOW_S)
+                units[str(equipment_id)] = {
+                    'tier': unit.tier,
+                    'interval_s': interval,
+                    'target_per_min': round(60.0 / interval, 3),
+                    'achieved_per_min': round(60.0 * recent / window, 3),
+                    'consensus': unit.consensus,
+                    'diagnosis': unit.diagnosis,
+                    'polls': unit.polls,
+                    'skipped': unit.skipped,
+                    'lag_s': round(max(0.0, now - unit.due), 3),
+                }
+            return {
+                'mode': self.mode,
+                'elapsed_s': round(elapsed, 3),
+                'batches': self.batches,
+                'budget': self.budget,
+                'interval_stretch': round(self.stretch, 3),
+                'device_utilization': round(self.device_s / elapsed, 4),
+                'units': units,
+            }
+
+
+def database_sink(conn):
+    """Sink storing each diagnosis in model_inferences the way server.js does"""
+    def store(unit, result, inference_time_ms):
+        result.pop('batch_size', None)
+        result['equipmentId'] = unit.equipment_id
+        result['timestamp'] = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        result['cadence'] = unit.tier
+        result['inferenceTimeMs'] = inference_time_ms
+        with conn:
+            conn.execute("INSERT INTO model_inferences (equipment_id, model_output, inference_time_ms, timestamp) "
+                         "VALUES (?, ?, ?, datetime('now'))", (unit.equipment_id, json.dumps(result), inference_time_ms))
+    return store
+
+
+def write_report(path, report):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(report, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Failed to write fleet status file {path}: {e}", file=sys.stderr)
+
+
+def fleet_main(diag, argv):
+    """Entry point for `hailo_inference.py fleet [options]`"""
+    parser = argparse.ArgumentParser(prog='hailo_inference.py fleet')
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite sensor database')
+    parser.add_argument('--ring', help='Read the latest rows from this shared-memory sensor ring instead of the database')
+    parser.add_argument('--equipment', help='Comma-separated equipment IDs (default: every unit with readings)')
+    parser.add_argument('--mode', choices=('sequential', 'simultaneous', 'cascade'), default='simultaneous')
+    parser.add_argument('--budget', type=float, default=0.5, help='Share of device time the fleet may use (0-1]')
+    parser.add_argument('--max-batch', type=int, default=64, help='Units diagnosed per batch')
+    parser.add_argument('--duration', type=float, help='Stop after this many seconds (default: until signalled)')
+    parser.add_argument('--status-file', default=FLEET_STATUS_FILE, help='Where the rate report is written')
+    parser.add_argument('--report-interval', type=float, default=30.0, help='Seconds between status file updates')
+    parser.add_argument('--no-store', action='store_true', help='Do not write diagnoses to model_inferences')
+    parser.add_argument('--rollup-file', default=ROLLUP_FILE, help='Where site/model rollups are snapshotted')
+    parser.add_argument('--rollup-interval', type=float, default=60.0, help='Seconds between rollup snapshots')
+    parser.add_argument('--sites', default=SITE_MAP_FILE, help='JSON file mapping equipment IDs to site names')
+    parser.add_argument('--no-rollup', action='store_true', help='Do not keep site/model rollups')
+    args = parser.parse_args(argv)
+
+    if not 0 < args.budget <= 1:
+        print(json.dumps({'error': '--budget must be in (0, 1]'}))
+        sys.exit(1)
+    # The ring replaces the database as the source; results still go to the database unless --no-store
+    needs_db = not args.ring or not args.no_store
+    if needs_db and not os.path.exists(args.db):
+        print(json.dumps({'error': f'Sensor database not found: {args.db}'}))
+        sys.exit(1)
+    ring = None
+    if args.ring:
+        from hailo_ring import SensorRingReader
+        try:
+            ring = SensorRingReader(args.ring)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'error': f'Sensor ring unavailable: {e}'}))
+            sys.exit(1)
+    site_map = None
+    if not args.no_rollup:
+        try:
+            site_map = load_site_map(args.sites)
+        except (OSError, ValueError) as e:
+            print(json.dumps({'error': f'Invalid site map: {e}'}))
+            sys.exit(1)
+    if not diag.initialize():
+        print(json.dumps({'error': 'Failed to initialize Hailo device'}))
+        diag.close()
+        sys.exit(1)
+
+    if not args.no_rollup:
+        from hailo_inference import MODEL_PATHS
+        diag.rollup = FleetRollup(MODEL_PATHS.keys(), site_map=site_map)
+        diag.rollup.restore(args.rollup_file)
+        diag.rollup.start(args.rollup_file, args.rollup_interval)
+
+    conn = sqlite3.connect(args.db) if needs_db else None
+    source = RingReadings(ring) if ring is not None else DatabaseReadings(conn)
+    if args.equipment:
+        equipment_ids = [int(value) for value in args.equipment.split(',')]
+    else:
+        equipment_ids = source.equipment_ids()
+    sink = None if args.no_store else database_sink(conn)
+    fleet = FleetScheduler(diag, source, equipment_ids, budget=args.budget, mode=args.mode,
+                           max_batch=args.max_batch, sink=sink)
+    last_report = [0.0]
+
+    def on_step(scheduler):
+        now = time.monotonic()
+        if now - last_report[0] >= args.report_interval:
+            last_report[0] = now
+            write_report(args.status_file, scheduler.report())
+
+    def on_signal(signum, frame):
+        fleet.stop()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    print(f"fleet: scheduling {len(equipment_ids)} units at {args.budget:.0%} device budget", file=sys.stderr)
+    try:
+        fleet.run(duration=args.duration, on_step=on_step)
+    except sqlite3.Error as e:
+        print(json.dumps({'error': f'Fleet scheduler stopped: {e}'}))
+        sys.exit(1)
+    finally:
+        report = fleet.report()
+        write_report(args.status_file, report)
+        if diag.rollup is not None:
+            diag.rollup.stop()
+        if conn is not None:
+            conn.close()
+        if ring is not None:
+            ring.close()
+        diag.close()
+    print(json.dumps(report))
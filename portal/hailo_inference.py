@@ -4,18 +4,22 @@ Hailo-8 NPU Inference Script for HVAC Fault Detection
 Uses actual HailoRT Python API for 8-model ensemble inference
 """
 
+import asyncio
+import functools
 import json
 import sys
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Try to import Hailo modules if available
-try:
-    from hailo_platform import VDevice, HailoStreamInterface, InferVStreams, ConfigureParams, InputVStreamParams, OutputVStreamParams, FormatType
-    HAILO_AVAILABLE = True
-except ImportError:
-    HAILO_AVAILABLE = False
+from hailo_backends import create_backend
+from hailo_cpu import CPU_FALLBACK, CpuBackend, available_weights
+from hailo_features import INPUT_FEATURES, features_from_columns, features_from_records
+from hailo_metrics import METRICS
+from hailo_registry import ModelRegistry
+from hailo_results import EnsembleResults, interpret
+from hailo_scheduler import ModelScheduler
 
 # Model paths - using actual HEF file locations
 MODEL_PATHS = {
@@ -29,177 +33,257 @@ MODEL_PATHS = {
     'gaia': '/home/Automata/mydata/apollo-nexus/models/gaia_simple.hef'
 }
 
+# Cascade mode: cheap gate models run first; the remaining specialists only
+# run when a gate model's confidence reaches the cascade threshold
+CASCADE_GATE_MODELS = ('apollo', 'colossus')
+CASCADE_SPECIALISTS = tuple(name for name in MODEL_PATHS if name not in CASCADE_GATE_MODELS)
+CASCADE_THRESHOLD = float(os.environ.get('APOLLO_CASCADE_THRESHOLD', 0.35))
+
+# Load order at startup: the cascade gates first so cascade mode is ready soonest
+MODEL_PRIORITY = [name.strip() for name in os.environ.get('APOLLO_MODEL_PRIORITY', '').split(',') if name.strip()] or \
+    list(CASCADE_GATE_MODELS) + list(CASCADE_SPECIALISTS)
+
+# Threads for the host-side and blocking work behind the async API
+ASYNC_WORKERS = int(os.environ.get('APOLLO_ASYNC_WORKERS', 4))
+
 class HailoHVACDiagnostics:
-    def __init__(self):
-        self.target = None
+    # Whether diagnose_batch() places rows by their equipment_ids (sharded subclasses)
+    routes_by_equipment = False
+
+    def __init__(self, backend=None, cache=None, load_policy=None, model_names=None):
+        self.backend = backend
+        self.cache = cache
+        self.load_policy = load_policy
+        # Subset of MODEL_PATHS this instance serves; the rest report 'Model not loaded'
+        self.model_names = list(model_names) if model_names is not None else list(MODEL_PATHS)
+        self.registry = None
         self.models = {}
-        self.network_groups = {}
+        self.pipelines = {}
+        self.scheduler = None
+        self.executor = None
+        # SpillBalancer moving batches to the CPU pool when the device queue backs up
+        self.spill = None
+        # FleetRollup fed with every fresh diagnose() result that names its unit
+        self.rollup = None
+        self.cascade_threshold = CASCADE_THRESHOLD
         
     def initialize(self):
-        """Initialize Hailo device and load models"""
+        """Initialize the inference backend and start loading the models
+        
+        Models are parsed in parallel and configured in MODEL_PRIORITY order;
+        APOLLO_MODEL_LOADING selects eager, background or lazy loading. When
+        the device cannot be opened and exported weights exist, the NumPy
+        CPU engine serves instead (APOLLO_CPU_FALLBACK=0 disables this).
+        """
+        model_paths = {name: path for name, path in MODEL_PATHS.items() if name in self.model_names}
         try:
-            # Create VDevice (virtual device)
-            params = VDevice.create_params()
-            # Don't set scheduling algorithm directly - use default
-            self.target = VDevice(params)
+            if self.backend is None:
+                self.backend = create_backend()
+            self.backend.open()
+        except Exception as e:
+            print(f"Failed to initialize Hailo device: {e}", file=sys.stderr)
+            if not CPU_FALLBACK or isinstance(self.backend, CpuBackend) or not available_weights(model_paths):
+                return False
+            print("Falling back to the CPU engine", file=sys.stderr)
+            if self.backend is not None:
+                try:
+                    self.backend.close()
+                except Exception:
+                    pass
+            self.backend = CpuBackend()
+            self.backend.open()
             
-            # Load all models
-            for model_name, model_path in MODEL_PATHS.items():
-                path = Path(model_path)
-                if path.exists():
-                    try:
-                        hef = self.target.create_hef_from_file(model_path)
-                        configure_params = ConfigureParams.create_from_hef(hef, interface=HailoStreamInterface.PCIe)
-                        network_group = self.target.configure(hef, configure_params)[0]
-                        self.network_groups[model_name] = network_group
-                        # Get file size in MB
-                        size_mb = path.stat().st_size / (1024 * 1024)
-                        self.models[model_name] = {'loaded': True, 'path': model_path, 'size': round(size_mb, 2)}
-                    except Exception as e:
-                        print(f"Error loading {model_name}: {e}", file=sys.stderr)
-                        self.models[model_name] = {'loaded': False, 'error': str(e), 'path': model_path}
-                else:
-                    self.models[model_name] = {'loaded': False, 'error': 'File not found', 'path': model_path}
-                    
+        try:
+            self.registry = ModelRegistry(self.backend, model_paths, priority=MODEL_PRIORITY, policy=self.load_policy)
+            self.models = self.registry.models
+            self.pipelines = self.registry.pipelines
+            self.registry.initialize()
+            
+            self.scheduler = ModelScheduler(self.backend, self.registry, order=list(MODEL_PATHS.keys()))
+            self.executor = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix='apollo-async')
             return True
         except Exception as e:
             print(f"Failed to initialize Hailo device: {e}", file=sys.stderr)
             return False
             
+    def model_available(self, model_name):
+        """True when the model is loaded or can still be loaded on first use"""
+        return self.registry is not None and self.registry.available(model_name)
+        
+    def load_report(self):
+        """Loading policy and per-model load/warm-up report"""
+        if self.registry is None:
+            return {'policy': self.load_policy, 'priority': [], 'models': {}}
+        return self.registry.report()
+            
     def prepare_sensor_data(self, sensor_data):
         """Convert sensor data to model input format"""
-        # Extract features from sensor data
-        features = []
-        
-        # Temperature features
-        features.append(sensor_data.get('supply_air_temp', 20.0))
-        features.append(sensor_data.get('return_air_temp', 22.0))
-        features.append(sensor_data.get('outside_air_temp', 25.0))
-        features.append(sensor_data.get('mixed_air_temp', 21.0))
-        
-        # Pressure features
-        features.append(sensor_data.get('supply_air_pressure', 1.5))
-        features.append(sensor_data.get('return_air_pressure', 1.2))
-        features.append(sensor_data.get('filter_pressure_drop', 0.3))
-        
-        # Flow features
-        features.append(sensor_data.get('supply_air_flow', 1000.0))
-        features.append(sensor_data.get('return_air_flow', 950.0))
-        
-        # Electrical features
-        features.append(sensor_data.get('compressor_current', 15.0))
-        features.append(sensor_data.get('fan_motor_current', 5.0))
-        features.append(sensor_data.get('power_consumption', 3500.0))
-        
-        # Humidity
-        features.append(sensor_data.get('supply_air_humidity', 45.0))
-        features.append(sensor_data.get('return_air_humidity', 50.0))
-        
-        # Setpoints and states
-        features.append(sensor_data.get('setpoint_temp', 22.0))
-        features.append(sensor_data.get('damper_position', 50.0))
-        features.append(sensor_data.get('valve_position', 30.0))
-        features.append(float(sensor_data.get('compressor_status', 0)))
-        features.append(float(sensor_data.get('fan_status', 1)))
-        
-        # Pad to expected input size (example: 32 features)
-        while len(features) < 32:
-            features.append(0.0)
-            
-        return np.array(features, dtype=np.float32).reshape(1, -1)
+        # Feature order, defaults and padding come from FEATURE_SCHEMA
+        with METRICS.timer('prepare'):
+            return features_from_records([sensor_data])
+        
+    def prepare_sensor_batch(self, sensor_list, out=None):
+        """Stack sensor data for several equipment units into an (N, 32) array
+        
+        Accepts a list of sensor dicts, a columnar dict of feature arrays or an
+        already-prepared (N, 32) array.
+        """
+        if isinstance(sensor_list, np.ndarray):
+            if sensor_list.ndim != 2 or sensor_list.shape[1] != INPUT_FEATURES:
+                raise ValueError(f'Input batch must have shape (N, {INPUT_FEATURES})')
+            return np.ascontiguousarray(sensor_list, dtype=np.float32)
+        with METRICS.timer('prepare'):
+            if isinstance(sensor_list, dict):
+                return features_from_columns(sensor_list, out=out)
+            return features_from_records(sensor_list, out=out)
         
     def run_inference(self, model_name, input_data):
-        """Run inference on a single model"""
-        if model_name not in self.network_groups:
+        """Run inference on a single model through its cached pipeline"""
+        pipeline = self.registry.get(model_name) if self.registry is not None else None
+        if pipeline is None:
             return None
             
-        network_group = self.network_groups[model_name]
-        
         try:
-            # Create input/output vstream params
-            input_vstreams_params = InputVStreamParams.make(network_group, format_type=FormatType.FLOAT32)
-            output_vstreams_params = OutputVStreamParams.make(network_group, format_type=FormatType.FLOAT32)
+            output = pipeline.infer(input_data)
+            return output[0]
+        except Exception as e:
+            print(f"Inference error for {model_name}: {e}", file=sys.stderr)
+            return None
             
-            # Get input/output vstream info
-            input_vstream_info = network_group.get_input_vstream_infos()[0]
-            output_vstream_info = network_group.get_output_vstream_infos()[0]
+    def run_batch_inference(self, model_name, input_batch):
+        """Run one model over an (N, 32) batch and return N fault probabilities
+        
+        The whole batch goes to the pipeline in a single call so HailoRT can
+        split it into as few device transfers as the configured batch size allows.
+        """
+        pipeline = self.registry.get(model_name) if self.registry is not None else None
+        if pipeline is None:
+            return None
             
-            # Create inference pipeline
-            with InferVStreams(network_group, input_vstreams_params, output_vstreams_params) as infer_pipeline:
-                # Prepare input dictionary
-                input_dict = {input_vstream_info.name: input_data}
-                
-                # Run inference
-                with network_group.activate():
-                    output = infer_pipeline.infer(input_dict)
-                    
-                # Get result
-                result = output[output_vstream_info.name][0]
-                return result
-                
+        try:
+            output = np.asarray(pipeline.infer(input_batch))
+            if output.ndim < 2 or output.shape[1] == 0:
+                return np.zeros(len(input_batch), dtype=np.float32)
+            return output[:, 0]
         except Exception as e:
-            print(f"Inference error for {model_name}: {e}", file=sys.stderr)
+            print(f"Batch inference error for {model_name}: {e}", file=sys.stderr)
             return None
             
     def run_simultaneous_inference(self, input_data):
-        """Run all models simultaneously using multi-stream capability"""
-        import threading
+        """Run all models through the scheduler's per-model queues
+        
+        Every loaded model gets a job queued at once; the scheduler drains each
+        model's queue before switching network groups, so concurrent callers
+        share activations instead of contending for the device.
+        """
         import time
         
         results = {}
-        threads = []
-        lock = threading.Lock()
+        futures = {}
         
-        def run_model(model_name):
-            """Thread function to run a single model"""
-            start_time = time.time()
-            
-            if self.models.get(model_name, {}).get('loaded'):
-                output = self.run_inference(model_name, input_data)
-                inference_time = (time.time() - start_time) * 1000  # Convert to ms
-                
-                with lock:
-                    if output is not None:
-                        fault_prob = float(output[0]) if len(output) > 0 else 0.0
-                        results[model_name] = {
-                            'fault_detected': fault_prob > 0.5,
-                            'confidence': fault_prob,
-                            'diagnosis': self.interpret_diagnosis(model_name, fault_prob),
-                            'inference_time_ms': round(inference_time, 2)
-                        }
-                    else:
-                        results[model_name] = {'error': 'Inference failed'}
-            else:
-                with lock:
-                    results[model_name] = {'error': 'Model not loaded'}
-        
-        # Start all model inferences in parallel
         start_time = time.time()
+        if self.spill is not None and self.spill.should_spill(self.scheduler, MODEL_PATHS.keys()):
+            # None when the CPU pool has broken: the device runs every model below
+            outcomes = self.spill.submit(MODEL_PATHS.keys(), input_data).result() or {}
+            for model_name, outcome in outcomes.items():
+                if 'error' in outcome:
+                    results[model_name] = outcome
+                    continue
+                fault_prob = float(outcome['probs'][0])
+                results[model_name] = {
+                    'fault_detected': fault_prob > 0.5,
+                    'confidence': fault_prob,
+                    'diagnosis': self.interpret_diagnosis(model_name, fault_prob),
+                    'inference_time_ms': outcome['inference_time_ms'],
+                    'engine': outcome['engine']
+                }
+            
         for model_name in MODEL_PATHS.keys():
-            thread = threading.Thread(target=run_model, args=(model_name,))
-            threads.append(thread)
-            thread.start()
-        
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
+            if model_name in results:
+                continue
+            if self.model_available(model_name) and self.scheduler is not None:
+                futures[model_name] = self.scheduler.submit(model_name, input_data)
+            else:
+                results[model_name] = {'error': 'Model not loaded'}
+                
+        for model_name, future in futures.items():
+            try:
+                output, info = future.result()
+            except Exception as e:
+                print(f"Inference error for {model_name}: {e}", file=sys.stderr)
+                results[model_name] = {'error': 'Inference failed'}
+                continue
+            with METRICS.timer('postprocess', model_name):
+                row = output[0]
+                fault_prob = float(row[0]) if len(row) > 0 else 0.0
+                results[model_name] = {
+                    'fault_detected': fault_prob > 0.5,
+                    'confidence': fault_prob,
+                    'diagnosis': self.interpret_diagnosis(model_name, fault_prob),
+                    'inference_time_ms': round(info['wait_ms'] + info['run_ms'], 2),
+                    'queue_depth': info['queue_depth'],
+                    'switches': self.scheduler.stats[model_name]['switches'],
+                    'engine': self.backend.name
+                }
         
         total_time = (time.time() - start_time) * 1000  # Convert to ms
         
-        # Add timing information
+        # Add timing information, keeping MODEL_PATHS order
+        results = {name: results[name] for name in MODEL_PATHS.keys()}
         for model_name in results:
             if 'error' not in results[model_name]:
                 results[model_name]['total_ensemble_time_ms'] = round(total_time, 2)
         
         return results
             
-    def diagnose(self, sensor_data, mode='sequential'):
+    def diagnose(self, sensor_data, mode='sequential', cascade_threshold=None, equipment_id=None, use_cache=True):
         """Run full 8-model diagnostic ensemble
         
         Args:
             sensor_data: Input sensor readings
-            mode: 'sequential' or 'simultaneous' execution mode
+            mode: 'sequential', 'simultaneous' or 'cascade' execution mode
+            cascade_threshold: Gate confidence that escalates to the specialist
+                models in cascade mode (default: self.cascade_threshold)
+            equipment_id: Equipment unit the readings belong to (cache key)
+            use_cache: Set False to bypass the result cache for this call
         """
+        if self.cache is None or not use_cache:
+            with METRICS.timer('ensemble'):
+                result = self.run_diagnosis(sensor_data, mode, cascade_threshold, equipment_id=equipment_id)
+            self._roll_up(equipment_id, result)
+            return result
+            
+        cache_key = self.cache.make_key(equipment_id, self.prepare_sensor_data(sensor_data)[0], (mode, cascade_threshold))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+            
+        with METRICS.timer('ensemble'):
+            result = self.run_diagnosis(sensor_data, mode, cascade_threshold, equipment_id=equipment_id)
+        self._roll_up(equipment_id, result)
+        # Only cache complete runs; failed models should be retried next time
+        if not any('error' in r for r in result['models'].values()):
+            self.cache.put(cache_key, result)
+        result['cache'] = {'hit': False}
+        return result
+        
+    def _roll_up(self, equipment_id, result):
+        """Feed a freshly computed result to the rollup; cache hits are not new results"""
+        if self.rollup is not None and equipment_id is not None:
+            with METRICS.timer('rollup'):
+                self.rollup.observe(equipment_id, result)
+        
+    def run_diagnosis(self, sensor_data, mode='sequential', cascade_threshold=None, equipment_id=None):
+        """Run the ensemble for one unit without consulting the cache
+        
+        equipment_id is unused here; sharded subclasses route on it.
+        """
+        if mode == 'cascade':
+            # Gate models first; specialists only when the gate escalates
+            result = self.diagnose_batch([sensor_data], mode='cascade', cascade_threshold=cascade_threshold)[0]
+            del result['batch_size']
+            return result
+            
         results = {}
         
         # Prepare input data
@@ -211,16 +295,18 @@ class HailoHVACDiagnostics:
         else:
             # Run each model sequentially (original implementation)
             for model_name in MODEL_PATHS.keys():
-                if self.models.get(model_name, {}).get('loaded'):
+                if self.model_available(model_name):
                     output = self.run_inference(model_name, input_data)
                     if output is not None:
                         # Interpret model output (example: fault probability)
-                        fault_prob = float(output[0]) if len(output) > 0 else 0.0
-                        results[model_name] = {
-                            'fault_detected': fault_prob > 0.5,
-                            'confidence': fault_prob,
-                            'diagnosis': self.interpret_diagnosis(model_name, fault_prob)
-                        }
+                        with METRICS.timer('postprocess', model_name):
+                            fault_prob = float(output[0]) if len(output) > 0 else 0.0
+                            results[model_name] = {
+                                'fault_detected': fault_prob > 0.5,
+                                'confidence': fault_prob,
+                                'diagnosis': self.interpret_diagnosis(model_name, fault_prob),
+                                'engine': self.backend.name
+                            }
                     else:
                         results[model_name] = {'error': 'Inference failed'}
                 else:
@@ -235,22 +321,321 @@ class HailoHVACDiagnostics:
             'mode': mode
         }
         
+    def run_models_batch(self, model_names, input_batch, simultaneous=True):
+        """Run the named models over an (N, 32) batch
+        
+        Returns {model_name: outcome} where outcome holds either 'error' or
+        'probs' (N fault probabilities) plus timing and scheduler details.
+        """
+        import time
+        
+        model_outputs = {}
+        
+        if simultaneous and self.spill is not None and self.spill.should_spill(self.scheduler, model_names):
+            outcomes = self.spill.submit(model_names, input_batch).result()
+            if outcomes is not None:
+                return outcomes
+            
+        if simultaneous and self.scheduler is not None:
+            futures = {}
+            for model_name in model_names:
+                if self.model_available(model_name):
+                    futures[model_name] = self.scheduler.submit(model_name, input_batch)
+                else:
+                    model_outputs[model_name] = {'error': 'Model not loaded'}
+            for model_name, future in futures.items():
+                try:
+                    output, info = future.result()
+                except Exception as e:
+                    print(f"Batch inference error for {model_name}: {e}", file=sys.stderr)
+                    model_outputs[model_name] = {'error': 'Inference failed'}
+                    continue
+                model_outputs[model_name] = self._scheduled_outcome(model_name, output, info, len(input_batch))
+        else:
+            for model_name in model_names:
+                model_start = time.time()
+                if not self.model_available(model_name):
+                    model_outputs[model_name] = {'error': 'Model not loaded'}
+                    continue
+                probs = self.run_batch_inference(model_name, input_batch)
+                if probs is None:
+                    model_outputs[model_name] = {'error': 'Inference failed'}
+                else:
+                    model_outputs[model_name] = {'probs': probs, 'inference_time_ms': round((time.time() - model_start) * 1000, 2),
+                                                 'engine': self.backend.name}
+                    
+        return model_outputs
+        
+    def _scheduled_outcome(self, model_name, output, info, count):
+        """run_models_batch outcome for one model from a scheduler result"""
+        return {
+            'probs': output[:, 0] if output.ndim == 2 and output.shape[1] else np.zeros(count, dtype=np.float32),
+            'inference_time_ms': round(info['wait_ms'] + info['run_ms'], 2),
+            'queue_depth': info['queue_depth'],
+            'switches': self.scheduler.stats[model_name]['switches'],
+            'engine': self.backend.name
+        }
+        
+    def run_cascade(self, input_batch, threshold=None):
+        """Run the gate models, then specialists only for rows the gate escalates
+        
+        A row escalates when any gate model's confidence reaches the threshold
+        or when a gate model could not produce a result. Specialist outcomes are
+        returned for escalated rows only, with 'rows' holding their indices.
+        """
+        threshold = self.cascade_threshold if threshold is None else threshold
+        
+        model_outputs = self.run_models_batch(CASCADE_GATE_MODELS, input_batch)
+        cascade = self._cascade_gate(model_outputs, len(input_batch), threshold)
+        rows = np.flatnonzero(cascade['escalated'])
+        if len(rows):
+            sub_batch = input_batch if len(rows) == len(input_batch) else input_batch[rows]
+            self._merge_specialists(model_outputs, self.run_models_batch(CASCADE_SPECIALISTS, sub_batch), rows, len(input_batch))
+        return model_outputs, cascade
+        
+    def _cascade_gate(self, model_outputs, count, threshold):
+        """Combine gate model outcomes into per-row escalation decisions"""
+        gate_confidence = np.zeros(count, dtype=np.float32)
+        gate_failed = False
+        for model_name in CASCADE_GATE_MODELS:
+            outcome = model_outputs[model_name]
+            if 'error' in outcome:
+                gate_failed = True
+            else:
+                gate_confidence = np.maximum(gate_confidence, outcome['probs'])
+                
+        if gate_failed:
+            escalated = np.ones(count, dtype=bool)
+        else:
+            escalated = gate_confidence >= threshold
+            
+        return {
+            'gate_models': list(CASCADE_GATE_MODELS),
+            'threshold': threshold,
+            'gate_confidence': gate_confidence,
+            'gate_failed': gate_failed,
+            'escalated': escalated,
+        }
+        
+    def _merge_specialists(self, model_outputs, specialist_outputs, rows, count):
+        """Add specialist outcomes, tagging sub-batch results with their row indices"""
+        if len(rows) == count:
+            model_outputs.update(specialist_outputs)
+            return
+        for model_name, outcome in specialist_outputs.items():
+            outcome['rows'] = rows
+            model_outputs[model_name] = outcome
+        
+    def diagnose_batch(self, sensor_list, mode='sequential', cascade_threshold=None, equipment_ids=None):
+        """Run the 8-model ensemble over several equipment units at once
+        
+        Args:
+            sensor_list: List of sensor reading dicts, one per equipment unit,
+                or a columnar dict mapping feature names to per-unit arrays
+            mode: 'sequential', 'simultaneous' or 'cascade' execution mode
+            cascade_threshold: Gate confidence that escalates a unit to the
+                specialist models in cascade mode (default: self.cascade_threshold)
+            equipment_ids: One unit ID per row; unused here, sharded
+                subclasses route rows on it
+            
+        Returns:
+            List of diagnose() results in input order
+        """
+        results = self.diagnose_columnar(sensor_list, mode, cascade_threshold)
+        with METRICS.timer('postprocess'):
+            return results.to_dicts()
+        
+    def diagnose_columnar(self, sensor_list, mode='sequential', cascade_threshold=None):
+        """diagnose_batch() without building the result dicts
+        
+        Returns an EnsembleResults holding the (N, 8) per-model results and
+        the vectorized consensus and primary fault; index or iterate it to
+        get diagnose() dicts, or use its arrays directly.
+        """
+        import time
+        
+        input_batch = self.prepare_sensor_batch(sensor_list)
+        if len(input_batch) == 0:
+            return EnsembleResults(MODEL_PATHS.keys(), 0, mode)
+            
+        cascade = None
+        start_time = time.time()
+        if mode == 'cascade':
+            model_outputs, cascade = self.run_cascade(input_batch, cascade_threshold)
+        else:
+            model_outputs = self.run_models_batch(MODEL_PATHS.keys(), input_batch, simultaneous=(mode == 'simultaneous'))
+        return self._columnar_results(input_batch, model_outputs, cascade, mode, start_time)
+        
+    def diagnose_matrix(self, sensor_list, mode='simultaneous', cascade_threshold=None):
+        """Ensemble confidences as arrays instead of per-unit result dicts
+        
+        Returns (confidences, consensus): an (N, 8) float32 array in
+        MODEL_PATHS order, NaN where a model produced no result or the
+        cascade skipped it, and the (N,) fraction of reporting models that
+        detected a fault - the same consensus aggregate_diagnoses() computes.
+        """
+        results = self.diagnose_columnar(sensor_list, mode, cascade_threshold)
+        return results.confidences(), results.consensus.astype(np.float32)
+        
+    def _columnar_results(self, input_batch, model_outputs, cascade, mode, start_time):
+        """Collect per-model batch outcomes into an EnsembleResults"""
+        import time
+        
+        total_time = round((time.time() - start_time) * 1000, 2)
+        with METRICS.timer('aggregate'):
+            results = EnsembleResults.from_model_outputs(MODEL_PATHS.keys(), model_outputs, len(input_batch), mode,
+                                                         total_time, cascade)
+        METRICS.observe('ensemble_batch', (time.time() - start_time) * 1000)
+        return results
+        
+    def _build_batch_results(self, input_batch, model_outputs, cascade, mode, start_time):
+        """Turn per-model batch outcomes into one diagnose() result per row"""
+        results = self._columnar_results(input_batch, model_outputs, cascade, mode, start_time)
+        with METRICS.timer('postprocess'):
+            return results.to_dicts()
+        
+    async def diagnose_async(self, sensor_data, mode='sequential', cascade_threshold=None, equipment_id=None,
+                             use_cache=True, timeout=None):
+        """Awaitable diagnose(): same arguments and result format
+        
+        Waiting for the device does not hold a thread, so one event loop can
+        keep thousands of requests pending. `timeout` (seconds) bounds each
+        model's wait; a model that misses it reports {'error': 'Inference
+        timed out'} and its queued job is withdrawn. Cancelling the calling
+        task withdraws every job that has not reached the device yet.
+        """
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = self.cache.make_key(equipment_id, self.prepare_sensor_data(sensor_data)[0], (mode, cascade_threshold))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+                
+        with METRICS.timer('ensemble'):
+            if mode == 'sequential':
+                # The sequential path blocks on each model in turn
+                result = await self._offload(self.run_diagnosis, sensor_data, mode, cascade_threshold, timeout=timeout)
+            else:
+                import time
+                
+                input_batch = self.prepare_sensor_data(sensor_data)
+                start_time = time.time()
+                model_outputs, cascade = await self._run_ensemble_async(input_batch, mode, cascade_threshold, timeout)
+                result = self._build_batch_results(input_batch, model_outputs, cascade, mode, start_time)[0]
+                del result['batch_size']
+        self._roll_up(equipment_id, result)
+                
+        if self.cache is not None and use_cache:
+            if not any('error' in r for r in result['models'].values()):
+                self.cache.put(cache_key, result)
+            result['cache'] = {'hit': False}
+        return result
+        
+    async def diagnose_batch_async(self, sensor_list, mode='sequential', cascade_threshold=None, timeout=None):
+        """Awaitable diagnose_batch(); input conversion and result building
+        run on the bounded executor so large batches do not stall the loop
+        """
+        import time
+        
+        input_batch = await self._offload(self.prepare_sensor_batch, sensor_list)
+        if len(input_batch) == 0:
+            return []
+        start_time = time.time()
+        model_outputs, cascade = await self._run_ensemble_async(input_batch, mode, cascade_threshold, timeout)
+        return await self._offload(self._build_batch_results, input_batch, model_outputs, cascade, mode, start_time)
+        
+    async def run_models_batch_async(self, model_names, input_batch, timeout=None):
+        """Awaitable run_models_batch(): one scheduler job per model, gathered
+        
+        Each model's job is awaited through its scheduler future, so no thread
+        waits on the device on the caller's behalf.
+        """
+        if self.scheduler is None:
+            return await self._offload(self.run_models_batch, model_names, input_batch, False)
+        if self.spill is not None and self.spill.should_spill(self.scheduler, model_names):
+            try:
+                outcomes = await asyncio.wait_for(asyncio.wrap_future(self.spill.submit(model_names, input_batch)),
+                                                  timeout)
+            except asyncio.TimeoutError:
+                return {name: {'error': 'Inference timed out', 'engine': 'cpu'} for name in model_names}
+            if outcomes is not None:
+                return outcomes
+            
+        model_outputs = {}
+        pending = []
+        for model_name in model_names:
+            if self.model_available(model_name):
+                future = self.scheduler.submit(model_name, input_batch)
+                pending.append((model_name, self._await_model(model_name, future, len(input_batch), timeout)))
+            else:
+                model_outputs[model_name] = {'error': 'Model not loaded'}
+                
+        outcomes = await asyncio.gather(*(awaitable for _, awaitable in pending))
+        for (model_name, _), outcome in zip(pending, outcomes):
+            model_outputs[model_name] = outcome
+        return {name: model_outputs[name] for name in model_names}
+        
+    async def _await_model(self, model_name, future, count, timeout):
+        try:
+            output, info = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # wait_for cancelled the scheduler job; it is dropped if still queued
+            return {'error': 'Inference timed out'}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Batch inference error for {model_name}: {e}", file=sys.stderr)
+            return {'error': 'Inference failed'}
+        return self._scheduled_outcome(model_name, output, info, count)
+        
+    async def run_cascade_async(self, input_batch, threshold=None, timeout=None):
+        """Awaitable run_cascade()"""
+        threshold = self.cascade_threshold if threshold is None else threshold
+        
+        model_outputs = await self.run_models_batch_async(CASCADE_GATE_MODELS, input_batch, timeout)
+        cascade = self._cascade_gate(model_outputs, len(input_batch), threshold)
+        rows = np.flatnonzero(cascade['escalated'])
+        if len(rows):
+            sub_batch = input_batch if len(rows) == len(input_batch) else input_batch[rows]
+            specialist_outputs = await self.run_models_batch_async(CASCADE_SPECIALISTS, sub_batch, timeout)
+            self._merge_specialists(model_outputs, specialist_outputs, rows, len(input_batch))
+        return model_outputs, cascade
+        
+    async def _run_ensemble_async(self, input_batch, mode, cascade_threshold, timeout):
+        """Per-model outcomes and cascade details for an (N, 32) batch"""
+        if mode == 'cascade':
+            return await self.run_cascade_async(input_batch, cascade_threshold, timeout)
+        if mode == 'simultaneous':
+            return await self.run_models_batch_async(MODEL_PATHS.keys(), input_batch, timeout), None
+        try:
+            model_outputs = await self._offload(self.run_models_batch, MODEL_PATHS.keys(), input_batch, False,
+                                                timeout=timeout)
+        except asyncio.TimeoutError:
+            model_outputs = {name: {'error': 'Inference timed out'} for name in MODEL_PATHS}
+        return model_outputs, None
+        
+    async def _offload(self, func, *args, timeout=None):
+        """Run blocking work on the bounded executor
+        
+        A timeout abandons the result, but work already running on the
+        executor thread finishes in the background.
+        """
+        loop = asyncio.get_running_loop()
+        call = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        if timeout is None:
+            return await call
+        return await asyncio.wait_for(call, timeout)
+            
     def interpret_diagnosis(self, model_name, fault_prob):
         """Interpret model-specific diagnosis"""
-        diagnoses = {
-            'apollo': 'System coordination normal' if fault_prob < 0.5 else 'System coordination issue detected',
-            'aquilo': 'Electrical systems normal' if fault_prob < 0.5 else 'Electrical fault detected',
-            'boreas': 'Refrigeration normal' if fault_prob < 0.5 else 'Refrigeration issue detected',
-            'naiad': 'Flow systems normal' if fault_prob < 0.5 else 'Flow restriction detected',
-            'vulcan': 'Mechanical systems normal' if fault_prob < 0.5 else 'Mechanical fault detected',
-            'zephyrus': 'Airflow normal' if fault_prob < 0.5 else 'Airflow issue detected',
-            'colossus': 'No pattern anomalies' if fault_prob < 0.5 else 'Pattern anomaly detected',
-            'gaia': 'Safety parameters normal' if fault_prob < 0.5 else 'Safety concern detected'
-        }
-        return diagnoses.get(model_name, 'Unknown')
+        return interpret(model_name, fault_prob)
         
     def aggregate_diagnoses(self, results):
         """Aggregate all model results into final diagnosis"""
+        with METRICS.timer('aggregate'):
+            return self._aggregate_diagnoses(results)
+            
+    def _aggregate_diagnoses(self, results):
         valid_results = [r for r in results.values() if 'confidence' in r]
         
         if not valid_results:
@@ -282,12 +667,11 @@ class HailoHVACDiagnostics:
     def get_device_status(self):
         """Get current device status"""
         try:
-            if self.target:
-                # Get device info
+            if self.backend is not None and self.backend.is_open:
                 return {
                     'online': True,
-                    'device': 'Hailo-8',
-                    'temperature': self.target.get_chip_temperature() if hasattr(self.target, 'get_chip_temperature') else None,
+                    'device': self.backend.device_name,
+                    'temperature': self.backend.get_temperature(),
                     'power': None,  # Would need specific API call
                     'utilization': None  # Would need specific API call
                 }
@@ -296,6 +680,30 @@ class HailoHVACDiagnostics:
             
         return {'online': False}
 
+    def close(self):
+        """Close every model pipeline and release the device"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+        if self.scheduler is not None:
+            self.scheduler.close()
+            self.scheduler = None
+        if self.registry is not None:
+            self.registry.close()
+        self.pipelines = {}
+        if self.backend is not None:
+            self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
 def main():
     """Main entry point for command-line usage"""
     if len(sys.argv) < 2:
@@ -308,82 +716,10 @@ def main():
     diag = HailoHVACDiagnostics()
     
     if command == 'status':
-        # Always use command line tools for status
-        import subprocess
-        try:
-            # Get device identity
-            result = subprocess.run(['hailortcli', 'fw-control', 'identify'], 
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                output = result.stdout
-                device_name = 'Hailo-8'
-                if 'Board Name:' in output:
-                    name_line = [l for l in output.split('\n') if 'Board Name:' in l][0]
-                    device_name = name_line.split(':', 1)[1].strip().rstrip('\x00')
-                
-                # Get power consumption
-                power = None
-                try:
-                    power_result = subprocess.run(['hailortcli', 'measure-power', '--duration', '1', '--type', 'POWER'],
-                                                 capture_output=True, text=True, timeout=3)
-                    if power_result.returncode == 0:
-                        # Parse average power from output
-                        for line in power_result.stdout.split('\n'):
-                            if 'Average value (W):' in line:
-                                power = float(line.split(':', 1)[1].strip())
-                                break
-                except:
-                    pass
-                
-                # Get Raspberry Pi CPU temperature instead of Hailo temp
-                temperature = None
-                try:
-                    with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-                        # Temperature is in millidegrees Celsius
-                        temp_raw = int(f.read().strip())
-                        temperature = round(temp_raw / 1000.0, 1)
-                except:
-                    pass
-                
-                # Calculate utilization based on power consumption and running processes
-                utilization = 0
-                tops_used = 0.0
-                try:
-                    # Estimate utilization based on power consumption
-                    # Hailo-8 max power is typically around 2.5W
-                    if power:
-                        # Calculate as percentage of typical max power
-                        max_power = 2.5
-                        utilization = min(100, int((power / max_power) * 100))
-                        
-                        # Calculate TOPS based on utilization
-                        # Hailo-8 has 26 TOPS maximum
-                        max_tops = 26.0
-                        tops_used = round((utilization / 100.0) * max_tops, 1)
-                    
-                    # Also check if inference processes are running
-                    ps_result = subprocess.run(['pgrep', '-f', 'hailortcli run|hailo run'], 
-                                             capture_output=True, text=True)
-                    if ps_result.stdout.strip():
-                        # If inference is running, ensure at least 15% utilization
-                        utilization = max(utilization, 15)
-                        tops_used = max(tops_used, 3.9)  # At least 15% of 26 TOPS
-                except:
-                    pass
-                
-                print(json.dumps({
-                    'online': True, 
-                    'device': device_name, 
-                    'temperature': temperature,
-                    'power': round(power, 2) if power else None,
-                    'utilization': utilization,
-                    'tops': tops_used,
-                    'max_tops': 26.0
-                }))
-            else:
-                print(json.dumps({'online': False, 'error': 'Device not detected'}))
-        except Exception as e:
-            print(json.dumps({'online': False, 'error': str(e)}))
+        # The telemetry collector's snapshot (written by `serve` or
+        # `telemetry`); without one the device is probed synchronously
+        from hailo_telemetry import status_main
+        status_main(sys.argv[2:])
             
     elif command == 'models':
         # Always return model info based on file existence
@@ -422,6 +758,73 @@ def main():
         except Exception as e:
             print(json.dumps({'error': str(e)}))
             
+    elif command == 'diagnose_batch':
+        # Run diagnosis for several equipment units in one pass
+        if len(sys.argv) < 3:
+            print(json.dumps({'error': 'No sensor data provided'}))
+            sys.exit(1)
+            
+        try:
+            sensor_list = json.loads(sys.argv[2])
+            if not isinstance(sensor_list, list):
+                print(json.dumps({'error': 'Sensor data must be a JSON list'}))
+                sys.exit(1)
+                
+            mode = 'simultaneous'
+            if len(sys.argv) > 3:
+                mode = sys.argv[3]
+                
+            if diag.initialize():
+                results = diag.diagnose_batch(sensor_list, mode=mode)
+                print(json.dumps(results))
+            else:
+                print(json.dumps({'error': 'Failed to initialize Hailo device'}))
+                
+        except json.JSONDecodeError:
+            print(json.dumps({'error': 'Invalid JSON sensor data'}))
+        except Exception as e:
+            print(json.dumps({'error': str(e)}))
+            
+    elif command == 'backfill':
+        # Rerun the ensemble over stored sensor_readings
+        from hailo_backfill import backfill_main
+        backfill_main(diag, sys.argv[2:])
+        
+    elif command == 'fleet':
+        # Adaptive per-unit polling of every unit's latest readings
+        from hailo_fleet import fleet_main
+        fleet_main(diag, sys.argv[2:])
+        
+    elif command == 'export_weights':
+        # Write CPU engine weights (the simulated networks, for dev machines)
+        from hailo_cpu import export_main
+        export_main(sys.argv[2:])
+        
+    elif command == 'rollup':
+        # Site/model rollups from the last snapshot, without the device
+        from hailo_rollup import rollup_main
+        rollup_main(sys.argv[2:])
+        
+    elif command == 'bench':
+        # Benchmark suite (simulated backend unless --backend hailo)
+        from hailo_bench import bench_main
+        bench_main(sys.argv[2:])
+        
+    elif command == 'telemetry':
+        # Standalone background telemetry collector
+        from hailo_telemetry import telemetry_main
+        telemetry_main(sys.argv[2:])
+        
+    elif command == 'metrics':
+        # Stage latency histograms from a running serve daemon
+        from hailo_daemon import metrics_main
+        metrics_main(sys.argv[2:])
+        
+    elif command == 'serve':
+        # Long-lived daemon: initialize once, then answer NDJSON requests
+        from hailo_daemon import serve_main
+        serve_main(diag, sys.argv[2:])
+        
     else:
         print(json.dumps({'error': f'Unknown command: {command}'}))
         
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Hot-path instrumentation for the inference engine
+Always-on monotonic stage timers feeding fixed-bucket histograms, exported as
+JSON or Prometheus text, plus opt-in cProfile/tracemalloc capture for one call
+"""
+
+import bisect
+import io
+import threading
+import time
+
+# Histogram bucket upper bounds in milliseconds
+DEFAULT_BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0,
+                      100.0, 250.0, 500.0, 1000.0, 2500.0, 10000.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and three adds"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max', 'lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value_ms):
+        index = bisect.bisect_left(self.buckets, value_ms)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def quantile(self, q, counts=None, count=None):
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        counts = self.counts if counts is None else counts
+        count = self.count if count is None else count
+        if not count:
+            return None
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.max
+
+    def snapshot(self):
+        with self.lock:
+            counts, count, total, maximum = list(self.counts), self.count, self.total, self.max
+        return {
+            'count': count,
+            'sum_ms': round(total, 4),
+            'mean_ms': round(total / count, 4) if count else None,
+            'max_ms': round(maximum, 4),
+            'p50_ms': _round(self.quantile(0.50, counts, count)),
+            'p95_ms': _round(self.quantile(0.95, counts, count)),
+            'p99_ms': _round(self.quantile(0.99, counts, count)),
+            'buckets': {str(bound): n for bound, n in zip(self.buckets + ('+Inf',), counts)},
+        }
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'model', 'start')
+
+    def __init__(self, metrics, stage, model):
+        self.metrics = metrics
+        self.stage = stage
+        self.model = model
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.stage, (time.perf_counter_ns() - self.start) / 1e6, self.model)
+        return False
+
+
+class Metrics:
+    """Registry of per-stage (and optionally per-model) latency histograms
+
+    Stages used by the engine:
+        prepare         sensor dicts -> (N, 32) input batch
+        pipeline_setup  vstream params + InferVStreams creation, once per model
+        activation      network-group switch on the device
+        queue_wait      time a request waited in the model scheduler
+        device_infer    the pipeline infer call itself
+        postprocess     building per-model result dicts
+        aggregate       aggregate_diagnoses
+        ensemble        a whole diagnose()/diagnose_batch() call
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, stage, model=None):
+        key = (stage, model)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage, value_ms, model=None):
+        self.histogram(stage, model).observe(value_ms)
+
+    def timer(self, stage, model=None):
+        """Context manager that records the elapsed time of its block"""
+        return _StageTimer(self, stage, model)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        """{stage: {'all' or model: histogram snapshot}}"""
+        with self.lock:
+            items = sorted(self.histograms.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+        result = {}
+        for (stage, model), histogram in items:
+            result.setdefault(stage, {})[model or 'all'] = histogram.snapshot()
+        return result
+
+    def render_prometheus(self, prefix='apollo_stage_duration_ms'):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self.lock:
+            items = sorted(self.histograms.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+        lines = [
+            f'# HELP {prefix} Inference engine stage latency in milliseconds',
+            f'# TYPE {prefix} histogram',
+        ]
+        for (stage, model), histogram in items:
+            with histogram.lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.total
+            labels = f'stage="{stage}"' + (f',model="{model}"' if model else '')
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{prefix}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_sum{{{labels}}} {total}')
+            lines.append(f'{prefix}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry used by the engine modules
+METRICS = Metrics()
+
+_profile_lock = threading.Lock()
+
+
+def profile_call(func, kind='cprofile', top=25):
+    """Run func() once under cProfile or tracemalloc; returns (result, report text)
+
+    cProfile only sees the calling thread (host-side work such as feature
+    preparation and result building); tracemalloc sees allocations from every
+    thread. Captures are serialized so concurrent profiles do not interfere.
+    """
+    with _profile_lock:
+        if kind == 'tracemalloc':
+            import tracemalloc
+
+            tracemalloc.start()
+            try:
+                before = tracemalloc.take_snapshot()
+                result = func()
+                after = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            stats = after.compare_to(before, 'lineno')[:top]
+            report = [f'current={current} bytes peak={peak} bytes']
+            report.extend(str(stat) for stat in stats)
+            return result, '\n'.join(report)
+
+        if kind == 'cprofile':
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            result = profiler.runcall(func)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+            return result, stream.getvalue()
+
+    raise ValueError(f'Unknown profile kind: {kind}')
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Quantized (UINT8) device I/O for the HVAC ensemble
+Converts (N, 32) float32 batches to the uint8 representation a HEF's input
+layer was calibrated for on the host, and device uint8 outputs back to
+float32, so transfers carry one byte per value and HailoRT skips its own
+per-call format conversion
+"""
+
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# real = (quantized - zero_point) * scale; each may be a scalar or per-channel array
+QuantParams = namedtuple('QuantParams', ['scale', 'zero_point'])
+
+UINT8_MAX = 255
+
+# Sigmoid confidences in [0, 1] map onto the full uint8 range
+PROBABILITY_PARAMS = QuantParams(np.float32(1.0 / UINT8_MAX), np.float32(0.0))
+
+
+def quant_params_from_info(vstream_info):
+    """QuantParams of a HailoRT vstream info
+
+    Uses the per-channel quant_infos list when the HEF has one, otherwise
+    the per-tensor quant_info.
+    """
+    infos = list(getattr(vstream_info, 'quant_infos', None) or [])
+    if len(infos) <= 1:
+        infos = [infos[0] if infos else vstream_info.quant_info]
+    scale = np.array([info.qp_scale for info in infos], dtype=np.float32)
+    zero_point = np.array([info.qp_zp for info in infos], dtype=np.float32)
+    if len(infos) == 1:
+        return QuantParams(scale[0], zero_point[0])
+    return QuantParams(scale, zero_point)
+
+
+def dequantize(values, params):
+    """float32 copy of uint8 device output"""
+    output = values.astype(np.float32)
+    output -= params.zero_point
+    output *= params.scale
+    return output
+
+
+class Quantizer:
+    """Host-side input quantization into a reusable uint8 buffer
+
+    quantize() fills the buffer in place - scale, offset, round and clamp in
+    a float32 scratch array, then one narrowing copy - and returns a view of
+    it that is only valid until the next call. Callers that may run
+    concurrently hold `lock` until the device has consumed the view.
+    """
+
+    def __init__(self, params, width):
+        self.params = params
+        self.width = width
+        self.inverse_scale = (np.float32(1.0) / np.asarray(params.scale, dtype=np.float32)).astype(np.float32)
+        self.zero_point = np.asarray(params.zero_point, dtype=np.float32)
+        self.lock = threading.Lock()
+        self._scratch = np.empty((0, width), dtype=np.float32)
+        self._buffer = np.empty((0, width), dtype=np.uint8)
+
+    def _reserve(self, count):
+        if count > len(self._buffer):
+            capacity = max(count, 2 * len(self._buffer))
+            self._scratch = np.empty((capacity, self.width), dtype=np.float32)
+            self._buffer = np.empty((capacity, self.width), dtype=np.uint8)
+        return self._scratch[:count], self._buffer[:count]
+
+    def quantize(self, batch):
+        scratch, buffer = self._reserve(len(batch))
+        np.multiply(batch, self.inverse_scale, out=scratch)
+        scratch += self.zero_point
+        np.rint(scratch, out=scratch)
+        np.clip(scratch, 0, UINT8_MAX, out=scratch)
+        np.copyto(buffer, scratch, casting='unsafe')
+        return buffer
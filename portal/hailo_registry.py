@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Model registry for the 8-model ensemble
+Parses model files concurrently, configures them on the device in priority
+order (eagerly, in the background or lazily on first use) and runs one
+warm-up inference per model so the first real request does not pay for it
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hailo_backends import model_file_size_mb
+from hailo_features import features_from_records
+from hailo_metrics import METRICS
+
+LOAD_POLICIES = ('eager', 'background', 'lazy')
+LOAD_POLICY = os.environ.get('APOLLO_MODEL_LOADING', 'eager').lower()
+
+
+class ModelRegistry:
+    """Owns the per-model pipelines and their load reports
+
+    eager       initialize() parses every model in parallel and configures
+                them in priority order before returning
+    background  initialize() returns at once; a loader thread works through
+                the priority list while requests load any model they need
+                first on demand
+    lazy        each model is parsed and configured on first use
+
+    Parsing (reading and validating the model file) runs on a thread pool;
+    configuring the device is serialized under the backend lock. `models`
+    holds one report per model with its state and the parse, setup and
+    warm-up times in ms.
+    """
+
+    def __init__(self, backend, model_paths, priority=None, policy=None, warmup=True, max_workers=4):
+        policy = (policy or LOAD_POLICY).lower()
+        if policy not in LOAD_POLICIES:
+            raise ValueError(f'Unknown model loading policy: {policy}')
+        self.backend = backend
+        self.model_paths = dict(model_paths)
+        self.priority = [name for name in (priority or ()) if name in self.model_paths]
+        self.priority += [name for name in self.model_paths if name not in self.priority]
+        self.policy = policy
+        self.warmup = warmup
+        self.max_workers = max(1, max_workers)
+        self.pipelines = {}
+        self.models = {name: {'loaded': False, 'state': 'pending', 'path': path}
+                       for name, path in self.model_paths.items()}
+        self.locks = {name: threading.Lock() for name in self.model_paths}
+        self.loader = None
+
+    def __contains__(self, model_name):
+        return self.available(model_name)
+
+    def available(self, model_name):
+        """True when the model is loaded or can still be loaded on demand"""
+        report = self.models.get(model_name)
+        return report is not None and report['state'] != 'failed'
+
+    def initialize(self):
+        """Start loading according to the policy"""
+        if self.policy == 'eager':
+            self.load_all()
+        elif self.policy == 'background':
+            self.loader = threading.Thread(target=self.load_all, name='apollo-model-loader', daemon=True)
+            self.loader.start()
+        return self
+
+    def load_all(self):
+        """Parse every pending model concurrently, then configure in priority order"""
+        pending = [name for name in self.priority if self.models[name]['state'] == 'pending']
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                thread_name_prefix='apollo-parse') as pool:
+            parsed = {name: pool.submit(self._parse, name) for name in pending}
+            for name in pending:
+                self._load(name, parsed[name])
+
+    def get(self, model_name):
+        """Return the model's pipeline, loading it first if needed; None if unavailable"""
+        pipeline = self.pipelines.get(model_name)
+        if pipeline is not None or not self.available(model_name):
+            return pipeline
+        return self._load(model_name)
+
+    def _parse(self, model_name):
+        """Check the model file and parse it; returns (parsed, size_mb, parse_ms)"""
+        model_path = self.model_paths[model_name]
+        size_mb = model_file_size_mb(model_path)
+        if size_mb is None and self.backend.requires_model_files:
+            raise FileNotFoundError('File not found')
+        start_time = time.perf_counter()
+        parsed = self.backend.parse_model(model_name, model_path)
+        return parsed, size_mb, (time.perf_counter() - start_time) * 1000
+
+    def _load(self, model_name, parsed_future=None):
+        with self.locks[model_name]:
+            report = self.models[model_name]
+            if report['state'] != 'pending':
+                return self.pipelines.get(model_name)
+            report['state'] = 'loading'
+            load_start = time.perf_counter()
+            pipeline = None
+            try:
+                parsed, size_mb, parse_ms = parsed_future.result() if parsed_future else self._parse(model_name)
+                with self.backend.lock:
+                    pipeline = self.backend.configure_model(model_name, parsed)
+                METRICS.observe('pipeline_setup', pipeline.setup_time_ms, model_name)
+
+                warmup_ms = None
+                if self.warmup:
+                    warmup_start = time.perf_counter()
+                    pipeline.infer(features_from_records([{}]))
+                    warmup_ms = (time.perf_counter() - warmup_start) * 1000
+                    METRICS.observe('warmup', warmup_ms, model_name)
+            except FileNotFoundError as e:
+                self._discard(model_name, pipeline)
+                self.models[model_name] = {'loaded': False, 'state': 'failed', 'error': str(e),
+                                           'path': report['path']}
+                return None
+            except Exception as e:
+                print(f"Error loading {model_name}: {e}", file=sys.stderr)
+                self._discard(model_name, pipeline)
+                self.models[model_name] = {'loaded': False, 'state': 'failed', 'error': str(e),
+                                           'path': report['path']}
+                return None
+
+            self.pipelines[model_name] = pipeline
+            self.models[model_name] = {
+                'loaded': True,
+                'state': 'loaded',
+                'path': report['path'],
+                'size': size_mb,
+                'io_format': 'uint8' if pipeline.quantized else 'float32',
+                'parse_time_ms': round(parse_ms, 2),
+                'setup_time_ms': round(pipeline.setup_time_ms, 2),
+                'warmup_time_ms': round(warmup_ms, 2) if warmup_ms is not None else None,
+                'load_time_ms': round((time.perf_counter() - load_start) * 1000, 2),
+            }
+            return pipeline
+
+    def _discard(self, model_name, pipeline):
+        """Release a pipeline whose warm-up failed after configure"""
+        if pipeline is None:
+            return
+        try:
+            pipeline.close()
+        except Exception as e:
+            print(f"Error closing {model_name}: {e}", file=sys.stderr)
+
+    def wait(self, timeout=None):
+        """Block until a background load has finished"""
+        if self.loader is not None:
+            self.loader.join(timeout)
+
+    def report(self):
+        """Load policy plus per-model reports in priority order"""
+        return {
+            'policy': self.policy,
+            'priority': list(self.priority),
+            'models': {name: dict(self.models[name]) for name in self.priority},
+        }
+
+    def close(self):
+        self.wait()
+        for pipeline in self.pipelines.values():
+            pipeline.close()
+        self.pipelines.clear()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Columnar ensemble results
+Holds a batch of diagnoses as NumPy arrays - one structured (N, 8) array of
+per-model confidences, flags and timings plus per-row aggregates - computes
+consensus and the primary fault vectorized, and only builds the familiar
+result dicts when they are asked for at the API boundary
+"""
+
+import numpy as np
+
+# Per-model normal / fault wording used by interpret_diagnosis()
+MODEL_DIAGNOSES = {
+    'apollo': ('System coordination normal', 'System coordination issue detected'),
+    'aquilo': ('Electrical systems normal', 'Electrical fault detected'),
+    'boreas': ('Refrigeration normal', 'Refrigeration issue detected'),
+    'naiad': ('Flow systems normal', 'Flow restriction detected'),
+    'vulcan': ('Mechanical systems normal', 'Mechanical fault detected'),
+    'zephyrus': ('Airflow normal', 'Airflow issue detected'),
+    'colossus': ('No pattern anomalies', 'Pattern anomaly detected'),
+    'gaia': ('Safety parameters normal', 'Safety concern detected'),
+}
+
+# One cell per (unit, model)
+MODEL_RESULT_DTYPE = np.dtype([
+    ('confidence', np.float32),
+    ('fault_detected', np.bool_),
+    ('status', np.uint8),
+    ('inference_time_ms', np.float32),
+    ('queue_depth', np.int32),
+    ('switches', np.int32),
+    ('engine', np.int8),
+])
+
+# Cell status codes; codes from STATUS_ERROR up index EnsembleResults.errors
+STATUS_OK = 0
+STATUS_SKIPPED = 1
+STATUS_ERROR = 2
+
+FAULT_THRESHOLD = 0.5
+CONSENSUS_FAULT = 0.7
+CONSENSUS_WATCH = 0.3
+
+# Final verdicts, as aggregate_diagnoses() words them
+VERDICT_UNABLE = 0
+VERDICT_NORMAL = 1
+VERDICT_WATCH = 2
+VERDICT_FAULT = 3
+VERDICT_TEXT = {
+    VERDICT_UNABLE: 'Unable to complete diagnosis',
+    VERDICT_NORMAL: 'System operating normally',
+    VERDICT_WATCH: 'Potential issue detected - monitoring recommended',
+}
+
+
+def interpret(model_name, fault_prob):
+    """Model-specific wording for one confidence"""
+    texts = MODEL_DIAGNOSES.get(model_name)
+    if texts is None:
+        return 'Unknown'
+    return texts[0] if fault_prob < FAULT_THRESHOLD else texts[1]
+
+
+class EnsembleResults:
+    """A batch of ensemble diagnoses in columnar form
+
+    `models` is a structured (N, len(model_names)) array of
+    MODEL_RESULT_DTYPE; queue_depth and switches are -1 when the model did
+    not run through the scheduler, and engine indexes `engines` (-1 when
+    untagged). `consensus`, `verdict` and `primary` (column of the
+    highest-confidence fault, -1 if none) are computed for the whole batch
+    at construction. Indexing or iterating yields the usual diagnose()
+    dicts, built on demand.
+    """
+
+    def __init__(self, model_names, count, mode, total_time_ms=0.0, cascade=None):
+        self.model_names = tuple(model_names)
+        self.mode = mode
+        self.total_time_ms = total_time_ms
+        self.cascade = cascade
+        self.models = np.zeros((count, len(self.model_names)), dtype=MODEL_RESULT_DTYPE)
+        self.models['queue_depth'] = -1
+        self.models['switches'] = -1
+        self.models['engine'] = -1
+        self.errors = []
+        self.engines = []
+        self.consensus = np.zeros(count, dtype=np.float64)
+        self.verdict = np.full(count, VERDICT_UNABLE, dtype=np.uint8)
+        self.primary = np.full(count, -1, dtype=np.int64)
+
+    @classmethod
+    def from_model_outputs(cls, model_names, model_outputs, count, mode, total_time_ms=0.0, cascade=None):
+        """Build from run_models_batch()/run_cascade() outcomes
+
+        A model missing from model_outputs, or an outcome carrying 'rows'
+        (the cascade's escalated sub-batch), leaves the other rows skipped.
+        """
+        results = cls(model_names, count, mode, total_time_ms, cascade)
+        models = results.models
+        for column, model_name in enumerate(results.model_names):
+            cells = models[:, column]
+            outcome = model_outputs.get(model_name)
+            if outcome is None:
+                cells['status'] = STATUS_SKIPPED
+                continue
+            if 'error' in outcome:
+                cells['status'] = results.error_code(outcome['error'])
+                continue
+            rows = outcome.get('rows')
+            if rows is not None:
+                cells['status'] = STATUS_SKIPPED
+                cells = models[rows, column]
+            cells['status'] = STATUS_OK
+            cells['confidence'] = outcome['probs']
+            cells['fault_detected'] = cells['confidence'] > FAULT_THRESHOLD
+            cells['inference_time_ms'] = outcome['inference_time_ms']
+            for key in ('queue_depth', 'switches'):
+                if key in outcome:
+                    cells[key] = outcome[key]
+            if 'engine' in outcome:
+                cells['engine'] = results.engine_code(outcome['engine'])
+            if rows is not None:
+                models[rows, column] = cells
+        results.aggregate()
+        return results
+
+    def error_code(self, message):
+        if message not in self.errors:
+            self.errors.append(message)
+        return STATUS_ERROR + self.errors.index(message)
+
+    def engine_code(self, engine):
+        if engine not in self.engines:
+            self.engines.append(engine)
+        return self.engines.index(engine)
+
+    def __len__(self):
+        return len(self.models)
+
+    def aggregate(self):
+        """Vectorized aggregate_diagnoses() over every row"""
+        valid = self.models['status'] == STATUS_OK
+        faults = valid & self.models['fault_detected']
+        reporting = np.count_nonzero(valid, axis=1)
+        votes = np.count_nonzero(faults, axis=1)
+        self.consensus = np.divide(votes, reporting, out=np.zeros(len(self), dtype=np.float64), where=reporting > 0)
+
+        self.verdict = np.where(self.consensus > CONSENSUS_FAULT, VERDICT_FAULT,
+                                np.where(self.consensus > CONSENSUS_WATCH, VERDICT_WATCH, VERDICT_NORMAL)).astype(np.uint8)
+        self.verdict[reporting == 0] = VERDICT_UNABLE
+
+        # Highest-confidence fault; argmax keeps the first model on ties
+        masked = np.where(faults, self.models['confidence'], -np.inf)
+        self.primary = np.where(votes > 0, np.argmax(masked, axis=1) if masked.size else -1, -1)
+        return self
+
+    def confidences(self):
+        """(N, models) float32 confidences with NaN where a model has no result"""
+        return np.where(self.models['status'] == STATUS_OK, self.models['confidence'], np.float32(np.nan))
+
+    def _final(self, verdict, consensus, primary, confidences):
+        if verdict == VERDICT_UNABLE:
+            return {'diagnosis': VERDICT_TEXT[VERDICT_UNABLE], 'consensus': 0}
+        if verdict == VERDICT_FAULT:
+            diagnosis = f"FAULT DETECTED: {interpret(self.model_names[primary], confidences[primary])}"
+        else:
+            diagnosis = VERDICT_TEXT[verdict]
+        return {'diagnosis': diagnosis, 'consensus': consensus}
+
+    def _rows(self, rows):
+        """Result dicts for a slice of rows, converting each column to Python once"""
+        models = self.models[rows]
+        columns = {field: models[field].tolist() for field in MODEL_RESULT_DTYPE.names}
+        verdicts = self.verdict[rows].tolist()
+        consensus = self.consensus[rows].tolist()
+        primary = self.primary[rows].tolist()
+        cascade = self.cascade
+        if cascade is not None:
+            gate_confidence = cascade['gate_confidence'][rows].astype(np.float64).tolist()
+            escalated = cascade['escalated'][rows].tolist()
+        errors = self.errors
+        engines = self.engines
+        count = len(self)
+
+        for index in range(len(verdicts)):
+            confidences = columns['confidence'][index]
+            statuses = columns['status'][index]
+            results = {}
+            skipped = []
+            for column, model_name in enumerate(self.model_names):
+                status = statuses[column]
+                if status == STATUS_SKIPPED:
+                    if cascade is not None:
+                        reason = f"Gate confidence {gate_confidence[index]:.3f} below cascade threshold {cascade['threshold']}"
+                    else:
+                        reason = 'Model skipped'
+                    results[model_name] = {'skipped': True, 'reason': reason}
+                    skipped.append(model_name)
+                    continue
+                if status != STATUS_OK:
+                    results[model_name] = {'error': errors[status - STATUS_ERROR]}
+                    continue
+                fault_prob = confidences[column]
+                result = {
+                    'fault_detected': columns['fault_detected'][index][column],
+                    'confidence': fault_prob,
+                    'diagnosis': interpret(model_name, fault_prob),
+                    'inference_time_ms': round(columns['inference_time_ms'][index][column], 2),
+                    'total_ensemble_time_ms': self.total_time_ms
+                }
+                for key in ('queue_depth', 'switches'):
+                    value = columns[key][index][column]
+                    if value >= 0:
+                        result[key] = value
+                engine = columns['engine'][index][column]
+                if engine >= 0:
+                    result['engine'] = engines[engine]
+                results[model_name] = result
+
+            entry = {
+                'models': results,
+                'final': self._final(verdicts[index], consensus[index], primary[index], confidences),
+                'mode': self.mode,
+                'batch_size': count
+            }
+            if cascade is not None:
+                entry['cascade'] = {
+                    'gate_models': cascade['gate_models'],
+                    'gate_confidence': gate_confidence[index],
+                    'threshold': cascade['threshold'],
+                    'escalated': escalated[index],
+                    'skipped': skipped
+                }
+                if cascade['gate_failed']:
+                    entry['cascade']['reason'] = 'Gate model unavailable - ran all models'
+            yield entry
+
+    def __getitem__(self, row):
+        """The diagnose_batch() result dict for one row"""
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError('result index out of range')
+        return next(self._rows(slice(row, row + 1)))
+
+    def __iter__(self):
+        return self._rows(slice(None))
+
+    def to_dicts(self):
+        return list(self._rows(slice(None)))
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Shared-memory sensor ring
+A fixed-layout, memory-mapped ring buffer file of model input rows that
+producers (server.js, or SensorRingWriter here) append to and the engine
+maps read-only, so the latest readings per unit reach inference without
+JSON in between
+
+Layout, all little-endian:
+
+    header (64 bytes)
+        magic 'ARNG' | version u16 | features u16 (= 32) | slot_count u32 |
+        slot_bytes u32 | write_seq u64 | created_at f64 | reserved 32 bytes
+    slot_count slots (152 bytes each)
+        seq u64 | equipment_id i32 | reserved u32 | timestamp f64 |
+        values f32[32]
+
+write_seq counts records ever published; record k lives in slot
+k % slot_count. A slot's seq is k + 1 once record k is complete and 0 while
+it is being written, so a reader that copies a slot and finds the same seq
+before and after knows the copy is whole, and a reader whose next expected
+record has a newer seq knows it was overwritten while it lagged. NaN in
+values means the sensor did not report; readers substitute schema defaults.
+"""
+
+import fcntl
+import os
+import threading
+import time
+
+import numpy as np
+
+from hailo_features import FEATURE_DEFAULTS, FEATURE_INDEX, INPUT_FEATURES, normalize_sensor_name
+
+RING_MAGIC = b'ARNG'
+RING_VERSION = 1
+
+DEFAULT_RING = os.environ.get('APOLLO_SENSOR_RING', '/dev/shm/apollo-sensor-ring')
+DEFAULT_SLOTS = 4096
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u2'),
+    ('features', '<u2'),
+    ('slot_count', '<u4'),
+    ('slot_bytes', '<u4'),
+    ('write_seq', '<u8'),
+    ('created_at', '<f8'),
+    ('reserved', 'V32'),
+])
+
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('equipment_id', '<i4'),
+    ('reserved', '<u4'),
+    ('timestamp', '<f8'),
+    ('values', '<f4', (INPUT_FEATURES,)),
+])
+
+
+def ring_bytes(slot_count):
+    return HEADER_DTYPE.itemsize + slot_count * SLOT_DTYPE.itemsize
+
+
+def row_from_readings(readings):
+    """float32 ring row from {sensor name: value}; unreported features stay NaN"""
+    row = np.full(INPUT_FEATURES, np.nan, dtype=np.float32)
+    for name, value in readings.items():
+        index = FEATURE_INDEX.get(normalize_sensor_name(name))
+        if index is not None and value is not None:
+            row[index] = value
+    return row
+
+
+def fill_defaults(rows):
+    """Model input rows with NaN (unreported) features replaced by schema defaults"""
+    return np.where(np.isnan(rows), FEATURE_DEFAULTS, rows).astype(np.float32, copy=False)
+
+
+def _map(path, mode):
+    """(header, slots) views of a ring file, after checking its layout"""
+    header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, shape=(1,))
+    if header['magic'][0] != RING_MAGIC or header['version'][0] != RING_VERSION:
+        raise ValueError(f'{path} is not a version {RING_VERSION} sensor ring')
+    if header['features'][0] != INPUT_FEATURES or header['slot_bytes'][0] != SLOT_DTYPE.itemsize:
+        raise ValueError(f'{path} has an incompatible slot layout')
+    slot_count = int(header['slot_count'][0])
+    if os.path.getsize(path) < ring_bytes(slot_count):
+        raise ValueError(f'{path} is truncated')
+    slots = np.memmap(path, dtype=SLOT_DTYPE, mode=mode, offset=HEADER_DTYPE.itemsize, shape=(slot_count,))
+    return header, slots
+
+
+class SensorRingWriter:
+    """Appends rows to a ring file, creating it when missing
+
+    Appends hold an exclusive flock on the file, so several Python producer
+    processes (and threads) may share one ring. server.js does not take the
+    lock; a ring it writes must have no other producer.
+    """
+
+    def __init__(self, path=DEFAULT_RING, slot_count=DEFAULT_SLOTS):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, slot_count)
+        self.header, self.slots = _map(path, 'r+')
+        self.slot_count = len(self.slots)
+        self.lock_file = open(path, 'rb')
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _create(path, slot_count):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = RING_MAGIC
+        header['version'] = RING_VERSION
+        header['features'] = INPUT_FEATURES
+        header['slot_count'] = slot_count
+        header['slot_bytes'] = SLOT_DTYPE.itemsize
+        header['created_at'] = time.time()
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header.tobytes())
+            f.truncate(ring_bytes(slot_count))
+        os.replace(tmp_path, path)
+
+    def append(self, equipment_id, timestamp, row):
+        self.append_batch([equipment_id], [timestamp], np.asarray(row, dtype=np.float32).reshape(1, INPUT_FEATURES))
+
+    def append_batch(self, equipment_ids, timestamps, rows):
+        """Publish (N, 32) rows; only the newest slot_count survive a larger batch"""
+        rows = np.asarray(rows, dtype=np.float32)
+        count = len(rows)
+        if count == 0:
+            return
+        skip = max(0, count - self.slot_count)
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            try:
+                start = int(self.header['write_seq'][0]) + skip
+                seqs = np.arange(start, start + count - skip, dtype=np.uint64)
+                index = seqs % self.slot_count
+                # Invalidate, fill, then publish each slot's sequence number
+                self.slots['seq'][index] = 0
+                self.slots['equipment_id'][index] = np.asarray(equipment_ids)[skip:]
+                self.slots['timestamp'][index] = np.asarray(timestamps, dtype=np.float64)[skip:]
+                self.slots['values'][index] = rows[skip:]
+                self.slots['seq'][index] = seqs + 1
+                self.header['write_seq'] = start + count - skip
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def flush(self):
+        self.slots.flush()
+        self.header.flush()
+
+    def close(self):
+        self.lock_file.close()
+        del self.slots, self.header
+
+
+class SensorRingReader:
+    """Read-only view of a ring file
+
+    read_since() follows the stream record by record and reports records
+    lost to a lagging reader; latest() snapshots the whole ring and picks
+    the newest rows per unit. Both copy what they return, validating every
+    slot's sequence number after the copy.
+    """
+
+    def __init__(self, path=DEFAULT_RING):
+        self.path = path
+        self.header, self.slots = _map(path, 'r')
+        self.slot_count = len(self.slots)
+
+    def write_seq(self):
+        return int(self.header['write_seq'][0])
+
+    def _copy(self, index):
+        """Copy the slots at `index`, then re-read their sequence numbers
+
+        A copied slot is whole when its seq is non-zero and still matches:
+        a writer zeroes seq before touching a slot and never reuses a value.
+        """
+        records = self.slots[index]
+        return records, self.slots['seq'][index]
+
+    def read_since(self, cursor):
+        """Records published at or after sequence `cursor`
+
+        Returns (records, next_cursor, lost): records is a structured array
+        in publication order, lost counts records overwritten before they
+        could be read.
+        """
+        head = self.write_seq()
+        lost = 0
+        if head - cursor > self.slot_count:
+            lost = head - self.slot_count - cursor
+            cursor = head - self.slot_count
+        seqs = np.arange(cursor, head, dtype=np.uint64)
+        records, after = self._copy(seqs % self.slot_count)
+        valid = (records['seq'] == seqs + 1) & (after == seqs + 1)
+        lost += int(np.count_nonzero(~valid))
+        return records[valid], head, lost
+
+    def latest(self, equipment_ids=None, per_unit=1):
+        """{equipment_id: (timestamps, rows)} with each unit's newest rows, newest first
+
+        rows are (k, 32) float32 model inputs with defaults filled in,
+        k <= per_unit.
+        """
+        records, after = self._copy(np.arange(self.slot_count))
+        records = records[(records['seq'] == after) & (after > 0)]
+        if equipment_ids is not None:
+            records = records[np.isin(records['equipment_id'], np.asarray(list(equipment_ids)))]
+        if len(records) == 0:
+            return {}
+
+        # Group by unit, newest first within each unit
+        order = np.lexsort((-records['seq'].astype(np.int64), records['equipment_id']))
+        records = records[order]
+        units, starts, counts = np.unique(records['equipment_id'], return_index=True, return_counts=True)
+        latest = {}
+        for unit, start, count in zip(units.tolist(), starts.tolist(), counts.tolist()):
+            chosen = records[start:start + min(count, per_unit)]
+            latest[unit] = (chosen['timestamp'], fill_defaults(chosen['values']))
+        return latest
+
+    def latest_batch(self, equipment_ids=None):
+        """(equipment_ids, timestamps, (N, 32) rows) with each unit's newest reading, by unit"""
+        latest = self.latest(equipment_ids)
+        units = sorted(latest)
+        if not units:
+            return [], np.zeros(0), np.zeros((0, INPUT_FEATURES), dtype=np.float32)
+        timestamps = np.array([latest[unit][0][0] for unit in units])
+        rows = np.stack([latest[unit][1][0] for unit in units])
+        return units, timestamps, rows
+
+    def latest_rows(self, equipment_ids):
+        """{equipment_id: (32,) float32 row} for the newest reading of each listed unit"""
+        return {unit: rows[0] for unit, (_, rows) in self.latest(equipment_ids).items()}
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'slot_count': self.slot_count,
+            'write_seq': self.write_seq(),
+            'created_at': float(self.header['created_at'][0]),
+        }
+
+    def close(self):
+        del self.slots, self.header
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Incremental fleet rollups of diagnosis results
+Keeps per-site, per-model counters as each diagnosis is produced - verdict
+and confidence-band counts in one-minute buckets over a rolling hour,
+confidence histograms, time-decayed average confidences and how many units
+currently sit in each band - so site-wide views never rescan
+model_inferences. State is snapshotted to a compressed .npz and reloaded on
+start-up.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from hailo_results import (CONSENSUS_FAULT, CONSENSUS_WATCH, FAULT_THRESHOLD, STATUS_ERROR, STATUS_OK, VERDICT_FAULT,
+                           VERDICT_NORMAL, VERDICT_UNABLE, VERDICT_WATCH)
+
+ROLLUP_FILE = os.environ.get('APOLLO_ROLLUP_FILE', '/tmp/apollo-rollup.npz')
+SITE_MAP_FILE = os.environ.get('APOLLO_SITE_MAP')
+DEFAULT_SITE = 'default'
+
+# Rolling window: BUCKETS buckets of BUCKET_S seconds
+BUCKET_S = 60
+BUCKETS = 60
+
+# Confidence histogram bins over [0, 1]
+HIST_BINS = 10
+
+# Time constant of the decayed averages, in seconds
+DECAY_S = 900.0
+
+# Single results queued before they are folded in together
+PENDING_ROWS = 64
+
+SNAPSHOT_VERSION = 1
+
+VERDICT_NAMES = ('unable', 'normal', 'watch', 'fault')
+BAND_NAMES = ('normal', 'watch', 'fault')
+BAND_NORMAL = 0
+BAND_WATCH = 1
+BAND_FAULT = 2
+NO_BAND = -1
+
+
+def confidence_bands(confidences, valid):
+    """Per-model band codes: fault at the fault threshold, watch at the consensus watch level"""
+    bands = np.where(confidences > FAULT_THRESHOLD, BAND_FAULT,
+                     np.where(confidences > CONSENSUS_WATCH, BAND_WATCH, BAND_NORMAL))
+    return np.where(valid, bands, NO_BAND).astype(np.int8)
+
+
+def load_site_map(path=SITE_MAP_FILE):
+    """{equipment_id: site} from a JSON object file, or {} when unset"""
+    if not path:
+        return {}
+    with open(path) as f:
+        return {unit_id(equipment_id): str(site) for equipment_id, site in json.load(f).items()}
+
+
+class FleetRollup:
+    """Per-site rolling aggregates of ensemble results, updated in O(models) per result
+
+    Arrays carry a leading site axis (`sites` lists the names): per bucket
+    the verdict counts, per-model band counts, error counts and confidence
+    histograms; per model (and the consensus, in the last column) a
+    decayed sum and weight whose ratio is the exponentially decayed
+    average. Each unit's latest verdict and per-model bands are kept so
+    the current per-band unit counts can be moved, not recounted.
+    Timestamps are wall-clock seconds so snapshots stay valid across
+    restarts; results older than the window only update the totals and
+    decayed averages.
+    """
+
+    def __init__(self, model_names, site_map=None, bucket_s=BUCKET_S, buckets=BUCKETS, decay_s=DECAY_S,
+                 clock=time.time):
+        self.model_names = tuple(model_names)
+        self.site_map = {unit_id(equipment_id): site for equipment_id, site in (site_map or {}).items()}
+        self.bucket_s = bucket_s
+        self.buckets = buckets
+        self.decay_s = decay_s
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sites = []
+        self.site_index = {}
+        models = len(self.model_names)
+        self.epoch = np.zeros((0, buckets), dtype=np.int64)
+        self.verdicts = np.zeros((0, buckets, len(VERDICT_NAMES)), dtype=np.int32)
+        self.bands = np.zeros((0, buckets, models, len(BAND_NAMES)), dtype=np.int32)
+        self.errors = np.zeros((0, buckets, models), dtype=np.int32)
+        self.histogram = np.zeros((0, buckets, models, HIST_BINS), dtype=np.int32)
+        self.decayed_sum = np.zeros((0, models + 1), dtype=np.float64)
+        self.decayed_weight = np.zeros((0, models + 1), dtype=np.float64)
+        self.decayed_at = np.zeros((0, models + 1), dtype=np.float64)
+        self.totals = np.zeros((0, len(VERDICT_NAMES)), dtype=np.int64)
+        self.unit_verdicts = np.zeros((0, len(VERDICT_NAMES)), dtype=np.int32)
+        self.unit_bands = np.zeros((0, models, len(BAND_NAMES)), dtype=np.int32)
+        # equipment_id -> [site index, verdict, per-model bands, last seen]
+        self.units = {}
+        self.pending = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.path = None
+
+    def _site(self, name):
+        """Index of a site, growing the arrays for a new one (lock held)"""
+        index = self.site_index.get(name)
+        if index is not None:
+            return index
+        index = len(self.sites)
+        self.sites.append(name)
+        self.site_index[name] = index
+        for field in ('epoch', 'verdicts', 'bands', 'errors', 'histogram', 'decayed_sum', 'decayed_weight',
+                      'decayed_at', 'totals', 'unit_verdicts', 'unit_bands'):
+            array = getattr(self, field)
+            row = np.zeros((1,) + array.shape[1:], dtype=array.dtype)
+            if field == 'epoch':
+                row[:] = -1
+            setattr(self, field, np.concatenate([array, row]))
+        return index
+
+    def site_of(self, equipment_id):
+        return self.site_map.get(unit_id(equipment_id), DEFAULT_SITE)
+
+    def observe(self, equipment_id, result, timestamp=None, site=None):
+        """Add one diagnose() result dict
+
+        Single results are queued and folded in PENDING_ROWS at a time (or
+        before any query or snapshot), which keeps the per-result cost low.
+        Results for non-integer equipment IDs are skipped with a warning so
+        the rollup never fails the diagnosis that fed it.
+        """
+        try:
+            equipment_id = unit_id(equipment_id)
+        except ValueError as e:
+            print(f"Rollup skipped a result: {e}", file=sys.stderr)
+            return
+        models = [result.get('models', {}).get(model_name, {}) for model_name in self.model_names]
+        valid = ['confidence' in model for model in models]
+        consensus = float(result.get('final', {}).get('consensus', 0.0))
+        row = (equipment_id, site, self.clock() if timestamp is None else timestamp, _verdict(consensus, any(valid)),
+               consensus, [model.get('confidence', 0.0) for model in models], valid,
+               ['error' in model for model in models])
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= PENDING_ROWS:
+                self._flush()
+
+    def observe_columnar(self, equipment_ids, results, timestamp=None, sites=None):
+        """Add every row of an EnsembleResults; equipment_ids gives each row's unit
+
+        Raises ValueError for a non-integer ID or a length mismatch, so
+        callers should validate before running the batch.
+        """
+        if len(equipment_ids) != len(results):
+            raise ValueError('equipment_ids must have one entry per result')
+        if len(results) == 0:
+            return
+        equipment_ids = [unit_id(equipment_id) for equipment_id in equipment_ids]
+        status = results.models['status']
+        now = self.clock() if timestamp is None else timestamp
+        with self.lock:
+            self._flush()
+            self._add(equipment_ids, sites or [None] * len(results), np.full(len(results), now),
+                      results.verdict, results.consensus, results.models['confidence'], status == STATUS_OK,
+                      status >= STATUS_ERROR)
+
+    def _flush(self):
+        """Fold queued single results into the aggregates (lock held)"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        equipment_ids, sites, times, verdicts, consensus, confidences, valid, failed = zip(*pending)
+        self._add(list(equipment_ids), sites, np.array(times, dtype=np.float64), verdicts, consensus,
+                  np.array(confidences, dtype=np.float32), np.array(valid, dtype=bool), np.array(failed, dtype=bool))
+
+    def _add(self, equipment_ids, sites, times, verdicts, consensus, confidences, valid, failed):
+        """Update every aggregate for N results in time order (lock held)
+
+        confidences, valid and failed are (N, models); the work per result
+        is constant, spread over a few vectorized scatter-adds.
+        """
+        site_rows = np.array([self._site(site or self.site_of(equipment_id))
+                              for equipment_id, site in zip(equipment_ids, sites)], dtype=np.int64)
+        verdicts = np.asarray(verdicts, dtype=np.int64)
+        bands = confidence_bands(confidences, valid)
+
+        # Rolling window: recycle a bucket when it last held an older period
+        periods = (times // self.bucket_s).astype(np.int64)
+        for period in np.unique(periods).tolist():
+            b = period % self.buckets
+            in_period = periods == period
+            touched = np.unique(site_rows[in_period])
+            stale = touched[self.epoch[touched, b] < period]
+            self.epoch[stale, b] = period
+            self.verdicts[stale, b] = 0
+            self.bands[stale, b] = 0
+            self.errors[stale, b] = 0
+            self.histogram[stale, b] = 0
+            live = in_period & (self.epoch[site_rows, b] == period)
+            if not live.any():
+                continue
+            np.add.at(self.verdicts, (site_rows[live], b, verdicts[live]), 1)
+            rows, columns = np.nonzero(valid & live[:, None])
+            np.add.at(self.bands, (site_rows[rows], b, columns, bands[rows, columns]), 1)
+            bins = np.clip((confidences[rows, columns] * HIST_BINS).astype(np.int64), 0, HIST_BINS - 1)
+            np.add.at(self.histogram, (site_rows[rows], b, columns, bins), 1)
+            rows, columns = np.nonzero(failed & live[:, None])
+            np.add.at(self.errors, (site_rows[rows], b, columns), 1)
+        np.add.at(self.totals, (site_rows, verdicts), 1)
+
+        # Decayed averages: bring each site's sums and the new values to a
+        # common reference time, then add
+        reporting = (verdicts != VERDICT_UNABLE)[:, None]
+        mask = np.concatenate([valid, reporting], axis=1) & reporting
+        values = np.concatenate([confidences, np.asarray(consensus, dtype=np.float64)[:, None]], axis=1)
+        for s in np.unique(site_rows).tolist():
+            rows = site_rows == s
+            site_mask = mask[rows]
+            columns = np.flatnonzero(site_mask.any(axis=0))
+            at = self.decayed_at[s, columns]
+            reference = np.maximum(at, times[rows].max())
+            weights = np.exp(-(reference - times[rows][:, None]) / self.decay_s) * site_mask[:, columns]
+            decay = np.exp(-(reference - at) / self.decay_s)
+            self.decayed_sum[s, columns] = self.decayed_sum[s, columns] * decay + \
+                (weights * values[rows][:, columns]).sum(axis=0)
+            self.decayed_weight[s, columns] = self.decayed_weight[s, columns] * decay + weights.sum(axis=0)
+            self.decayed_at[s, columns] = reference
+
+        # Current state: move each unit from its previous bands to its latest ones
+        latest = {}
+        for row, equipment_id in enumerate(equipment_ids):
+            latest[equipment_id] = row
+        previous = [self.units[equipment_id] for equipment_id in latest if equipment_id in self.units]
+        if previous:
+            self._count_units([unit[0] for unit in previous], [unit[1] for unit in previous],
+                              np.array([unit[2] for unit in previous]), -1)
+        rows = np.fromiter(latest.values(), dtype=np.int64, count=len(latest))
+        self._count_units(site_rows[rows], verdicts[rows], bands[rows], 1)
+        for equipment_id, site, verdict, unit_bands, seen in zip(latest, site_rows[rows].tolist(),
+                                                                 verdicts[rows].tolist(), bands[rows],
+                                                                 times[rows].tolist()):
+            self.units[equipment_id] = [site, verdict, unit_bands, seen]
+
+    def _count_units(self, site_rows, verdicts, bands, delta):
+        """Add delta to the current counts for units (sites, verdicts, (K, models) bands)"""
+        site_rows = np.asarray(site_rows, dtype=np.int64)
+        np.add.at(self.unit_verdicts, (site_rows, np.asarray(verdicts, dtype=np.int64)), delta)
+        rows, columns = np.nonzero(bands != NO_BAND)
+        np.add.at(self.unit_bands, (site_rows[rows], columns, bands[rows, columns]), delta)
+
+    def summary(self, site=None, window_s=None):
+        """Aggregates over the last window_s seconds (at most the full window) for one site or all"""
+        now = self.clock()
+        window_s = self.bucket_s * self.buckets if window_s is None else min(window_s, self.bucket_s * self.buckets)
+        with self.lock:
+            self._flush()
+            if site is None:
+                rows = slice(None)
+            elif site in self.site_index:
+                rows = [self.site_index[site]]
+            else:
+                return {'error': f'Unknown site: {site}', 'sites': list(self.sites)}
+            period = int(now // self.bucket_s)
+            oldest = period - max(1, int(np.ceil(window_s / self.bucket_s))) + 1
+            live = (self.epoch[rows] >= oldest) & (self.epoch[rows] <= period)
+            verdicts = (self.verdicts[rows] * live[..., None]).sum(axis=(0, 1))
+            bands = (self.bands[rows] * live[..., None, None]).sum(axis=(0, 1))
+            errors = (self.errors[rows] * live[..., None]).sum(axis=(0, 1))
+            histogram = (self.histogram[rows] * live[..., None, None]).sum(axis=(0, 1))
+            decay = np.exp(-np.maximum(now - self.decayed_at[rows], 0.0) / self.decay_s)
+            decayed_sum = (self.decayed_sum[rows] * decay).sum(axis=0)
+            decayed_weight = (self.decayed_weight[rows] * decay).sum(axis=0)
+            totals = self.totals[rows].sum(axis=0)
+            unit_verdicts = self.unit_verdicts[rows].sum(axis=0)
+            unit_bands = self.unit_bands[rows].sum(axis=0)
+            sites = list(self.sites) if site is None else [site]
+
+        averages = np.divide(decayed_sum, decayed_weight, out=np.full_like(decayed_sum, np.nan),
+                             where=decayed_weight > 1e-12)
+        models = {}
+        for column, model_name in enumerate(self.model_names):
+            models[model_name] = {
+                'results': int(bands[column].sum()),
+                'bands': dict(zip(BAND_NAMES, bands[column].tolist())),
+                'errors': int(errors[column]),
+                'histogram': histogram[column].tolist(),
+                'decayed_confidence': _rounded(averages[column]),
+                'units': dict(zip(BAND_NAMES, unit_bands[column].tolist())),
+            }
+        return {
+            'sites': sites,
+            'window_s': window_s,
+            'diagnoses': int(verdicts.sum()),
+            'verdicts': dict(zip(VERDICT_NAMES, verdicts.tolist())),
+            'decayed_consensus': _rounded(averages[-1]),
+            'models': models,
+            'units': dict(zip(VERDICT_NAMES, unit_verdicts.tolist()), total=int(unit_verdicts.sum())),
+            'totals': dict(zip(VERDICT_NAMES, totals.tolist())),
+            'decay_s': self.decay_s,
+            'histogram_bins': HIST_BINS,
+        }
+
+    def save(self, path=ROLLUP_FILE):
+        """Write the state atomically as a compressed .npz"""
+        with self.lock:
+            self._flush()
+            unit_ids = np.array(list(self.units), dtype=np.int64)
+            units = list(self.units.values())
+            arrays = {
+                'version': np.array(SNAPSHOT_VERSION),
+                'model_names': np.array(self.model_names),
+                'sites': np.array(self.sites, dtype=str),
+                'layout': np.array([self.bucket_s, self.buckets, HIST_BINS], dtype=np.int64),
+                'unit_ids': unit_ids,
+                'unit_site': np.array([unit[0] for unit in units], dtype=np.int32),
+                'unit_verdict': np.array([unit[1] for unit in units], dtype=np.int8),
+                'unit_bands': np.array([unit[2] for unit in units], dtype=np.int8).reshape(len(units), len(self.model_names)),
+                'unit_seen': np.array([unit[3] for unit in units], dtype=np.float64),
+            }
+            for field in ('epoch', 'verdicts', 'bands', 'errors', 'histogram', 'decayed_sum', 'decayed_weight',
+                          'decayed_at', 'totals'):
+                arrays[field] = getattr(self, field)
+            tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+            np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def restore(self, path=ROLLUP_FILE):
+        """Load a snapshot written by save(); returns False when it is missing or does not match"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != SNAPSHOT_VERSION:
+                    raise ValueError(f"snapshot version {int(data['version'])}")
+                if tuple(str(name) for name in data['model_names']) != self.model_names:
+                    raise ValueError('snapshot has a different model set')
+                if data['layout'].tolist() != [self.bucket_s, self.buckets, HIST_BINS]:
+                    raise ValueError('snapshot has a different bucket layout')
+                snapshot = {field: data[field] for field in data.files}
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Ignoring rollup snapshot {path}: {e}", file=sys.stderr)
+            return False
+
+        with self.lock:
+            self.pending = []
+            self.sites = [str(site) for site in snapshot['sites']]
+            self.site_index = {site: index for index, site in enumerate(self.sites)}
+            for field in ('epoch', 'verdicts', 'bands', 'errors', 'histogram', 'decayed_sum', 'decayed_weight',
+                          'decayed_at', 'totals'):
+                setattr(self, field, snapshot[field].astype(getattr(self, field).dtype))
+            self.unit_verdicts = np.zeros((len(self.sites), len(VERDICT_NAMES)), dtype=np.int32)
+            self.unit_bands = np.zeros((len(self.sites), len(self.model_names), len(BAND_NAMES)), dtype=np.int32)
+            unit_bands = snapshot['unit_bands']
+            self.units = {
+                equipment_id: [site, verdict, unit_bands[row], seen]
+                for row, (equipment_id, site, verdict, seen) in enumerate(zip(
+                    snapshot['unit_ids'].tolist(), snapshot['unit_site'].tolist(),
+                    snapshot['unit_verdict'].tolist(), snapshot['unit_seen'].tolist()))
+            }
+            self._count_units(snapshot['unit_site'], snapshot['unit_verdict'], unit_bands, 1)
+        return True
+
+    def start(self, path=ROLLUP_FILE, interval=60.0):
+        """Save to path every interval seconds on a background thread"""
+        def loop():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.save(path)
+                except Exception as e:
+                    print(f"Failed to write rollup snapshot {path}: {e}", file=sys.stderr)
+
+        self.path = path
+        self.thread = threading.Thread(target=loop, name='apollo-rollup', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the snapshot thread and write a final snapshot"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        try:
+            self.save(self.path)
+        except Exception as e:
+            print(f"Failed to write rollup snapshot {self.path}: {e}", file=sys.stderr)
+
+
+def unit_id(equipment_id):
+    """Equipment IDs are integers; numeric strings ("12") are the same unit as 12"""
+    try:
+        return int(equipment_id)
+    except (TypeError, ValueError):
+        raise ValueError(f'Equipment ID must be an integer: {equipment_id!r}') from None
+
+
+def _verdict(consensus, reporting):
+    """Final verdict code for a consensus, as EnsembleResults.aggregate() assigns it"""
+    if not reporting:
+        return VERDICT_UNABLE
+    if consensus > CONSENSUS_FAULT:
+        return VERDICT_FAULT
+    if consensus > CONSENSUS_WATCH:
+        return VERDICT_WATCH
+    return VERDICT_NORMAL
+
+
+def _rounded(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def rollup_main(argv):
+    """Entry point for `hailo_inference.py rollup [--file PATH] [--site NAME] [--window S]`
+
+    Reads the snapshot a serve daemon or fleet scheduler writes, without
+    touching the device.
+    """
+    from hailo_inference import MODEL_PATHS
+
+    parser = argparse.ArgumentParser(prog='hailo_inference.py rollup')
+    parser.add_argument('--file', default=ROLLUP_FILE, help='Rollup snapshot')
+    parser.add_argument('--site', help='One site (default: every site combined)')
+    parser.add_argument('--window', type=float, help='Seconds to aggregate over (default: the full window)')
+    args = parser.parse_args(argv)
+
+    rollup = FleetRollup(MODEL_PATHS.keys())
+    if not rollup.restore(args.file):
+        print(json.dumps({'error': f'No rollup snapshot at {args.file}'}))
+        sys.exit(1)
+    print(json.dumps(rollup.summary(site=args.site, window_s=args.window)))
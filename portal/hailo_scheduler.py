@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Model scheduler for the 8-model ensemble
+Persistent workers drain per-model request queues so the device switches
+network groups once per drained queue instead of once per request
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from hailo_metrics import METRICS
+
+
+class InferenceJob:
+    """One queued request for a single model"""
+
+    __slots__ = ('model_name', 'input_batch', 'future', 'enqueued_at', 'queue_depth')
+
+    def __init__(self, model_name, input_batch, queue_depth):
+        self.model_name = model_name
+        self.input_batch = input_batch
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.queue_depth = queue_depth
+
+
+class ModelScheduler:
+    """Round-robin scheduler over per-model request queues
+
+    Each worker picks the next model (round-robin, starting after the last one
+    served) that has queued requests and is not already being drained, takes
+    every request queued for it, runs them as one concatenated batch and only
+    then moves on. With manual network-group activation a single worker owns
+    the device; when HailoRT's model scheduler is active one worker per model
+    lets HailoRT interleave the network groups itself.
+
+    `pipelines` is a mapping or ModelRegistry; pipelines are looked up per
+    batch so lazily loaded models are configured on their first request.
+
+    Futures resolve to (outputs, info) where outputs is the pipeline output
+    for the job's rows and info carries queue depth, wait/run time and whether
+    the device had to switch to this model.
+    """
+
+    def __init__(self, backend, pipelines, order=None, workers=None):
+        self.backend = backend
+        self.pipelines = pipelines
+        self.order = [name for name in (order or list(pipelines.keys())) if name in pipelines]
+        self.queues = {name: deque() for name in self.order}
+        self.stats = {
+            name: {'switches': 0, 'requests': 0, 'batches': 0, 'max_queue_depth': 0, 'cancelled': 0}
+            for name in self.order
+        }
+        self.condition = threading.Condition()
+        self.draining = set()
+        self.next_index = 0
+        self.last_model = None
+        self.stopping = False
+
+        if workers is None:
+            workers = 1 if backend.manual_activation else max(1, len(self.order))
+        self.workers = [
+            threading.Thread(target=self._worker, name=f'apollo-sched-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, model_name, input_batch):
+        """Queue an (N, 32) batch for model_name and return a Future"""
+        with self.condition:
+            if self.stopping:
+                raise RuntimeError('Scheduler is shut down')
+            if model_name not in self.queues:
+                raise KeyError(f'Model not scheduled: {model_name}')
+            queue = self.queues[model_name]
+            job = InferenceJob(model_name, input_batch, queue_depth=len(queue) + 1)
+            queue.append(job)
+            stats = self.stats[model_name]
+            stats['max_queue_depth'] = max(stats['max_queue_depth'], job.queue_depth)
+            self.condition.notify()
+        job.future.add_done_callback(lambda future: self._withdraw(job) if future.cancelled() else None)
+        return job.future
+
+    def _withdraw(self, job):
+        """Drop a cancelled job from its queue so it no longer holds a slot"""
+        with self.condition:
+            try:
+                self.queues[job.model_name].remove(job)
+            except ValueError:
+                # Already taken by a worker, which skips cancelled futures
+                return
+            self.stats[job.model_name]['cancelled'] += 1
+
+    def queue_depths(self):
+        with self.condition:
+            return {name: len(queue) for name, queue in self.queues.items()}
+
+    def queue_latency_ms(self):
+        """How long the oldest queued (not yet running) job has waited; 0 when idle"""
+        with self.condition:
+            oldest = min((queue[0].enqueued_at for queue in self.queues.values() if queue), default=None)
+        return 0.0 if oldest is None else (time.perf_counter() - oldest) * 1000
+
+    def snapshot(self):
+        """Cumulative per-model counters plus current queue depth"""
+        with self.condition:
+            return {
+                name: dict(self.stats[name], queue_depth=len(self.queues[name]))
+                for name in self.order
+            }
+
+    def _next_model(self):
+        """Pick the next non-empty, idle queue in round-robin order (lock held)"""
+        count = len(self.order)
+        for offset in range(count):
+            index = (self.next_index + offset) % count
+            name = self.order[index]
+            if self.queues[name] and name not in self.draining:
+                self.next_index = (index + 1) % count
+                return name
+        return None
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                model_name = self._next_model()
+                while model_name is None:
+                    if self.stopping:
+                        return
+                    self.condition.wait()
+                    model_name = self._next_model()
+
+                queue = self.queues[model_name]
+                jobs = list(queue)
+                queue.clear()
+                self.draining.add(model_name)
+
+                switched = self.last_model != model_name
+                self.last_model = model_name
+                stats = self.stats[model_name]
+                if switched:
+                    stats['switches'] += 1
+                stats['batches'] += 1
+                stats['requests'] += len(jobs)
+
+            try:
+                self._run_jobs(model_name, jobs, switched)
+            finally:
+                with self.condition:
+                    self.draining.discard(model_name)
+                    self.condition.notify_all()
+
+    def _run_jobs(self, model_name, jobs, switched):
+        # Drop requests whose caller already gave up
+        jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+
+        started = time.perf_counter()
+        try:
+            pipeline = self.pipelines.get(model_name)
+            if pipeline is None:
+                raise RuntimeError(f'Model not loaded: {model_name}')
+            if len(jobs) == 1:
+                outputs = [np.asarray(pipeline.infer(jobs[0].input_batch))]
+            else:
+                batch = np.concatenate([job.input_batch for job in jobs])
+                combined = np.asarray(pipeline.infer(batch))
+                splits = np.cumsum([len(job.input_batch) for job in jobs])[:-1]
+                outputs = np.split(combined, splits)
+        except Exception as e:
+            print(f"Scheduled inference error for {model_name}: {e}", file=sys.stderr)
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        for job, output in zip(jobs, outputs):
+            METRICS.observe('queue_wait', (started - job.enqueued_at) * 1000, model_name)
+            job.future.set_result((output, {
+                'queue_depth': job.queue_depth,
+                'switched': switched,
+                'coalesced': len(jobs),
+                'wait_ms': round((started - job.enqueued_at) * 1000, 2),
+                'run_ms': round((finished - started) * 1000, 2),
+            }))
+
+    def close(self):
+        """Finish queued requests, then stop the workers"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join()
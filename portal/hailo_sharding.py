@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+Multi-process sharding for the 8-model ensemble
+Spreads the ensemble over worker processes that each own their own backend
+(one Hailo-8 per worker, or a simulated backend), either by equipment unit or
+by model, and rebalances onto the survivors when a worker dies
+"""
+
+import bisect
+import itertools
+import multiprocessing
+import sys
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from hailo_backends import HailoBackend, SimulatedBackend, create_backend
+from hailo_inference import MODEL_PATHS, MODEL_PRIORITY, HailoHVACDiagnostics
+
+SHARD_STRATEGIES = ('equipment', 'models')
+
+# Methods a worker will run on its HailoHVACDiagnostics on request
+WORKER_METHODS = ('run_diagnosis', 'diagnose_batch', 'run_models_batch', 'warm', 'ping')
+
+
+class WorkerDied(RuntimeError):
+    """Raised for requests that were in flight on a worker when it exited"""
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes
+
+    Removing a node only moves the keys that node owned; every other key
+    keeps its owner.
+    """
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self.points = []
+        self.owners = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return zlib.crc32(str(value).encode('utf-8'))
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f'{node}#{replica}')
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node):
+        keep = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != node]
+        self.points = [point for point, _ in keep]
+        self.owners = [owner for _, owner in keep]
+
+    def lookup(self, key):
+        if not self.points:
+            raise WorkerDied('No live shard workers')
+        index = bisect.bisect(self.points, self._hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+def make_worker_backend(spec):
+    """Backend for one worker from a spec such as {'backend': 'simulated', 'latency_ms': 2}"""
+    spec = dict(spec or {})
+    name = spec.pop('backend', None)
+    if name == 'simulated':
+        return SimulatedBackend(**spec)
+    if name == 'hailo':
+        return HailoBackend(**spec)
+    return create_backend(name)
+
+
+def _worker_main(conn, backend_spec, preload, threads):
+    """Worker process: serve method calls from the coordinator over a Pipe"""
+    diag = HailoHVACDiagnostics(backend=make_worker_backend(backend_spec), load_policy='lazy')
+    if not diag.initialize():
+        conn.send((None, 'error', 'Failed to initialize inference backend'))
+        return
+
+    def warm(model_names):
+        """Load (if needed) and warm the given models; returns their load reports"""
+        for name in model_names:
+            diag.registry.get(name)
+        return {name: diag.models[name] for name in model_names}
+
+    for name in preload:
+        diag.registry.get(name)
+    conn.send((None, 'ready', diag.models))
+
+    send_lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='apollo-shard')
+
+    def run(request_id, method, args, kwargs):
+        try:
+            if method == 'warm':
+                result = warm(*args)
+            elif method == 'ping':
+                result = diag.models
+            else:
+                result = getattr(diag, method)(*args, **kwargs)
+            message = (request_id, 'result', result)
+        except Exception as e:
+            message = (request_id, 'error', f'{type(e).__name__}: {e}')
+        with send_lock:
+            conn.send(message)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        request_id, method, args, kwargs = message
+        if method not in WORKER_METHODS:
+            with send_lock:
+                conn.send((request_id, 'error', f'Unknown worker method: {method}'))
+            continue
+        pool.submit(run, request_id, method, args, kwargs)
+
+    pool.shutdown(wait=True)
+    diag.close()
+
+
+class ShardWorker:
+    """Coordinator-side handle on one worker process"""
+
+    def __init__(self, index, context, backend_spec, preload, threads):
+        self.index = index
+        self.backend_spec = backend_spec
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, backend_spec, preload, threads),
+                                       name=f'apollo-shard-{index}', daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.models = {}
+        self.alive = True
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.ready = Future()
+        self.on_death = None
+        self.reader = threading.Thread(target=self._read, name=f'apollo-shard-reader-{index}', daemon=True)
+        self.reader.start()
+
+    def call(self, method, *args, **kwargs):
+        """Send a method call to the worker; returns a Future for its result"""
+        future = Future()
+        with self.lock:
+            if not self.alive:
+                future.set_exception(WorkerDied(f'Shard worker {self.index} is not running'))
+                return future
+            request_id = next(self.ids)
+            self.pending[request_id] = future
+            try:
+                self.conn.send((request_id, method, args, kwargs))
+            except (OSError, ValueError) as e:
+                del self.pending[request_id]
+                future.set_exception(WorkerDied(f'Shard worker {self.index} is not reachable: {e}'))
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                request_id, status, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if request_id is None:
+                # Startup handshake
+                if status == 'ready':
+                    self.models = payload
+                    self.ready.set_result(True)
+                else:
+                    self.ready.set_exception(RuntimeError(payload))
+                continue
+            with self.lock:
+                future = self.pending.pop(request_id, None)
+            if future is None:
+                continue
+            if status == 'result':
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+        self._died()
+
+    def _died(self):
+        with self.lock:
+            was_alive, self.alive = self.alive, False
+            pending, self.pending = self.pending, {}
+        if not self.ready.done():
+            self.ready.set_exception(WorkerDied(f'Shard worker {self.index} exited during startup'))
+        # Rebalance before failing the in-flight calls so their retries find the new owner
+        if was_alive and self.on_death is not None:
+            self.on_death(self)
+        for future in pending.values():
+            future.set_exception(WorkerDied(f'Shard worker {self.index} exited'))
+
+    def close(self, timeout=10.0):
+        with self.lock:
+            self.alive = False
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class ShardedDiagnostics(HailoHVACDiagnostics):
+    """HailoHVACDiagnostics spread over worker processes
+
+    strategy='equipment': every worker loads all eight models; diagnose()
+    is routed to a worker by consistent hashing on equipment_id and
+    diagnose_batch() groups rows by owner when equipment_ids are given
+    (otherwise it splits the batch evenly).
+
+    strategy='models': the models are dealt out across workers in
+    MODEL_PRIORITY order; each request fans out to the owners and the
+    per-model results are merged back into the usual result shape.
+
+    When a worker dies its equipment keys (or models) move to the survivors
+    and requests that were in flight on it are retried there once.
+    backend_specs gives one spec per worker, e.g. {'backend': 'hailo',
+    'device_id': '0000:01:00.0'} or {'backend': 'simulated'}; None uses
+    APOLLO_BACKEND for every worker.
+    """
+
+    def __init__(self, workers=2, strategy='equipment', backend_specs=None, cache=None, replicas=64,
+                 threads_per_worker=4, start_method='spawn'):
+        super().__init__(backend=None, cache=cache)
+        if strategy not in SHARD_STRATEGIES:
+            raise ValueError(f'Unknown shard strategy: {strategy}')
+        self.strategy = strategy
+        self.routes_by_equipment = strategy == 'equipment'
+        self.backend_specs = list(backend_specs) if backend_specs else [None] * workers
+        self.replicas = replicas
+        self.threads_per_worker = threads_per_worker
+        self.context = multiprocessing.get_context(start_method)
+        self.workers = []
+        self.ring = HashRing(replicas=replicas)
+        self.model_owner = {}
+        self.round_robin = itertools.count()
+        self.rebalance_lock = threading.Lock()
+        self.rebalances = 0
+
+    def initialize(self):
+        """Start the worker processes and wait until each has loaded its share"""
+        try:
+            count = len(self.backend_specs)
+            assignment = {index: [] for index in range(count)}
+            if self.strategy == 'models':
+                for position, model_name in enumerate(MODEL_PRIORITY):
+                    assignment[position % count].append(model_name)
+                    self.model_owner[model_name] = position % count
+            else:
+                for index in range(count):
+                    assignment[index] = list(MODEL_PRIORITY)
+
+            self.workers = [
+                ShardWorker(index, self.context, spec, assignment[index], self.threads_per_worker)
+                for index, spec in enumerate(self.backend_specs)
+            ]
+            for worker in self.workers:
+                worker.ready.result()
+                worker.on_death = self._worker_died
+                self.ring.add(worker.index)
+            self._refresh_models()
+            return True
+        except Exception as e:
+            print(f"Failed to start shard workers: {e}", file=sys.stderr)
+            return False
+
+    def live_workers(self):
+        return [worker for worker in self.workers if worker.alive]
+
+    def _refresh_models(self):
+        """Merged per-model report: the owner's entry, tagged with its shard"""
+        models = {}
+        for model_name in MODEL_PATHS:
+            owners = [self.model_owner[model_name]] if self.strategy == 'models' and model_name in self.model_owner \
+                else [worker.index for worker in self.live_workers()]
+            reports = [dict(self.workers[index].models.get(model_name, {}), shard=index)
+                       for index in owners if self.workers[index].alive]
+            if not reports:
+                models[model_name] = {'loaded': False, 'error': 'No live shard worker', 'path': MODEL_PATHS[model_name]}
+            elif self.strategy == 'models':
+                models[model_name] = reports[0]
+            else:
+                models[model_name] = dict(reports[0], shards=[report['shard'] for report in reports])
+                del models[model_name]['shard']
+        self.models = models
+
+    def _worker_died(self, worker):
+        """Move the dead worker's equipment keys or models onto the survivors"""
+        print(f"Shard worker {worker.index} exited; rebalancing", file=sys.stderr)
+        warming = []
+        with self.rebalance_lock:
+            self.ring.remove(worker.index)
+            survivors = self.live_workers()
+            if self.strategy == 'models' and survivors:
+                moved = sorted((name for name, owner in self.model_owner.items() if owner == worker.index),
+                               key=MODEL_PRIORITY.index)
+                for model_name in moved:
+                    load = {w.index: 0 for w in survivors}
+                    for owner in self.model_owner.values():
+                        if owner in load:
+                            load[owner] += 1
+                    target = min(survivors, key=lambda w: (load[w.index], w.index))
+                    self.model_owner[model_name] = target.index
+                    warming.append((target, target.call('warm', [model_name])))
+            self._refresh_models()
+
+        # Wait outside the lock: a target dying meanwhile needs it for its own rebalance
+        for target, future in warming:
+            try:
+                reports = future.result()
+            except Exception as e:
+                print(f"Shard worker {target.index} could not load a moved model: {e}", file=sys.stderr)
+                continue
+            target.models.update(reports)
+        with self.rebalance_lock:
+            self.rebalances += 1
+            self._refresh_models()
+
+    def model_available(self, model_name):
+        if self.strategy == 'models':
+            owner = self.model_owner.get(model_name)
+            return owner is not None and self.workers[owner].alive
+        return any(worker.alive and worker.models.get(model_name, {}).get('loaded') for worker in self.workers)
+
+    def load_report(self):
+        return {
+            'policy': f'sharded ({self.strategy})',
+            'priority': list(MODEL_PRIORITY),
+            'models': {name: dict(self.models[name]) for name in MODEL_PRIORITY},
+        }
+
+    def _call_with_retry(self, pick_worker, method, *args, **kwargs):
+        """Call method on pick_worker(); retry once on the new owner if that worker dies
+
+        Returns (worker, result).
+        """
+        for attempt in range(2):
+            worker = pick_worker()
+            try:
+                return worker, worker.call(method, *args, **kwargs).result()
+            except WorkerDied:
+                if attempt:
+                    raise
+
+    def run_diagnosis(self, sensor_data, mode='sequential', cascade_threshold=None, equipment_id=None):
+        """Run one unit on its owning worker (equipment) or across the model owners (models)"""
+        if self.strategy == 'models':
+            result = self.diagnose_batch([sensor_data], mode=mode, cascade_threshold=cascade_threshold)[0]
+            del result['batch_size']
+            return result
+
+        def owner():
+            key = equipment_id if equipment_id is not None else f'#{next(self.round_robin)}'
+            return self.workers[self.ring.lookup(key)]
+
+        worker, result = self._call_with_retry(owner, 'run_diagnosis', sensor_data, mode, cascade_threshold)
+        result['shard'] = worker.index
+        return result
+
+    def diagnose_batch(self, sensor_list, mode='sequential', cascade_threshold=None, equipment_ids=None):
+        """diagnose_batch() across the shards
+
+        With strategy='equipment' and equipment_ids (one per row), each row is
+        diagnosed on the worker that owns its equipment unit.
+        """
+        if self.strategy == 'models' or equipment_ids is None:
+            return super().diagnose_batch(sensor_list, mode=mode, cascade_threshold=cascade_threshold)
+
+        input_batch = self.prepare_sensor_batch(sensor_list)
+        if len(equipment_ids) != len(input_batch):
+            raise ValueError('equipment_ids must have one entry per row')
+        results = [None] * len(input_batch)
+        pending = list(range(len(input_batch)))
+        for attempt in range(2):
+            groups = {}
+            for row in pending:
+                groups.setdefault(self.ring.lookup(equipment_ids[row]), []).append(row)
+            futures = {index: self.workers[index].call('diagnose_batch', input_batch[rows], mode, cascade_threshold)
+                       for index, rows in groups.items()}
+            pending = []
+            for index, future in futures.items():
+                try:
+                    for row, result in zip(groups[index], future.result()):
+                        result['batch_size'] = len(input_batch)
+                        result['shard'] = index
+                        results[row] = result
+                except WorkerDied:
+                    if attempt:
+                        raise
+                    pending.extend(groups[index])
+            if not pending:
+                break
+        return results
+
+    def run_models_batch(self, model_names, input_batch, simultaneous=True):
+        """Fan the batch out to the shards and merge their per-model outcomes"""
+        model_names = list(model_names)
+        model_outputs = {}
+        if self.strategy == 'models':
+            remaining = model_names
+            for attempt in range(2):
+                groups = {}
+                for model_name in remaining:
+                    owner = self.model_owner.get(model_name)
+                    if owner is None or not self.workers[owner].alive:
+                        model_outputs[model_name] = {'error': 'Model not loaded'}
+                    else:
+                        groups.setdefault(owner, []).append(model_name)
+                futures = {index: self.workers[index].call('run_models_batch', names, input_batch, simultaneous)
+                           for index, names in groups.items()}
+                remaining = []
+                for index, future in futures.items():
+                    try:
+                        model_outputs.update(future.result())
+                    except WorkerDied:
+                        remaining.extend(groups[index])
+                    except Exception as e:
+                        print(f"Shard {index} inference error: {e}", file=sys.stderr)
+                        for model_name in groups[index]:
+                            model_outputs[model_name] = {'error': 'Inference failed'}
+                if not remaining:
+                    break
+            for model_name in remaining:
+                model_outputs[model_name] = {'error': 'Inference failed'}
+            return {name: model_outputs[name] for name in model_names}
+
+        # Equipment strategy without routing keys: split the rows evenly
+        workers = self.live_workers()
+        if not workers:
+            return {name: {'error': 'Model not loaded'} for name in model_names}
+        bounds = np.linspace(0, len(input_batch), len(workers) + 1).astype(int)
+        chunks = [(worker, bounds[i], bounds[i + 1]) for i, worker in enumerate(workers) if bounds[i + 1] > bounds[i]]
+        parts = []
+        for worker, start, stop in chunks:
+            future = worker.call('run_models_batch', model_names, input_batch[start:stop], simultaneous)
+            parts.append((start, stop, future))
+        for start, stop, future in parts:
+            try:
+                outputs = future.result()
+            except WorkerDied:
+                # Re-run this slice on any survivor
+                _, outputs = self._call_with_retry(self._any_worker, 'run_models_batch', model_names,
+                                                   input_batch[start:stop], simultaneous)
+            except Exception as e:
+                print(f"Shard inference error: {e}", file=sys.stderr)
+                outputs = {name: {'error': 'Inference failed'} for name in model_names}
+            for model_name, outcome in outputs.items():
+                merged = model_outputs.setdefault(model_name, {'probs': np.empty(len(input_batch), dtype=np.float32),
+                                                               'inference_time_ms': 0.0})
+                if 'error' in outcome or 'error' in merged:
+                    model_outputs[model_name] = {'error': outcome.get('error', merged.get('error'))}
+                    continue
+                merged['probs'][start:stop] = outcome['probs']
+                merged['inference_time_ms'] = max(merged['inference_time_ms'], outcome['inference_time_ms'])
+        return {name: model_outputs[name] for name in model_names}
+
+    def _any_worker(self):
+        workers = self.live_workers()
+        if not workers:
+            raise WorkerDied('No live shard workers')
+        return workers[next(self.round_robin) % len(workers)]
+
+    def get_device_status(self):
+        workers = [{'shard': worker.index, 'alive': worker.alive, 'pid': worker.process.pid,
+                    'backend': (worker.backend_spec or {}).get('backend', 'default')} for worker in self.workers]
+        return {
+            'online': any(worker['alive'] for worker in workers),
+            'device': f'{len(self.live_workers())}/{len(self.workers)} shard workers ({self.strategy})',
+            'temperature': None,
+            'power': None,
+            'utilization': None,
+            'workers': workers,
+            'rebalances': self.rebalances,
+        }
+
+    def close(self):
+        """Stop every worker process"""
+        for worker in self.workers:
+            worker.on_death = None
+            worker.close()
+        self.workers = []
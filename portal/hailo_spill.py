@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Spill-over from the accelerator to a CPU process pool
+When the device queue backs up past a latency threshold, whole ensemble
+batches are run by the NumPy CPU engine in worker processes instead of
+waiting their turn; outcomes say which engine produced them
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from hailo_cpu import available_weights, load_weights
+
+# Device queue latency (ms) above which batches spill to the CPU pool; 0 disables
+SPILL_THRESHOLD_MS = float(os.environ.get('APOLLO_SPILL_THRESHOLD_MS', 0))
+SPILL_WORKERS = int(os.environ.get('APOLLO_SPILL_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+
+# Networks loaded in a pool worker process, keyed by model name
+_NETWORKS = {}
+
+
+def _worker_init(paths):
+    for model_name, path in paths.items():
+        try:
+            _NETWORKS[model_name] = load_weights(path)
+        except Exception as e:
+            print(f"CPU spill worker could not load {model_name}: {e}", file=sys.stderr)
+
+
+def _worker_run(model_names, input_batch):
+    """{model_name: (N,) probabilities or error message} for one batch"""
+    outcomes = {}
+    for model_name in model_names:
+        network = _NETWORKS.get(model_name)
+        if network is None:
+            outcomes[model_name] = 'Model not loaded'
+            continue
+        outcomes[model_name] = network(input_batch)[:, 0]
+    return outcomes
+
+
+class SpillBalancer:
+    """Routes ensemble batches to the device or to a CPU process pool
+
+    A batch spills when the oldest job in the scheduler's queues has waited
+    longer than threshold_ms, as long as the pool has a free worker slot
+    (spilling into a backed-up pool would only move the queue). Models
+    without exported weights are never spilled. If a pool worker dies (the
+    pool breaks), spilling stops and batches go back to the device.
+    """
+
+    def __init__(self, model_paths, threshold_ms=SPILL_THRESHOLD_MS, workers=SPILL_WORKERS, weights_dir=None,
+                 start_method='spawn'):
+        self.threshold_ms = threshold_ms
+        self.workers = max(1, workers)
+        self.weights = available_weights(model_paths, weights_dir)
+        self.pool = None
+        if self.weights:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context(start_method),
+                                            initializer=_worker_init, initargs=(self.weights,))
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'device_batches': 0, 'spilled_batches': 0, 'spilled_rows': 0, 'spill_errors': 0}
+
+    def should_spill(self, scheduler, model_names):
+        """True (and a pool slot reserved) when this batch should run on the CPU"""
+        if self.pool is None or scheduler is None or not all(name in self.weights for name in model_names):
+            return False
+        if scheduler.queue_latency_ms() <= self.threshold_ms:
+            with self.lock:
+                self.stats['device_batches'] += 1
+            return False
+        with self.lock:
+            if self.in_flight >= self.workers:
+                self.stats['device_batches'] += 1
+                return False
+            self.in_flight += 1
+        return True
+
+    def submit(self, model_names, input_batch):
+        """Run a batch on the pool (after should_spill() returned True)
+
+        Returns a concurrent Future of {model_name: outcome} in
+        run_models_batch() form, tagged engine='cpu', or of None when the
+        pool has broken and the caller should run the batch on the device.
+        """
+        submitted_at = time.perf_counter()
+        count = len(input_batch)
+        outcomes = Future()
+        pool = self.pool
+        try:
+            if pool is None:
+                raise BrokenProcessPool('CPU spill pool is shut down')
+            future = pool.submit(_worker_run, list(model_names), input_batch)
+        except BrokenProcessPool as e:
+            self._finished(count, failed=True)
+            self._broken(e)
+            outcomes.set_result(None)
+            return outcomes
+        except Exception:
+            self._finished(count, failed=True)
+            raise
+
+        def done(raw):
+            try:
+                results = raw.result()
+            except BrokenProcessPool as e:
+                self._finished(count, failed=True)
+                self._broken(e)
+                outcomes.set_result(None)
+                return
+            except Exception as e:
+                print(f"CPU spill batch failed: {e}", file=sys.stderr)
+                self._finished(count, failed=True)
+                outcomes.set_result({name: {'error': 'Inference failed', 'engine': 'cpu'} for name in model_names})
+                return
+            self._finished(count)
+            elapsed_ms = round((time.perf_counter() - submitted_at) * 1000, 2)
+            converted = {}
+            for model_name, result in results.items():
+                if isinstance(result, str):
+                    converted[model_name] = {'error': result, 'engine': 'cpu'}
+                else:
+                    converted[model_name] = {'probs': result, 'inference_time_ms': elapsed_ms, 'engine': 'cpu'}
+            outcomes.set_result(converted)
+
+        future.add_done_callback(done)
+        return outcomes
+
+    def _finished(self, count, failed=False):
+        with self.lock:
+            self.in_flight -= 1
+            if failed:
+                self.stats['spill_errors'] += 1
+            else:
+                self.stats['spilled_batches'] += 1
+                self.stats['spilled_rows'] += count
+
+    def _broken(self, error):
+        """Stop spilling once the pool has lost a worker"""
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            print(f"CPU spill-over disabled, pool broken: {error}", file=sys.stderr)
+            pool.shutdown(wait=False)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, in_flight=self.in_flight, workers=self.workers, threshold_ms=self.threshold_ms,
+                        models=sorted(self.weights), enabled=self.pool is not None)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Streaming time-series diagnosis for the HVAC ensemble
+Keeps a fixed-size ring buffer per equipment unit with incrementally updated
+rolling mean, variance and slope, and emits diagnoses on a configurable stride
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+
+from hailo_features import FEATURE_SCHEMA, INPUT_FEATURES, features_from_records
+
+
+class RollingWindow:
+    """Preallocated ring buffer of model input rows for one equipment unit
+
+    Running sums are updated in O(1) per sample as rows enter and leave the
+    window. Slope is a least-squares fit against the sample index, converted
+    to units per second with the window's mean sampling interval. The sums
+    are recomputed from the buffer once per `size` samples (amortized O(1))
+    to bound floating-point drift and keep sample indices small.
+    """
+
+    def __init__(self, size):
+        if size < 2:
+            raise ValueError('Window size must be at least 2')
+        self.size = size
+        self.values = np.zeros((size, INPUT_FEATURES), dtype=np.float32)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.sample_ids = np.zeros(size, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        self.next_id = 0.0
+
+        self.sum_x = np.zeros(INPUT_FEATURES, dtype=np.float64)
+        self.sum_xx = np.zeros(INPUT_FEATURES, dtype=np.float64)
+        self.sum_kx = np.zeros(INPUT_FEATURES, dtype=np.float64)
+        self.sum_k = 0.0
+        self.sum_kk = 0.0
+
+    def push(self, timestamp, sensor_data):
+        """Add one reading (sensor dict) to the window"""
+        slot = self.head
+        if self.count == self.size:
+            old = self.values[slot].astype(np.float64)
+            old_k = self.sample_ids[slot]
+            self.sum_x -= old
+            self.sum_xx -= old * old
+            self.sum_kx -= old_k * old
+            self.sum_k -= old_k
+            self.sum_kk -= old_k * old_k
+        else:
+            self.count += 1
+
+        # Convert straight into the ring slot - no intermediate row array
+        features_from_records([sensor_data], out=self.values[slot:slot + 1])
+        row = self.values[slot].astype(np.float64)
+        k = self.next_id
+        self.timestamps[slot] = timestamp
+        self.sample_ids[slot] = k
+        self.sum_x += row
+        self.sum_xx += row * row
+        self.sum_kx += k * row
+        self.sum_k += k
+        self.sum_kk += k * k
+
+        self.head = (slot + 1) % self.size
+        self.total += 1
+        self.next_id += 1.0
+        if self.total % self.size == 0:
+            self._resync()
+
+    def _resync(self):
+        """Rebase sample ids on the oldest sample and recompute the sums exactly"""
+        order = self._order()
+        base = self.sample_ids[order[0]]
+        self.sample_ids[order] -= base
+        self.next_id -= base
+
+        values = self.values[order].astype(np.float64)
+        ids = self.sample_ids[order]
+        self.sum_x = values.sum(axis=0)
+        self.sum_xx = (values * values).sum(axis=0)
+        self.sum_kx = ids @ values
+        self.sum_k = float(ids.sum())
+        self.sum_kk = float(ids @ ids)
+
+    def _order(self):
+        """Slot indices from oldest to newest"""
+        if self.count < self.size:
+            return np.arange(self.count)
+        return (np.arange(self.size) + self.head) % self.size
+
+    def latest(self):
+        return self.values[(self.head - 1) % self.size]
+
+    def rows(self):
+        """Copy of the window contents, oldest first"""
+        return self.values[self._order()]
+
+    def span_seconds(self):
+        if self.count < 2:
+            return 0.0
+        order = self._order()
+        return float(self.timestamps[order[-1]] - self.timestamps[order[0]])
+
+    def mean(self):
+        return self.sum_x / max(self.count, 1)
+
+    def variance(self):
+        n = max(self.count, 1)
+        mean = self.sum_x / n
+        return np.maximum(self.sum_xx / n - mean * mean, 0.0)
+
+    def slope(self):
+        """Least-squares slope per second for every feature"""
+        n = self.count
+        denominator = n * self.sum_kk - self.sum_k * self.sum_k
+        span = self.span_seconds()
+        if n < 2 or denominator <= 0 or span <= 0:
+            return np.zeros(INPUT_FEATURES, dtype=np.float64)
+        per_sample = (n * self.sum_kx - self.sum_k * self.sum_x) / denominator
+        return per_sample / (span / (n - 1))
+
+    def summary(self):
+        """Rolling statistics for the schema features as plain floats"""
+        mean, variance, slope = self.mean(), self.variance(), self.slope()
+        return {
+            spec.name: {
+                'mean': float(mean[spec.index]),
+                'variance': float(variance[spec.index]),
+                'slope_per_s': float(slope[spec.index]),
+            }
+            for spec in FEATURE_SCHEMA
+        }
+
+
+class StreamingDiagnoser:
+    """Consumes (equipment_id, timestamp, sensor_dict) records and emits diagnoses
+
+    A unit is diagnosed on its latest reading every `stride` samples once it
+    has at least `min_samples` in its window. Due units are grouped into
+    batches of up to `batch_size` and sent through diagnose_batch together.
+    Each emitted result carries the equipment ID, timestamp and the window's
+    rolling statistics. push() is thread-safe, so one diagnoser can take
+    records from several daemon requests at once.
+    """
+
+    def __init__(self, diag, window=60, stride=10, min_samples=None, mode='simultaneous', batch_size=1):
+        self.diag = diag
+        self.window = window
+        self.stride = stride
+        self.min_samples = stride if min_samples is None else min_samples
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def push(self, equipment_id, timestamp, sensor_data):
+        """Record one reading; returns a snapshot of the unit when it is due, else None
+
+        The snapshot captures the latest input row and rolling statistics at
+        this point in the stream, so batching emissions does not skew them.
+        """
+        with self.lock:
+            window = self.windows.get(equipment_id)
+            if window is None:
+                window = self.windows[equipment_id] = RollingWindow(self.window)
+            window.push(timestamp, sensor_data)
+            if window.total % self.stride != 0 or window.count < self.min_samples:
+                return None
+            return {
+                'equipment_id': equipment_id,
+                'timestamp': timestamp,
+                'row': window.latest().copy(),
+                'window': {
+                    'samples': window.count,
+                    'span_s': round(window.span_seconds(), 3),
+                    'rolling': window.summary(),
+                },
+            }
+
+    def diagnose_due(self, due):
+        """Diagnose a list of due-unit snapshots produced by push()"""
+        if not due:
+            return []
+        input_batch = np.stack([snapshot['row'] for snapshot in due])
+        results = self.diag.diagnose_batch(input_batch, mode=self.mode)
+
+        for snapshot, result in zip(due, results):
+            result['equipment_id'] = snapshot['equipment_id']
+            result['timestamp'] = snapshot['timestamp']
+            result['window'] = snapshot['window']
+        return results
+
+    def process(self, records):
+        """Generator: feed an iterable of records, yield diagnoses as they fall due"""
+        due = []
+        for equipment_id, timestamp, sensor_data in records:
+            snapshot = self.push(equipment_id, timestamp, sensor_data)
+            if snapshot is not None:
+                due.append(snapshot)
+                if len(due) >= self.batch_size:
+                    yield from self.diagnose_due(due)
+                    due = []
+        yield from self.diagnose_due(due)
+
+    async def aprocess(self, records):
+        """Async generator over an async iterable of records
+
+        Device work runs in the default executor so the event loop keeps
+        consuming the stream while a batch is being diagnosed.
+        """
+        loop = asyncio.get_running_loop()
+        due = []
+        async for equipment_id, timestamp, sensor_data in records:
+            snapshot = self.push(equipment_id, timestamp, sensor_data)
+            if snapshot is not None:
+                due.append(snapshot)
+                if len(due) >= self.batch_size:
+                    for result in await loop.run_in_executor(None, self.diagnose_due, due):
+                        yield result
+                    due = []
+        for result in await loop.run_in_executor(None, self.diagnose_due, due):
+            yield result
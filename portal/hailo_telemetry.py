@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Background telemetry for the Hailo-8 status endpoint
+Samples identity, power, temperature and activity on its own schedule so
+status queries return the latest snapshot instantly instead of spawning
+hailortcli for every dashboard poll
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+STATUS_FILE = os.environ.get('APOLLO_STATUS_FILE', '/tmp/apollo-hailo-status.json')
+
+# Hailo-8 max power is typically around 2.5W; 26 TOPS maximum
+MAX_POWER_W = 2.5
+MAX_TOPS = 26.0
+
+
+class TelemetrySource:
+    """Interface for the probes the collector samples; override for tests"""
+
+    def identify(self):
+        """Return the device name, or None if no device is detected"""
+        raise NotImplementedError
+
+    def measure_power(self):
+        """Return average power in watts, or None"""
+        return None
+
+    def read_temperature(self):
+        """Return temperature in degrees Celsius, or None"""
+        return None
+
+    def inference_running(self):
+        """Return True if an external inference process is using the device"""
+        return False
+
+
+class HailortcliSource(TelemetrySource):
+    """Probes backed by hailortcli, pgrep and the Pi's thermal zone"""
+
+    def __init__(self, thermal_zone='/sys/class/thermal/thermal_zone0/temp'):
+        self.thermal_zone = thermal_zone
+
+    def identify(self):
+        result = subprocess.run(['hailortcli', 'fw-control', 'identify'],
+                                capture_output=True, text=True, timeout=5)
+        if result.returncode != 0:
+            return None
+        device_name = 'Hailo-8'
+        for line in result.stdout.split('\n'):
+            if 'Board Name:' in line:
+                device_name = line.split(':', 1)[1].strip().rstrip('\x00')
+                break
+        return device_name
+
+    def measure_power(self):
+        try:
+            result = subprocess.run(['hailortcli', 'measure-power', '--duration', '1', '--type', 'POWER'],
+                                    capture_output=True, text=True, timeout=3)
+            if result.returncode == 0:
+                # Parse average power from output
+                for line in result.stdout.split('\n'):
+                    if 'Average value (W):' in line:
+                        return float(line.split(':', 1)[1].strip())
+        except Exception:
+            pass
+        return None
+
+    def read_temperature(self):
+        # Raspberry Pi CPU temperature - reported in millidegrees Celsius
+        try:
+            with open(self.thermal_zone, 'r') as f:
+                return round(int(f.read().strip()) / 1000.0, 1)
+        except Exception:
+            return None
+
+    def inference_running(self):
+        try:
+            result = subprocess.run(['pgrep', '-f', 'hailortcli run|hailo run'],
+                                    capture_output=True, text=True)
+            return bool(result.stdout.strip())
+        except Exception:
+            return False
+
+
+def estimate_utilization(power, inference_running):
+    """Estimate utilization % and TOPS from power draw and running processes"""
+    utilization = 0
+    tops_used = 0.0
+    if power:
+        utilization = min(100, int((power / MAX_POWER_W) * 100))
+        tops_used = round((utilization / 100.0) * MAX_TOPS, 1)
+    if inference_running:
+        # If inference is running, ensure at least 15% utilization
+        utilization = max(utilization, 15)
+        tops_used = max(tops_used, 3.9)  # At least 15% of 26 TOPS
+    return utilization, tops_used
+
+
+def sample_status(source, device_name=None):
+    """Take one synchronous status sample in the `status` command's format
+
+    Pass device_name to skip the identify probe (the collector caches it).
+    """
+    if device_name is None:
+        device_name = source.identify()
+    if device_name is None:
+        return {'online': False, 'error': 'Device not detected'}
+
+    power = source.measure_power()
+    temperature = source.read_temperature()
+    utilization, tops_used = estimate_utilization(power, source.inference_running())
+    return {
+        'online': True,
+        'device': device_name,
+        'temperature': temperature,
+        'power': round(power, 2) if power else None,
+        'utilization': utilization,
+        'tops': tops_used,
+        'max_tops': MAX_TOPS
+    }
+
+
+class TelemetryCollector:
+    """Samples a TelemetrySource on a background thread into a ring buffer
+
+    Identity is refreshed every `identify_interval` seconds; power,
+    temperature and activity every `interval`. snapshot() never blocks on
+    the probes. When `status_file` is set each sample is also written there
+    atomically so one-shot `status` invocations can read it.
+    """
+
+    def __init__(self, source=None, interval=5.0, identify_interval=300.0, history=120,
+                 window_seconds=60.0, status_file=None, clock=time.time):
+        self.source = source or HailortcliSource()
+        self.interval = interval
+        self.identify_interval = identify_interval
+        self.window_seconds = window_seconds
+        self.status_file = status_file
+        self.clock = clock
+        self.samples = deque(maxlen=history)
+        self.latest = None
+        self.device_name = None
+        self.identified_at = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample_once(self):
+        """Take one sample now and record it"""
+        now = self.clock()
+        try:
+            if self.device_name is None or self.identified_at is None or now - self.identified_at >= self.identify_interval:
+                self.device_name = self.source.identify()
+                self.identified_at = now
+            status = sample_status(self.source, self.device_name) if self.device_name else \
+                {'online': False, 'error': 'Device not detected'}
+        except Exception as e:
+            self.device_name = None
+            status = {'online': False, 'error': str(e)}
+
+        status['sampled_at'] = now
+        with self.lock:
+            self.latest = status
+            self.samples.append(status)
+        if self.status_file:
+            self._write_status_file()
+        return status
+
+    def snapshot(self):
+        """Latest sample plus averages over the last window_seconds"""
+        now = self.clock()
+        with self.lock:
+            if self.latest is None:
+                return {'online': False, 'error': 'No telemetry collected yet'}
+            snapshot = dict(self.latest)
+            recent = [s for s in self.samples if now - s['sampled_at'] <= self.window_seconds and s.get('online')]
+
+        snapshot['age_s'] = round(now - snapshot['sampled_at'], 2)
+        averages = {'window_s': self.window_seconds, 'samples': len(recent)}
+        for key in ('power', 'temperature', 'utilization'):
+            values = [s[key] for s in recent if s.get(key) is not None]
+            averages[key] = round(sum(values) / len(values), 2) if values else None
+        snapshot['averages'] = averages
+        return snapshot
+
+    def _write_status_file(self):
+        tmp_path = f'{self.status_file}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            print(f"Failed to write status file {self.status_file}: {e}", file=sys.stderr)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            self.sample_once()
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, name='apollo-telemetry', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def read_status_file(path=None, max_age=30.0):
+    """Return the collector's last snapshot if it is fresher than max_age seconds"""
+    path = path or STATUS_FILE
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    age = time.time() - snapshot.get('sampled_at', 0)
+    if age > max_age:
+        return None
+    snapshot['age_s'] = round(age, 2)
+    return snapshot
+
+
+def status_main(argv):
+    """Entry point for `hailo_inference.py status [--status-file PATH] [--max-age S] [--no-probe]`
+
+    Answers from the snapshot a running collector (`serve` or `telemetry`)
+    writes. Without a fresh snapshot it falls back to probing the device
+    synchronously, which runs hailortcli and takes over a second; with
+    --no-probe it reports that no collector is running instead.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='hailo_inference.py status',
+        description='Latest device status from the telemetry collector. When no collector has written a '
+                    'fresh snapshot, the device is probed with hailortcli instead (slow; see --no-probe).')
+    parser.add_argument('--status-file', default=STATUS_FILE, help='Snapshot written by serve or telemetry')
+    parser.add_argument('--max-age', type=float, default=30.0, help='Oldest snapshot to accept, in seconds')
+    parser.add_argument('--no-probe', action='store_true',
+                        help='Do not run hailortcli when there is no fresh snapshot; report it instead')
+    args = parser.parse_args(argv)
+
+    status = read_status_file(args.status_file, args.max_age)
+    if status is None:
+        if args.no_probe:
+            status = {'online': False, 'error': 'No telemetry collector running (start serve or telemetry)'}
+        else:
+            try:
+                status = sample_status(HailortcliSource())
+            except Exception as e:
+                status = {'online': False, 'error': str(e)}
+    print(json.dumps(status))
+
+
+def telemetry_main(argv):
+    """Entry point for `hailo_inference.py telemetry [--interval S] [--status-file PATH]`
+
+    Runs the collector in the foreground for deployments without the serve daemon.
+    """
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(prog='hailo_inference.py telemetry')
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between samples')
+    parser.add_argument('--status-file', default=STATUS_FILE, help='Where to write the latest snapshot')
+    args = parser.parse_args(argv)
+
+    collector = TelemetryCollector(interval=args.interval, status_file=args.status_file)
+
+    def on_signal(signum, frame):
+        collector.stop_event.set()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    collector.start()
+    collector.stop_event.wait()
+    collector.stop()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Binary wire protocol for the inference daemon
+Length-prefixed frames carrying raw little-endian float32 feature rows in and
+packed float32 confidences out, so neither side parses or builds JSON
+
+Every frame is a little-endian uint32 byte count followed by that many bytes.
+
+Request (20-byte header, then rows * cols float32):
+    magic 'AQ' | version u8 | flags u8 | request_id u32 | rows u32 |
+    cols u16 (= 32) | mode u8 (0 sequential, 1 simultaneous, 2 cascade) |
+    pad u8 | cascade_threshold f32 (NaN = server default)
+
+Response (16-byte header, then payload):
+    magic 'AR' | version u8 | status u8 (0 ok, 1 error) | request_id u32 |
+    rows u32 | models u16 | reserved u16
+    status 0: rows * (models + 1) float32 - each row holds one confidence per
+              model in the ensemble's model order (NaN when a model produced
+              no result or was skipped by the cascade) followed by consensus
+    status 1: UTF-8 error message
+"""
+
+import math
+import socket
+import struct
+
+import numpy as np
+
+from hailo_features import INPUT_FEATURES
+
+PROTOCOL_VERSION = 1
+REQUEST_MAGIC = b'AQ'
+RESPONSE_MAGIC = b'AR'
+
+LENGTH_PREFIX = struct.Struct('<I')
+REQUEST_HEADER = struct.Struct('<2sBBIIHBxf')
+RESPONSE_HEADER = struct.Struct('<2sBBIIHH')
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+MODES = ('sequential', 'simultaneous', 'cascade')
+
+# Refuse frames above this size rather than allocating for a corrupt prefix
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+FLOAT32_LE = np.dtype('<f4')
+
+
+def read_frame(stream):
+    """Read one frame body into a fresh bytearray; None on clean EOF"""
+    prefix = stream.read(LENGTH_PREFIX.size)
+    if not prefix:
+        return None
+    if len(prefix) < LENGTH_PREFIX.size:
+        raise ValueError('Truncated frame length')
+    (length,) = LENGTH_PREFIX.unpack(prefix)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f'Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit')
+
+    frame = bytearray(length)
+    view = memoryview(frame)
+    received = 0
+    while received < length:
+        count = stream.readinto(view[received:])
+        if not count:
+            raise ValueError('Truncated frame')
+        received += count
+    return frame
+
+
+def encode_request(request_id, rows, mode='simultaneous', cascade_threshold=None):
+    """Header bytes and a float32 view of rows, ready to send without joining"""
+    rows = np.ascontiguousarray(rows, dtype=FLOAT32_LE)
+    if rows.ndim != 2 or rows.shape[1] != INPUT_FEATURES:
+        raise ValueError(f'Rows must have shape (N, {INPUT_FEATURES})')
+    threshold = math.nan if cascade_threshold is None else cascade_threshold
+    header = REQUEST_HEADER.pack(REQUEST_MAGIC, PROTOCOL_VERSION, 0, request_id, rows.shape[0],
+                                 rows.shape[1], MODES.index(mode), threshold)
+    return LENGTH_PREFIX.pack(len(header) + rows.nbytes) + header, memoryview(rows.reshape(-1).view(np.uint8))
+
+
+def decode_request(frame):
+    """Parse a request frame; the returned rows array is a view of the frame buffer
+
+    Returns (request_id, mode, cascade_threshold or None, rows).
+    """
+    if len(frame) < REQUEST_HEADER.size:
+        raise ValueError('Frame shorter than the request header')
+    magic, version, _, request_id, count, cols, mode, threshold = REQUEST_HEADER.unpack_from(frame)
+    if magic != REQUEST_MAGIC:
+        raise ValueError('Not an inference request frame')
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f'Unsupported protocol version {version}')
+    if cols != INPUT_FEATURES:
+        raise ValueError(f'Rows must have {INPUT_FEATURES} features, got {cols}')
+    if mode >= len(MODES):
+        raise ValueError(f'Unknown mode {mode}')
+    if len(frame) != REQUEST_HEADER.size + count * cols * FLOAT32_LE.itemsize:
+        raise ValueError('Frame length does not match its row count')
+
+    rows = np.frombuffer(frame, dtype=FLOAT32_LE, count=count * cols, offset=REQUEST_HEADER.size)
+    return request_id, MODES[mode], None if math.isnan(threshold) else threshold, rows.reshape(count, cols)
+
+
+def encode_response(request_id, confidences, consensus):
+    """Response frame for (N, models) confidences and (N,) consensus"""
+    count, models = confidences.shape
+    payload = np.empty((count, models + 1), dtype=FLOAT32_LE)
+    payload[:, :models] = confidences
+    payload[:, models] = consensus
+    header = RESPONSE_HEADER.pack(RESPONSE_MAGIC, PROTOCOL_VERSION, STATUS_OK, request_id, count, models, 0)
+    return LENGTH_PREFIX.pack(len(header) + payload.nbytes) + header + payload.tobytes()
+
+
+def encode_error(request_id, message):
+    body = str(message).encode('utf-8')
+    header = RESPONSE_HEADER.pack(RESPONSE_MAGIC, PROTOCOL_VERSION, STATUS_ERROR, request_id, 0, 0, 0)
+    return LENGTH_PREFIX.pack(len(header) + len(body)) + header + body
+
+
+def decode_response(frame):
+    """Parse a response frame into a dict with id and either confidences/consensus or error"""
+    if len(frame) < RESPONSE_HEADER.size:
+        raise ValueError('Frame shorter than the response header')
+    magic, version, status, request_id, count, models, _ = RESPONSE_HEADER.unpack_from(frame)
+    if magic != RESPONSE_MAGIC or version != PROTOCOL_VERSION:
+        raise ValueError('Not an inference response frame')
+    if status != STATUS_OK:
+        return {'id': request_id, 'error': bytes(frame[RESPONSE_HEADER.size:]).decode('utf-8', errors='replace')}
+
+    values = np.frombuffer(frame, dtype=FLOAT32_LE, count=count * (models + 1), offset=RESPONSE_HEADER.size)
+    values = values.reshape(count, models + 1)
+    return {'id': request_id, 'confidences': values[:, :models], 'consensus': values[:, models]}
+
+
+class BinaryClient:
+    """Blocking client for the daemon's binary socket; one request at a time"""
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.reader = self.sock.makefile('rb')
+        self.next_id = 0
+
+    def diagnose(self, rows, mode='simultaneous', cascade_threshold=None):
+        """Send (N, 32) rows; returns (confidences (N, models), consensus (N,))"""
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        header, payload = encode_request(self.next_id, rows, mode, cascade_threshold)
+        self.sock.sendall(header)
+        self.sock.sendall(payload)
+
+        frame = read_frame(self.reader)
+        if frame is None:
+            raise ConnectionError('Inference daemon closed the connection')
+        response = decode_response(frame)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['confidences'], response['consensus']
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
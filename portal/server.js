@@ -170,6 +170,18 @@ const apolloInference = {
   predict: async () => ({ faults: [], efficiency: 0 }) 
 };
 
+// Shared-memory ring the inference engine reads the latest readings from
+let sensorRing = null;
+if (process.env.APOLLO_SENSOR_RING) {
+  try {
+    const SensorRing = require('./services/sensorRing');
+    sensorRing = new SensorRing(process.env.APOLLO_SENSOR_RING);
+    logger.info(`Publishing sensor readings to ${process.env.APOLLO_SENSOR_RING}`);
+  } catch (error) {
+    logger.error('Failed to open sensor ring:', error);
+  }
+}
+
 // WebSocket connection tracking
 const connections = new Map();
 
@@ -1332,6 +1344,14 @@ async function startSensorMonitoring() {
                 equipment_id, timestamp, sensor_values, fault_predictions, efficiency_prediction, power_prediction
               ) VALUES (?, ?, ?, ?, ?, ?)
             `, [eq.id, timestamp, JSON.stringify(sensorValues), null, null, null]);
+
+            if (sensorRing) {
+              try {
+                sensorRing.append(eq.id, timestamp, sensorValues);
+              } catch (error) {
+                logger.error(`Sensor ring write failed for equipment ${eq.id}:`, error);
+              }
+            }
           }
           
           // Check for alarms for each reading
@@ -0,0 +1,124 @@
+/**
+ * Apollo Nexus™ Shared-Memory Sensor Ring (producer)
+ * Appends each unit's readings to the memory-mapped ring the Python
+ * inference engine reads (portal/hailo_ring.py), so the engine picks up the
+ * latest rows without JSON. Layout and feature order must match
+ * hailo_ring.py and hailo_features.py.
+ *
+ * The server is the ring's only producer: writes are not locked against
+ * other writer processes.
+ */
+
+const fs = require('fs');
+
+const RING_MAGIC = 'ARNG';
+const RING_VERSION = 1;
+const INPUT_FEATURES = 32;
+const HEADER_BYTES = 64;
+const SLOT_BYTES = 152;
+const WRITE_SEQ_OFFSET = 16;
+const DEFAULT_SLOTS = 4096;
+
+// Column of each schema feature in the model input (hailo_features.FEATURE_SCHEMA)
+const FEATURE_INDEX = {
+  supply_air_temp: 0,
+  return_air_temp: 1,
+  outside_air_temp: 2,
+  mixed_air_temp: 3,
+  supply_air_pressure: 4,
+  return_air_pressure: 5,
+  filter_pressure_drop: 6,
+  supply_air_flow: 7,
+  return_air_flow: 8,
+  compressor_current: 9,
+  fan_motor_current: 10,
+  power_consumption: 11,
+  supply_air_humidity: 12,
+  return_air_humidity: 13,
+  setpoint_temp: 14,
+  damper_position: 15,
+  valve_position: 16,
+  compressor_status: 17,
+  fan_status: 18
+};
+
+class SensorRing {
+  constructor(ringPath, slotCount = DEFAULT_SLOTS) {
+    this.path = ringPath;
+    if (!fs.existsSync(ringPath)) {
+      SensorRing.create(ringPath, slotCount);
+    }
+    this.fd = fs.openSync(ringPath, 'r+');
+
+    const header = Buffer.alloc(HEADER_BYTES);
+    fs.readSync(this.fd, header, 0, HEADER_BYTES, 0);
+    if (header.toString('latin1', 0, 4) !== RING_MAGIC || header.readUInt16LE(4) !== RING_VERSION ||
+        header.readUInt16LE(6) !== INPUT_FEATURES || header.readUInt32LE(12) !== SLOT_BYTES) {
+      fs.closeSync(this.fd);
+      throw new Error(`${ringPath} is not a compatible sensor ring`);
+    }
+    this.slotCount = header.readUInt32LE(8);
+    this.writeSeq = header.readBigUInt64LE(WRITE_SEQ_OFFSET);
+    this.zero = Buffer.alloc(8);
+    this.slot = Buffer.alloc(SLOT_BYTES);
+    this.seq = Buffer.alloc(8);
+  }
+
+  static create(ringPath, slotCount) {
+    const header = Buffer.alloc(HEADER_BYTES);
+    header.write(RING_MAGIC, 0, 'latin1');
+    header.writeUInt16LE(RING_VERSION, 4);
+    header.writeUInt16LE(INPUT_FEATURES, 6);
+    header.writeUInt32LE(slotCount, 8);
+    header.writeUInt32LE(SLOT_BYTES, 12);
+    header.writeDoubleLE(Date.now() / 1000, 24);
+
+    const tmpPath = `${ringPath}.${process.pid}.tmp`;
+    const fd = fs.openSync(tmpPath, 'w');
+    try {
+      fs.writeSync(fd, header, 0, HEADER_BYTES, 0);
+      fs.ftruncateSync(fd, HEADER_BYTES + slotCount * SLOT_BYTES);
+    } finally {
+      fs.closeSync(fd);
+    }
+    fs.renameSync(tmpPath, ringPath);
+  }
+
+  /**
+   * Publish one reading. sensorValues maps sensor names ('Supply Air Temp'
+   * or 'supply_air_temp') to values; unknown sensors are ignored and
+   * unreported features are stored as NaN.
+   */
+  append(equipmentId, timestamp, sensorValues) {
+    const slot = this.slot;
+    slot.fill(0);
+    slot.writeInt32LE(equipmentId, 8);
+    slot.writeDoubleLE(timestamp, 16);
+    for (let i = 0; i < INPUT_FEATURES; i++) {
+      slot.writeFloatLE(NaN, 24 + 4 * i);
+    }
+    for (const [name, raw] of Object.entries(sensorValues)) {
+      const index = FEATURE_INDEX[String(name).trim().toLowerCase().replace(/ /g, '_')];
+      const value = parseFloat(raw);
+      if (index !== undefined && Number.isFinite(value)) {
+        slot.writeFloatLE(value, 24 + 4 * index);
+      }
+    }
+
+    const seq = this.writeSeq;
+    const offset = HEADER_BYTES + Number(seq % BigInt(this.slotCount)) * SLOT_BYTES;
+    // Invalidate the slot, write the record, then publish its sequence number
+    fs.writeSync(this.fd, this.zero, 0, 8, offset);
+    fs.writeSync(this.fd, slot, 8, SLOT_BYTES - 8, offset + 8);
+    this.seq.writeBigUInt64LE(seq + 1n);
+    fs.writeSync(this.fd, this.seq, 0, 8, offset);
+    fs.writeSync(this.fd, this.seq, 0, 8, WRITE_SEQ_OFFSET);
+    this.writeSeq = seq + 1n;
+  }
+
+  close() {
+    fs.closeSync(this.fd);
+  }
+}
+
+module.exports = SensorRing;
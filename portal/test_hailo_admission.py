@@ -0,0 +1,198 @@
+"""Tests for single-flight coalescing and deadline admission"""
+
+import threading
+import time
+
+import pytest
+
+from hailo_admission import GATE_ONLY_THRESHOLD, AdmissionController, AdmissionRejected
+from hailo_backends import SimulatedBackend
+from hailo_cache import DiagnosisCache
+from hailo_inference import HailoHVACDiagnostics
+
+READING = {'supply_air_temp': 55.0, 'return_air_temp': 72.0, 'supply_air_flow': 850.0}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class GatedDiagnostics(HailoHVACDiagnostics):
+    """Simulated diagnostics that records calls and can hold them until released"""
+
+    def __init__(self, cache=None):
+        super().__init__(backend=SimulatedBackend(), cache=cache, load_policy='eager')
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def diagnose(self, sensor_data, mode='sequential', cascade_threshold=None, equipment_id=None, use_cache=True):
+        self.calls.append({'mode': mode, 'cascade_threshold': cascade_threshold, 'equipment_id': equipment_id,
+                           'use_cache': use_cache})
+        self.entered.set()
+        assert self.release.wait(5.0)
+        return super().diagnose(sensor_data, mode=mode, cascade_threshold=cascade_threshold,
+                                equipment_id=equipment_id, use_cache=use_cache)
+
+
+@pytest.fixture
+def diag():
+    diag = GatedDiagnostics(cache=DiagnosisCache())
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+def test_unknown_policy(diag):
+    with pytest.raises(ValueError):
+        AdmissionController(diag, policy='panic')
+
+
+def test_identical_requests_share_one_run(diag):
+    admission = AdmissionController(diag)
+    diag.release.clear()
+    results = []
+    leader = threading.Thread(target=lambda: results.append(admission.diagnose(READING, equipment_id=4)))
+    leader.start()
+    assert diag.entered.wait(5.0)
+    followers = [threading.Thread(target=lambda: results.append(admission.diagnose(dict(READING), equipment_id=4)))
+                 for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while admission.snapshot()['coalesced'] < 3:
+        time.sleep(0.005)
+    diag.release.set()
+    for thread in [leader] + followers:
+        thread.join(5.0)
+
+    assert len(diag.calls) == 1
+    assert sorted(result['admission']['outcome'] for result in results) == ['admitted'] + ['coalesced'] * 3
+    assert len({result['final']['consensus'] for result in results}) == 1
+    stats = admission.snapshot()
+    assert (stats['admitted'], stats['coalesced'], stats['in_flight'], stats['running']) == (1, 3, 0, 0)
+
+
+def test_different_units_are_not_coalesced(diag):
+    admission = AdmissionController(diag)
+    admission.diagnose(READING, equipment_id=1, use_cache=False)
+    admission.diagnose(READING, equipment_id=2, use_cache=False)
+    assert len(diag.calls) == 2
+    assert admission.snapshot()['coalesced'] == 0
+
+
+def test_leader_errors_reach_followers(diag):
+    admission = AdmissionController(diag)
+    diag.release.clear()
+    original = GatedDiagnostics.diagnose
+
+    def failing(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        raise RuntimeError('device lost')
+
+    diag.diagnose = failing.__get__(diag)
+    errors = []
+
+    def request():
+        try:
+            admission.diagnose(READING)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=request) for _ in range(2)]
+    threads[0].start()
+    assert diag.entered.wait(5.0)
+    threads[1].start()
+    while admission.snapshot()['coalesced'] < 1:
+        time.sleep(0.005)
+    diag.release.set()
+    for thread in threads:
+        thread.join(5.0)
+    assert errors == ['device lost', 'device lost']
+    assert admission.snapshot()['in_flight'] == 0
+
+
+def overloaded(diag, policy, service_ms=500.0):
+    """Controller whose recorded service time cannot fit a 100 ms deadline"""
+    clock = FakeClock()
+    admission = AdmissionController(diag, policy=policy, clock=clock)
+    admission.service_ms['sequential'] = service_ms
+    return admission, clock
+
+
+def test_shed_policy_rejects_requests_that_cannot_make_it(diag):
+    admission, clock = overloaded(diag, 'shed')
+    with pytest.raises(AdmissionRejected, match='Deadline cannot be met'):
+        admission.diagnose(READING, equipment_id=3, deadline_ms=100)
+    assert diag.calls == []
+    assert admission.snapshot()['shed'] == 1
+    # Without a deadline, or with room for the predicted time, it runs
+    assert admission.diagnose(READING, equipment_id=3)['admission'] == {'outcome': 'admitted'}
+    assert admission.diagnose(READING, equipment_id=3, deadline_ms=10000)['admission']['outcome'] == 'admitted'
+
+
+def test_deadline_counts_from_arrival(diag):
+    admission, clock = overloaded(diag, 'shed', service_ms=50.0)
+    received_at = clock.now
+    clock.now += 0.08
+    with pytest.raises(AdmissionRejected):
+        admission.diagnose(READING, deadline_ms=100, received_at=received_at)
+
+
+def test_degrade_answers_from_a_stale_cache_entry(diag):
+    admission, clock = overloaded(diag, 'degrade')
+    diag.diagnose(READING, equipment_id=5)
+    diag.cache.clock = lambda: clock.now + 600.0
+    diag.calls.clear()
+    result = admission.diagnose(READING, equipment_id=5, deadline_ms=100)
+    assert result['admission']['outcome'] == 'cache' and result['cache']['hit']
+    assert result['admission']['predicted_ms'] == 500.0
+    assert diag.calls == []
+    assert admission.snapshot()['degraded_cache'] == 1
+
+
+def test_degrade_runs_the_gate_only_without_attributing_it(diag):
+    admission, clock = overloaded(diag, 'degrade')
+    result = admission.diagnose(READING, equipment_id=6, deadline_ms=100)
+    assert result['admission']['outcome'] == 'partial'
+    assert diag.calls == [{'mode': 'cascade', 'cascade_threshold': GATE_ONLY_THRESHOLD, 'equipment_id': None,
+                           'use_cache': False}]
+    assert not result['cascade']['escalated']
+    assert admission.snapshot()['degraded_partial'] == 1
+    # The partial result is not cached as the unit's full diagnosis
+    assert diag.cache.stats()['size'] == 0
+
+
+def test_degrade_sheds_when_the_gate_is_too_slow(diag):
+    admission, clock = overloaded(diag, 'degrade')
+    admission.service_ms['partial'] = 200.0
+    with pytest.raises(AdmissionRejected):
+        admission.diagnose(READING, equipment_id=7, deadline_ms=100)
+    assert diag.calls == []
+
+
+def test_service_time_is_an_ewma_of_device_runs(diag):
+    clock = FakeClock()
+    admission = AdmissionController(diag, parallelism=2, clock=clock)
+    assert admission.predict_ms('sequential') is None
+
+    original = GatedDiagnostics.diagnose
+
+    def timed(self, *args, **kwargs):
+        clock.now += 0.1
+        return original(self, *args, **kwargs)
+
+    diag.diagnose = timed.__get__(diag)
+    admission.diagnose(READING, equipment_id=8)
+    assert admission.predict_ms('sequential') == pytest.approx(100.0)
+    assert admission.predict_ms('sequential', running=2) == pytest.approx(200.0)
+    admission.diagnose(dict(READING, supply_air_temp=90.0), equipment_id=8)
+    assert admission.predict_ms('sequential') == pytest.approx(100.0)
+    # A cache hit says nothing about the device and is not averaged in
+    diag.diagnose = original.__get__(diag)
+    admission.diagnose(READING, equipment_id=8)
+    assert admission.predict_ms('sequential') == pytest.approx(100.0)
@@ -0,0 +1,105 @@
+"""Tests for the simulated backend and the diagnostics pipeline lifecycle"""
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_inference import CASCADE_GATE_MODELS, CASCADE_SPECIALISTS, MODEL_PATHS, HailoHVACDiagnostics
+
+READING = {'supply_air_temp': 55.0, 'return_air_temp': 72.0, 'supply_air_flow': 850.0}
+
+
+@pytest.fixture
+def diag():
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+def test_simulated_pipeline_is_deterministic():
+    backend = SimulatedBackend()
+    backend.open()
+    batch = np.random.default_rng(0).uniform(0, 100, size=(5, 32)).astype(np.float32)
+    first = backend.load_model('apollo', MODEL_PATHS['apollo']).infer(batch)
+    second = backend.load_model('apollo', MODEL_PATHS['apollo']).infer(batch)
+    assert first.shape == (5, 1) and first.dtype == np.float32
+    assert np.array_equal(first, second)
+    assert ((first > 0) & (first < 1)).all()
+    other = backend.load_model('gaia', MODEL_PATHS['gaia']).infer(batch)
+    assert not np.array_equal(first, other)
+
+
+def test_simulated_backend_counts_switches():
+    backend = SimulatedBackend()
+    apollo = backend.configure_model('apollo', backend.parse_model('apollo', None))
+    gaia = backend.configure_model('gaia', backend.parse_model('gaia', None))
+    batch = np.zeros((1, 32), dtype=np.float32)
+    apollo.infer(batch)
+    apollo.infer(batch)
+    gaia.infer(batch)
+    apollo.infer(batch)
+    assert (apollo.switches, gaia.switches) == (2, 1)
+    assert backend.active is apollo
+    backend.release(apollo)
+    assert backend.active is None
+
+
+def test_initialize_loads_every_model(diag):
+    assert diag.backend.is_open
+    assert set(diag.pipelines) == set(MODEL_PATHS)
+    assert all(report['loaded'] for report in diag.models.values())
+
+
+def test_close_releases_pipelines_and_backend():
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    pipelines = list(diag.pipelines.values())
+    diag.close()
+    assert all(pipeline.closed for pipeline in pipelines)
+    assert not diag.backend.is_open
+    assert diag.scheduler is None and diag.executor is None
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'simultaneous', 'cascade'])
+def test_diagnose_modes(diag, mode):
+    result = diag.diagnose(READING, mode=mode, cascade_threshold=0.0)
+    assert list(result['models']) == list(MODEL_PATHS)
+    assert result['mode'] == mode
+    for model in result['models'].values():
+        assert 0.0 <= model['confidence'] <= 1.0
+        assert model['fault_detected'] == (model['confidence'] > 0.5)
+    assert 0.0 <= result['final']['consensus'] <= 1.0
+
+
+def test_modes_agree(diag):
+    results = {mode: diag.diagnose(READING, mode=mode, cascade_threshold=0.0)
+               for mode in ('sequential', 'simultaneous', 'cascade')}
+    expected = {name: model['confidence'] for name, model in results['sequential']['models'].items()}
+    for result in results.values():
+        confidences = {name: model['confidence'] for name, model in result['models'].items()}
+        assert confidences == pytest.approx(expected, abs=1e-6)
+        assert result['final']['consensus'] == pytest.approx(results['sequential']['final']['consensus'])
+
+
+def test_cascade_skips_specialists_below_threshold(diag):
+    result = diag.diagnose(READING, mode='cascade', cascade_threshold=1.0)
+    cascade = result['cascade']
+    assert cascade['gate_models'] == list(CASCADE_GATE_MODELS)
+    assert not cascade['escalated']
+    assert cascade['skipped'] == list(CASCADE_SPECIALISTS)
+    for name in CASCADE_SPECIALISTS:
+        assert result['models'][name]['skipped']
+    for name in CASCADE_GATE_MODELS:
+        assert 'confidence' in result['models'][name]
+
+
+def test_diagnose_batch_matches_single(diag):
+    readings = [READING, {}, dict(READING, supply_air_temp=80.0)]
+    batch = diag.diagnose_batch(readings, mode='simultaneous')
+    assert len(batch) == len(readings)
+    for reading, result in zip(readings, batch):
+        single = diag.diagnose(reading, mode='sequential')
+        for name in MODEL_PATHS:
+            assert result['models'][name]['confidence'] == pytest.approx(single['models'][name]['confidence'],
+                                                                         abs=1e-6)
@@ -0,0 +1,148 @@
+"""Tests for the historical backfill over stored sensor readings"""
+
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_backfill import load_checkpoint, parse_reading_value, parse_sensor_values, pivot_rows, run_backfill
+from hailo_features import FEATURE_SCHEMA, INPUT_FEATURES, features_from_records
+from hailo_inference import HailoHVACDiagnostics
+
+READINGS = 23
+
+
+class FlakyDiagnostics:
+    """Wraps a diagnostics object and fails the nth diagnose_batch call"""
+
+    def __init__(self, diag, fail_on):
+        self.diag = diag
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def diagnose_batch(self, input_batch, mode='simultaneous'):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError('device lost')
+        return self.diag.diagnose_batch(input_batch, mode=mode)
+
+
+@pytest.fixture(scope='module')
+def diag():
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE sensor_readings (id INTEGER PRIMARY KEY AUTOINCREMENT, equipment_id INTEGER NOT NULL, '
+                 'timestamp REAL NOT NULL, sensor_values TEXT NOT NULL)')
+    conn.execute('CREATE TABLE model_inferences (id INTEGER PRIMARY KEY AUTOINCREMENT, equipment_id INTEGER, '
+                 'model_output TEXT, inference_time_ms REAL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
+    for index in range(READINGS):
+        values = {'Supply Air Temp': 50 + index, 'return_air_temp': f'{70 + index % 5}.5'}
+        if index % 2:
+            values = [{'name': name, 'value': value} for name, value in values.items()]
+        conn.execute('INSERT INTO sensor_readings (equipment_id, timestamp, sensor_values) VALUES (?, ?, ?)',
+                     (index % 3 + 1, 1700000000.0 + 60 * index, json.dumps(values)))
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def stored(conn):
+    rows = conn.execute('SELECT equipment_id, model_output FROM model_inferences ORDER BY id').fetchall()
+    return [(equipment_id, json.loads(output)) for equipment_id, output in rows]
+
+
+def test_parse_reading_value():
+    assert parse_reading_value(5) == 5.0
+    assert parse_reading_value(' 76.61') == 76.61
+    assert parse_reading_value('76.61330.0000') == 76.6133
+    assert parse_reading_value('-1e2') == -100.0
+    for bad in ('n/a', '', float('nan'), float('inf')):
+        assert parse_reading_value(bad) is None
+
+
+def test_parse_sensor_values_layouts():
+    expected = {'supply_air_temp': 55.0, 'fan_status': 1.0}
+    assert parse_sensor_values(json.dumps({'Supply Air Temp': '55', 'Fan Status': 1, 'Mystery': 3})) == expected
+    assert parse_sensor_values(json.dumps([{'name': 'Supply Air Temp', 'value': 55},
+                                           {'name': 'fan_status', 'value': '1'}, 'junk'])) == expected
+    assert parse_sensor_values(json.dumps({'supply_air_temp': 'offline'})) == {}
+    assert parse_sensor_values('not json') == {} and parse_sensor_values(None) == {}
+    assert parse_sensor_values('[1, 2]') == {} and parse_sensor_values('3') == {}
+
+
+def test_pivot_rows_matches_record_conversion():
+    rows = [(1, 1, 0.0, json.dumps({'supply_air_temp': 55})), (2, 1, 0.0, json.dumps({})),
+            (3, 2, 0.0, json.dumps({'supply_air_flow': '1200', 'fan_status': 0}))]
+    columns = {spec.name: np.empty(8) for spec in FEATURE_SCHEMA}
+    out = np.empty((8, INPUT_FEATURES), dtype=np.float32)
+    batch = pivot_rows(rows, columns, out)
+    expected = features_from_records([parse_sensor_values(row[3]) for row in rows])
+    assert np.array_equal(batch, expected)
+    # Reusing the buffers for a shorter chunk does not leak the previous values
+    batch = pivot_rows(rows[1:2], columns, out)
+    assert np.array_equal(batch, features_from_records([{}]))
+
+
+def test_backfill_writes_every_reading(diag, conn):
+    summary = run_backfill(diag, conn, chunk_size=5)
+    assert (summary['rows'], summary['rows_total'], summary['last_id']) == (READINGS, READINGS, READINGS)
+    results = stored(conn)
+    assert [result['readingId'] for _, result in results] == list(range(1, READINGS + 1))
+    equipment_id, first = results[0]
+    assert equipment_id == first['equipmentId'] == 1
+    assert first['backfill'] and first['timestamp'] == '2023-11-14T22:13:20.000Z'
+    assert 'batch_size' not in first and set(first['models']) == set(diag.models)
+    assert conn.execute("SELECT timestamp FROM model_inferences WHERE id = 1").fetchone()[0] == '2023-11-14 22:13:20'
+
+    # Each row's result is the ensemble's result for that reading
+    reading = parse_sensor_values(conn.execute('SELECT sensor_values FROM sensor_readings WHERE id = 4').fetchone()[0])
+    expected = diag.diagnose(reading, mode='simultaneous', use_cache=False)
+    assert results[3][1]['final']['consensus'] == pytest.approx(expected['final']['consensus'])
+
+
+def test_interrupted_backfill_resumes_without_duplicates(diag, conn):
+    with pytest.raises(RuntimeError):
+        run_backfill(FlakyDiagnostics(diag, fail_on=3), conn, chunk_size=5)
+    # The failed chunk wrote nothing; the two before it are checkpointed
+    assert len(stored(conn)) == 10
+    assert load_checkpoint(conn, 'default') == (10, 10)
+
+    summary = run_backfill(diag, conn, chunk_size=5)
+    assert (summary['resumed_from_id'], summary['rows'], summary['rows_total']) == (10, READINGS - 10, READINGS)
+    reading_ids = [result['readingId'] for _, result in stored(conn)]
+    assert reading_ids == list(range(1, READINGS + 1))
+
+    # A finished run has nothing left to do; --restart starts over
+    assert run_backfill(diag, conn, chunk_size=5)['rows'] == 0
+    assert run_backfill(diag, conn, chunk_size=5, restart=True)['rows'] == READINGS
+    assert len(stored(conn)) == 2 * READINGS
+
+
+def test_filters_limit_and_run_names(diag, conn):
+    summary = run_backfill(diag, conn, chunk_size=4, equipment_id=2, run_name='unit-2', limit=5)
+    assert summary['rows'] == 5
+    assert {equipment_id for equipment_id, _ in stored(conn)} == {2}
+    assert load_checkpoint(conn, 'unit-2')[1] == 5
+    assert load_checkpoint(conn, 'default') == (0, 0)
+
+    since = 1700000000.0 + 60 * 20
+    assert run_backfill(diag, conn, run_name='recent', since=since)['rows'] == READINGS - 20
+    assert run_backfill(diag, conn, run_name='early', until=1700000000.0 + 60 * 2)['rows'] == 2
+
+
+def test_dry_run_writes_nothing(diag, conn):
+    progress = []
+    summary = run_backfill(diag, conn, chunk_size=10, dry_run=True, progress=progress.append)
+    assert summary['rows'] == READINGS and summary['dry_run']
+    assert [status['rows'] for status in progress] == [10, 20, READINGS]
+    assert stored(conn) == []
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'backfill_checkpoints'").fetchone() is None
@@ -0,0 +1,62 @@
+"""Tests for the benchmark suite"""
+
+import json
+
+import pytest
+
+from hailo_bench import bench_main, measure, parse_latency, run_benchmarks, sample_readings, summarize
+
+
+def test_summarize():
+    stats = summarize([1.0, 2.0, 3.0, 4.0], units_per_call=10)
+    assert (stats['iterations'], stats['min_ms'], stats['max_ms'], stats['mean_ms']) == (4, 1.0, 4.0, 2.5)
+    assert stats['p50_ms'] == 2.5
+    assert stats['calls_per_s'] == 400.0 and stats['units_per_s'] == 4000.0
+    assert summarize([0.0])['calls_per_s'] is None
+
+
+def test_measure_runs_warmup_and_iterations():
+    calls = []
+    timings = measure(lambda: calls.append(1), iterations=5, warmup=2)
+    assert len(timings) == 5 and len(calls) == 7
+
+
+def test_parse_latency():
+    assert parse_latency('2.5') == 2.5
+    assert parse_latency('apollo=1, gaia = 3') == {'apollo': 1.0, 'gaia': 3.0}
+
+
+def test_sample_readings_are_reproducible():
+    assert sample_readings(3, seed=1) == sample_readings(3, seed=1)
+    assert sample_readings(3, seed=1) != sample_readings(3, seed=2)
+
+
+def test_run_selected_benchmarks():
+    report = run_benchmarks({'iterations': 3, 'warmup': 1, 'batch_size': 4,
+                             'only': ['diagnose_simultaneous', 'diagnose_batch']})
+    results = report['results']
+    assert set(results) == {'model_loading', 'diagnose_simultaneous', 'diagnose_batch'}
+    assert results['diagnose_simultaneous']['iterations'] == 3
+    assert results['diagnose_batch']['batch_size'] == 4
+    assert report['config']['batch_size'] == 4 and report['config']['backend'] == 'simulated'
+
+
+def test_bench_command_writes_the_report(tmp_path, capsys):
+    output = tmp_path / 'bench.json'
+    bench_main(['--iterations', '2', '--warmup', '0', '--only', 'prepare_sensor_data', '--output', str(output)])
+    report = json.loads(capsys.readouterr().out)
+    assert json.loads(output.read_text()) == report
+    assert set(report['results']) == {'model_loading', 'prepare_sensor_data'}
+    with pytest.raises(SystemExit):
+        bench_main(['--only', 'everything'])
+
+
+def test_wire_benchmark_keeps_the_batch_size():
+    report = run_benchmarks({'iterations': 10, 'warmup': 0, 'batch_size': 4, 'wire_rows': (1, 8),
+                             'only': ['diagnose_batch', 'wire']})
+    results = report['results']
+    assert results['diagnose_batch']['batch_size'] == 4
+    for count in (1, 8):
+        assert results[f'wire_json_{count}']['iterations'] == 5
+        assert results[f'wire_binary_{count}']['request_bytes'] == 4 + 20 + count * 32 * 4
+        assert results[f'wire_binary_{count}']['request_bytes'] < results[f'wire_json_{count}']['request_bytes']
@@ -0,0 +1,113 @@
+"""Tests for the quantized diagnosis cache"""
+
+import numpy as np
+import pytest
+
+from hailo_cache import DiagnosisCache, build_tolerance_steps
+from hailo_features import FEATURE_DEFAULTS, FEATURE_INDEX
+
+SUPPLY = FEATURE_INDEX['supply_air_temp']
+FLOW = FEATURE_INDEX['supply_air_flow']
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def row(**overrides):
+    values = FEATURE_DEFAULTS.copy()
+    for name, value in overrides.items():
+        values[FEATURE_INDEX[name]] = value
+    return values
+
+
+def test_tolerance_steps_by_unit_and_name():
+    steps = build_tolerance_steps({'CFM': 50.0, 'supply_air_temp': 2.0})
+    assert steps[SUPPLY] == 2.0
+    assert steps[FEATURE_INDEX['return_air_temp']] == 0.5
+    assert steps[FLOW] == steps[FEATURE_INDEX['return_air_flow']] == 50.0
+    with pytest.raises(ValueError):
+        build_tolerance_steps({'degF': 0.0})
+
+
+def test_keys_quantize_to_tolerance():
+    cache = DiagnosisCache()
+    key = cache.make_key(5, row(supply_air_temp=55.1, supply_air_flow=1003.0))
+    assert key == cache.make_key(5, row(supply_air_temp=54.9, supply_air_flow=998.0))
+    assert key != cache.make_key(5, row(supply_air_temp=56.0, supply_air_flow=1003.0))
+    assert key != cache.make_key(6, row(supply_air_temp=55.1, supply_air_flow=1003.0))
+    assert key != cache.make_key(5, row(supply_air_temp=55.1, supply_air_flow=1003.0), variant='cascade')
+
+
+def test_non_finite_inputs_are_not_cached():
+    cache = DiagnosisCache()
+    key = cache.make_key(1, row(supply_air_temp=np.nan))
+    assert key is None
+    cache.put(key, {'final': 1})
+    assert cache.get(key) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_hits_return_tagged_copies():
+    clock = FakeClock()
+    cache = DiagnosisCache(clock=clock)
+    key = cache.make_key(1, row())
+    stored = {'final': {'consensus': 0.25}}
+    cache.put(key, stored)
+    stored['final']['consensus'] = 0.9
+    clock.now += 1.5
+    hit = cache.get(key)
+    assert hit == {'final': {'consensus': 0.25}, 'cache': {'hit': True, 'age_ms': 1500.0}}
+    hit['final']['consensus'] = 0.5
+    assert cache.get(key)['final']['consensus'] == 0.25
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = DiagnosisCache(ttl_seconds=10.0, clock=clock)
+    key = cache.make_key(1, row())
+    cache.put(key, {'final': 1})
+    clock.now += 10.0
+    assert cache.get(key) is not None
+    clock.now += 0.5
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses'], stats['expirations']) == (0, 1, 1, 1)
+
+
+def test_stale_lookups():
+    clock = FakeClock()
+    cache = DiagnosisCache(ttl_seconds=10.0, clock=clock)
+    key = cache.make_key(1, row())
+    cache.put(key, {'final': 1})
+    clock.now += 5.0
+    # A shorter max age misses without dropping the entry
+    assert cache.get(key, max_age_s=2.0) is None
+    assert cache.get(key) is not None
+    clock.now += 6.0
+    # Past the TTL a stale lookup still accepts it, a normal one drops it
+    assert cache.get(key, max_age_s=60.0) is not None
+    assert cache.get(key) is None
+    assert cache.get(key, max_age_s=60.0) is None
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['expirations']) == (0, 2, 2)
+
+
+def test_lru_eviction():
+    cache = DiagnosisCache(max_entries=2, clock=FakeClock())
+    keys = [cache.make_key(unit, row()) for unit in range(3)]
+    cache.put(keys[0], {'unit': 0})
+    cache.put(keys[1], {'unit': 1})
+    assert cache.get(keys[0])['unit'] == 0
+    cache.put(keys[2], {'unit': 2})
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0])['unit'] == 0 and cache.get(keys[2])['unit'] == 2
+    stats = cache.stats()
+    assert (stats['size'], stats['evictions'], stats['hits'], stats['misses']) == (2, 1, 3, 1)
+    assert stats['hit_rate'] == 0.75
+    cache.clear()
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,139 @@
+"""Tests for the NumPy CPU engine and spill-over to the CPU process pool"""
+
+import os
+import signal
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_cpu import CpuBackend, DenseNetwork, load_weights, save_weights, simulated_network, weights_path
+from hailo_inference import MODEL_PATHS, HailoHVACDiagnostics
+from hailo_spill import SpillBalancer
+
+BATCH = np.random.default_rng(6).uniform(0, 1500, size=(9, 32)).astype(np.float32)
+
+BACKED_UP = SimpleNamespace(queue_latency_ms=lambda: 500.0)
+IDLE = SimpleNamespace(queue_latency_ms=lambda: 0.0)
+
+
+@pytest.fixture(scope='module')
+def weights_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('weights')
+    for model_name, model_path in MODEL_PATHS.items():
+        save_weights(weights_path(model_name, model_path, str(directory)), simulated_network(model_name))
+    return str(directory)
+
+
+def simulated_outputs(batch):
+    backend = SimulatedBackend()
+    return {name: backend.load_model(name, path).infer(batch)[:, 0] for name, path in MODEL_PATHS.items()}
+
+
+def test_dense_network_validates_shapes():
+    with pytest.raises(ValueError):
+        DenseNetwork([])
+    with pytest.raises(ValueError):
+        DenseNetwork([(np.zeros((31, 4)), np.zeros(4), 'relu')])
+    with pytest.raises(ValueError):
+        DenseNetwork([(np.zeros((32, 4)), np.zeros(4), 'relu'), (np.zeros((5, 1)), np.zeros(1), 'sigmoid')])
+    with pytest.raises(ValueError):
+        DenseNetwork([(np.zeros((32, 1)), np.zeros(1), 'softplus')])
+
+
+def test_weights_round_trip(tmp_path):
+    network = simulated_network('gaia')
+    path = str(tmp_path / 'gaia.npz')
+    save_weights(path, network)
+    loaded = load_weights(path)
+    assert [activation for _, _, activation in loaded.layers] == ['tanh', 'sigmoid']
+    assert np.array_equal(loaded(BATCH), network(BATCH))
+    assert loaded.outputs == 1
+
+
+def test_weights_path():
+    assert weights_path('gaia', '/models/gaia.hef') == '/models/gaia.npz'
+    assert weights_path('gaia', '/models/gaia.hef', '/weights') == '/weights/gaia.npz'
+
+
+def test_cpu_engine_matches_simulated_device(weights_dir):
+    backend = CpuBackend(weights_dir=weights_dir)
+    expected = simulated_outputs(BATCH)
+    for name, path in MODEL_PATHS.items():
+        output = backend.load_model(name, path).infer(BATCH)
+        assert output.dtype == np.float32
+        assert output[:, 0] == pytest.approx(expected[name], abs=1e-5)
+
+
+def test_cpu_backend_runs_the_ensemble(weights_dir, tmp_path):
+    reading = {'supply_air_temp': 55.0, 'supply_air_flow': 850.0}
+    with HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager') as reference:
+        assert reference.initialize()
+        expected = reference.diagnose(reading, mode='simultaneous', use_cache=False)
+    with HailoHVACDiagnostics(backend=CpuBackend(weights_dir=weights_dir), load_policy='eager') as diag:
+        assert diag.initialize()
+        result = diag.diagnose(reading, mode='simultaneous', use_cache=False)
+    for name, model in result['models'].items():
+        assert model['confidence'] == pytest.approx(expected['models'][name]['confidence'], abs=1e-5)
+        assert model['engine'] == 'cpu'
+
+    with HailoHVACDiagnostics(backend=CpuBackend(weights_dir=str(tmp_path)), load_policy='eager') as diag:
+        diag.initialize()
+        assert not any(report['loaded'] for report in diag.models.values())
+
+
+@pytest.fixture(scope='module')
+def balancer(weights_dir):
+    balancer = SpillBalancer(MODEL_PATHS, threshold_ms=50.0, workers=1, weights_dir=weights_dir)
+    yield balancer
+    balancer.close()
+
+
+def test_spill_only_when_the_device_queue_backs_up(balancer):
+    assert not balancer.should_spill(None, MODEL_PATHS.keys())
+    assert not balancer.should_spill(IDLE, MODEL_PATHS.keys())
+    assert not balancer.should_spill(BACKED_UP, ['unknown'])
+    assert balancer.should_spill(BACKED_UP, MODEL_PATHS.keys())
+    # The single worker slot is taken until the batch finishes
+    assert not balancer.should_spill(BACKED_UP, MODEL_PATHS.keys())
+
+    outcomes = balancer.submit(MODEL_PATHS.keys(), BATCH).result(60.0)
+    expected = simulated_outputs(BATCH)
+    assert set(outcomes) == set(MODEL_PATHS)
+    for name, outcome in outcomes.items():
+        assert outcome['engine'] == 'cpu'
+        assert outcome['probs'] == pytest.approx(expected[name], abs=1e-5)
+
+    stats = balancer.snapshot()
+    assert (stats['spilled_batches'], stats['spilled_rows'], stats['in_flight']) == (1, len(BATCH), 0)
+    assert stats['device_batches'] == 2 and stats['enabled']
+
+
+def test_broken_pool_falls_back_to_the_device(weights_dir, capsys):
+    balancer = SpillBalancer(MODEL_PATHS, threshold_ms=50.0, workers=1, weights_dir=weights_dir)
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    diag.spill = balancer
+    diag.scheduler.queue_latency_ms = BACKED_UP.queue_latency_ms
+    try:
+        outcomes = diag.run_models_batch(list(MODEL_PATHS), BATCH)
+        assert {outcome['engine'] for outcome in outcomes.values()} == {'cpu'}
+        for process in list(balancer.pool._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+        # The batch that finds the pool broken runs on the device instead
+        outcomes = diag.run_models_batch(list(MODEL_PATHS), BATCH)
+        assert {outcome['engine'] for outcome in outcomes.values()} == {'simulated'}
+        assert balancer.pool is None
+        assert 'CPU spill-over disabled' in capsys.readouterr().err
+
+        # Later batches are not offered to the pool at all
+        assert not balancer.should_spill(BACKED_UP, MODEL_PATHS.keys())
+        result = diag.diagnose({'supply_air_temp': 55.0}, mode='simultaneous', use_cache=False)
+        assert {model['engine'] for model in result['models'].values()} == {'simulated'}
+        stats = balancer.snapshot()
+        assert not stats['enabled'] and stats['in_flight'] == 0 and stats['spill_errors'] == 1
+    finally:
+        diag.close()
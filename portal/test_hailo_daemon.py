@@ -0,0 +1,273 @@
+"""Tests for the persistent inference daemon"""
+
+import io
+import json
+
+import numpy as np
+import pytest
+
+from hailo_admission import AdmissionController
+from hailo_backends import SimulatedBackend
+from hailo_cache import DiagnosisCache
+from hailo_daemon import InferenceDaemon, request_daemon, serve_main, serve_stdio, start_socket, stop_socket
+from hailo_inference import MODEL_PATHS, HailoHVACDiagnostics
+from hailo_ring import SensorRingReader, SensorRingWriter, fill_defaults
+from hailo_rollup import FleetRollup
+from hailo_streaming import StreamingDiagnoser
+from hailo_wire import LENGTH_PREFIX, BinaryClient, decode_response, read_frame
+
+READING = {'supply_air_temp': 55.0, 'return_air_temp': 72.0, 'supply_air_flow': 850.0}
+BATCH = [dict(READING, supply_air_temp=50.0 + index) for index in range(4)]
+
+
+class CountingDiagnostics(HailoHVACDiagnostics):
+    """Simulated diagnostics that counts device runs and records close()"""
+
+    def __init__(self, initialize_ok=True, **kwargs):
+        super().__init__(backend=SimulatedBackend(), load_policy='eager', **kwargs)
+        self.initialize_ok = initialize_ok
+        self.runs = 0
+        self.closed = False
+
+    def initialize(self):
+        return self.initialize_ok and super().initialize()
+
+    def run_models_batch(self, *args, **kwargs):
+        self.runs += 1
+        return super().run_models_batch(*args, **kwargs)
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+@pytest.fixture
+def diag():
+    diag = CountingDiagnostics(cache=DiagnosisCache())
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+@pytest.fixture
+def daemon(diag):
+    daemon = InferenceDaemon(diag, max_workers=2)
+    yield daemon
+    daemon.close()
+
+
+def call(daemon, request):
+    """Send one request and return its response"""
+    responses = []
+    future = daemon.handle_line(json.dumps(request) if isinstance(request, dict) else request, responses.append)
+    if future is not None:
+        future.result(10.0)
+    assert len(responses) == 1
+    return responses[0]
+
+
+def test_malformed_and_unknown_requests(daemon):
+    assert call(daemon, 'not json') == {'id': None, 'error': 'Invalid JSON request'}
+    assert call(daemon, '[1, 2]') == {'id': None, 'error': 'Request must be a JSON object'}
+    assert call(daemon, {'id': 1, 'cmd': 'reboot'}) == {'id': 1, 'error': 'Unknown command: reboot'}
+    assert call(daemon, {'id': 2, 'cmd': 'diagnose'}) == {'id': 2, 'error': 'No sensor data provided'}
+
+
+def test_diagnose_ping_and_shutdown(daemon, diag):
+    response = call(daemon, {'id': 'a', 'sensor_data': READING, 'mode': 'simultaneous', 'cache': False})
+    expected = diag.diagnose(READING, mode='simultaneous', use_cache=False)
+    assert response['id'] == 'a'
+    assert response['result']['final']['consensus'] == expected['final']['consensus']
+    ping = call(daemon, {'id': 3, 'cmd': 'ping'})['result']
+    assert ping == {'pong': True, 'in_flight': 0, 'completed': 1}
+
+    assert call(daemon, {'id': 4, 'cmd': 'shutdown'})['result'] == {'shutting_down': True}
+    assert call(daemon, {'id': 5, 'sensor_data': READING}) == {'id': 5, 'error': 'Daemon shutting down'}
+
+
+def test_serve_stdio_answers_until_eof(diag):
+    daemon = InferenceDaemon(diag)
+    stdin = io.StringIO('{"id": 1, "cmd": "ping"}\n\n{"id": 2, "sensor_data": {"supply_air_temp": 55}}\n')
+    stdout = io.StringIO()
+    serve_stdio(daemon, stdin, stdout)
+    daemon.close()
+    assert diag.closed
+    messages = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert messages[0]['event'] == 'ready' and set(messages[0]['models']) == set(MODEL_PATHS)
+    assert {message['id'] for message in messages[1:]} == {1, 2}
+    assert all('result' in message for message in messages[1:])
+
+
+def test_ndjson_socket(daemon, tmp_path):
+    path = str(tmp_path / 'json.sock')
+    server = start_socket(daemon, path)
+    try:
+        assert request_daemon(path, {'id': 9, 'cmd': 'ping'})['result']['pong']
+        response = request_daemon(path, {'id': 10, 'sensor_data': READING})
+        assert response['id'] == 10 and 'final' in response['result']
+    finally:
+        stop_socket(server)
+
+
+def test_serve_main_closes_diag_when_initialize_fails(capsys):
+    diag = CountingDiagnostics(initialize_ok=False)
+    with pytest.raises(SystemExit):
+        serve_main(diag, ['--no-rollup', '--telemetry-interval', '0'])
+    assert diag.closed
+    assert json.loads(capsys.readouterr().out)['error'] == 'Failed to initialize Hailo device'
+
+
+def test_invalid_site_map_exits_before_initialize(tmp_path, capsys):
+    sites = tmp_path / 'sites.json'
+    sites.write_text('{"unit-7": "north"}')
+    diag = CountingDiagnostics()
+    with pytest.raises(SystemExit):
+        serve_main(diag, ['--sites', str(sites), '--telemetry-interval', '0'])
+    assert diag.registry is None
+    assert 'Invalid site map' in json.loads(capsys.readouterr().out)['error']
+
+
+def test_diagnose_batch(daemon, diag):
+    response = call(daemon, {'id': 1, 'cmd': 'diagnose_batch', 'sensor_batch': BATCH, 'mode': 'sequential'})
+    expected = diag.diagnose_batch(BATCH, mode='sequential')
+    assert [result['final'] for result in response['result']] == [result['final'] for result in expected]
+    columns = {'supply_air_temp': [row['supply_air_temp'] for row in BATCH]}
+    response = call(daemon, {'id': 2, 'cmd': 'diagnose_batch', 'sensor_batch': columns})
+    assert len(response['result']) == len(BATCH)
+    assert 'must be a list' in call(daemon, {'id': 3, 'cmd': 'diagnose_batch', 'sensor_batch': 5})['error']
+
+
+def test_batch_equipment_ids_are_checked_before_inference(daemon, diag):
+    diag.rollup = FleetRollup(MODEL_PATHS.keys())
+    runs = diag.runs
+    for equipment_ids, error in (([1, 2], 'one entry per reading'), ('1,2,3,4', 'must be a list'),
+                                 ([1, 2, 3, 'unit-4'], 'unit-4')):
+        response = call(daemon, {'id': 1, 'cmd': 'diagnose_batch', 'sensor_batch': BATCH,
+                                 'equipment_ids': equipment_ids})
+        assert error in response['error']
+    assert diag.runs == runs
+    assert diag.rollup.summary()['diagnoses'] == 0
+
+    response = call(daemon, {'id': 2, 'cmd': 'diagnose_batch', 'sensor_batch': BATCH,
+                             'equipment_ids': [1, 2, '3', 3.0]})
+    assert len(response['result']) == len(BATCH)
+    summary = call(daemon, {'id': 3, 'cmd': 'rollup'})['result']
+    assert summary['enabled'] and summary['diagnoses'] == 4 and summary['units']['total'] == 3
+
+
+def test_cache_commands(daemon, diag):
+    assert call(daemon, {'id': 1, 'cmd': 'cache_stats'})['result']['enabled']
+    call(daemon, {'id': 2, 'sensor_data': READING, 'equipment_id': 1})
+    response = call(daemon, {'id': 3, 'sensor_data': READING, 'equipment_id': 1})
+    assert response['result']['cache']['hit']
+    assert call(daemon, {'id': 4, 'cmd': 'cache_clear'})['result'] == {'cleared': True}
+    assert call(daemon, {'id': 5, 'cmd': 'cache_stats'})['result']['size'] == 0
+
+    diag.cache = None
+    assert call(daemon, {'id': 6, 'cmd': 'cache_stats'})['result'] == {'enabled': False}
+    assert call(daemon, {'id': 7, 'cmd': 'cache_clear'})['result'] == {'cleared': False}
+
+
+def test_diagnose_stream(diag):
+    daemon = InferenceDaemon(diag, stream=StreamingDiagnoser(diag, window=8, stride=2, batch_size=4))
+    try:
+        records = [[unit, float(t), dict(READING, supply_air_temp=50.0 + t)] for t in range(3) for unit in (1, 2)]
+        results = call(daemon, {'id': 1, 'cmd': 'diagnose_stream', 'records': records})['result']
+        assert [(result['equipment_id'], result['timestamp']) for result in results] == [(1, 1.0), (2, 1.0)]
+        assert results[0]['window']['samples'] == 2
+
+        # Windows persist across requests
+        records = [[1, 3.0, dict(READING, supply_air_temp=53.0)]]
+        results = call(daemon, {'id': 2, 'cmd': 'diagnose_stream', 'records': records})['result']
+        assert [(result['equipment_id'], result['window']['samples']) for result in results] == [(1, 4)]
+
+        response = call(daemon, {'id': 3, 'cmd': 'diagnose_stream', 'records': [[1, 'late', {}]]})
+        assert 'Each record must be' in response['error']
+    finally:
+        daemon.close()
+
+    daemon = InferenceDaemon(diag)
+    response = call(daemon, {'id': 4, 'cmd': 'diagnose_stream', 'records': []})
+    assert response['error'] == 'Streaming diagnosis is not enabled'
+    daemon.close()
+
+
+def test_profile_and_metrics(daemon):
+    response = call(daemon, {'id': 1, 'sensor_data': READING, 'profile': True})
+    assert 'final' in response['result'] and 'function calls' in response['profile']
+    response = call(daemon, {'id': 2, 'sensor_data': READING, 'profile': 3})
+    assert 'profile must be' in response['error']
+
+    metrics = call(daemon, {'id': 3, 'cmd': 'metrics'})['result']
+    assert set(metrics['scheduler']) == set(MODEL_PATHS) and 'cache' in metrics and 'stages' in metrics
+    text = call(daemon, {'id': 4, 'cmd': 'metrics', 'format': 'prometheus'})['result']
+    assert 'apollo_requests_in_flight 0' in text and 'apollo_cache_hits_total' in text
+
+
+def test_binary_socket(daemon, diag, tmp_path):
+    path = str(tmp_path / 'bin.sock')
+    server = start_socket(daemon, path, binary=True)
+    try:
+        rows = np.random.default_rng(2).uniform(0, 1500, size=(5, 32)).astype(np.float32)
+        client = BinaryClient(path)
+        confidences, consensus = client.diagnose(rows, mode='sequential')
+        expected_confidences, expected_consensus = diag.diagnose_matrix(rows, mode='sequential')
+        assert np.array_equal(confidences, expected_confidences)
+        assert np.array_equal(consensus, expected_consensus)
+
+        # A malformed frame is answered with an error and the connection stays usable
+        client.sock.sendall(LENGTH_PREFIX.pack(4) + b'junk')
+        assert 'error' in decode_response(read_frame(client.reader))
+        assert client.diagnose(rows[:1])[0].shape == (1, len(MODEL_PATHS))
+        client.sock.close()
+    finally:
+        stop_socket(server)
+
+
+def test_admission_sheds_requests_that_cannot_make_their_deadline(diag):
+    admission = AdmissionController(diag, policy='shed')
+    admission.service_ms['simultaneous'] = 500.0
+    daemon = InferenceDaemon(diag, admission=admission)
+    try:
+        response = call(daemon, {'id': 1, 'sensor_data': READING, 'deadline_ms': 100})
+        assert response['shed'] and 'Deadline cannot be met' in response['error']
+        assert call(daemon, {'id': 2, 'sensor_data': READING})['result']['admission']['outcome'] == 'admitted'
+        stats = call(daemon, {'id': 3, 'cmd': 'admission_stats'})['result']
+        assert stats['enabled'] and stats['shed'] == 1
+    finally:
+        daemon.close()
+
+
+def test_diagnose_latest_from_the_ring(diag, tmp_path):
+    path = str(tmp_path / 'ring')
+    writer = SensorRingWriter(path, slot_count=16)
+    rows = np.random.default_rng(3).uniform(0, 1500, size=(3, 32)).astype(np.float32)
+    writer.append_batch([5, 6, 5], [1.0, 2.0, 3.0], rows)
+    writer.close()
+    daemon = InferenceDaemon(diag, ring=SensorRingReader(path))
+    try:
+        results = call(daemon, {'id': 1, 'cmd': 'diagnose_latest', 'mode': 'sequential'})['result']
+        assert sorted(results) == ['5', '6']
+        assert results['5']['reading_timestamp'] == 3.0 and 'batch_size' not in results['5']
+        expected = diag.diagnose_columnar(fill_defaults(rows[[2]]), mode='sequential')
+        assert results['5']['final']['consensus'] == pytest.approx(float(expected.consensus[0]))
+        assert list(call(daemon, {'id': 2, 'cmd': 'diagnose_latest', 'equipment_ids': [6]})['result']) == ['6']
+    finally:
+        daemon.close()
+
+    daemon = InferenceDaemon(CountingDiagnostics())
+    assert 'No sensor ring' in call(daemon, {'id': 3, 'cmd': 'diagnose_latest'})['error']
+    daemon.close()
+
+
+def test_close_releases_the_device_when_the_rollup_fails(diag):
+    diag.rollup = FleetRollup(MODEL_PATHS.keys())
+
+    def broken_stop():
+        raise OSError('disk full')
+
+    diag.rollup.stop = broken_stop
+    daemon = InferenceDaemon(diag)
+    with pytest.raises(OSError):
+        daemon.close()
+    assert diag.closed
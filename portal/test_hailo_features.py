@@ -0,0 +1,77 @@
+"""Tests for the feature schema and batch conversion"""
+
+import numpy as np
+import pytest
+
+from hailo_features import (FEATURE_DEFAULTS, FEATURE_INDEX, FEATURE_SCHEMA, INPUT_FEATURES, features_from_columns,
+                            features_from_records, normalize_sensor_name)
+
+RECORDS = [
+    {'supply_air_temp': 55.5, 'return_air_temp': 72.0, 'fan_status': 0},
+    {},
+    {'supply_air_flow': 1234.0, 'compressor_current': 17.25, 'unknown_sensor': 9.0},
+]
+
+
+def reference_row(record):
+    """The per-reading conversion the schema replaced"""
+    row = [0.0] * INPUT_FEATURES
+    for spec in FEATURE_SCHEMA:
+        row[spec.index] = record.get(spec.name, spec.default) * spec.scale
+    return np.array(row, dtype=np.float32)
+
+
+def test_schema_columns_are_unique_and_in_range():
+    indexes = [spec.index for spec in FEATURE_SCHEMA]
+    assert len(set(indexes)) == len(indexes)
+    assert all(0 <= index < INPUT_FEATURES for index in indexes)
+    assert len(FEATURE_INDEX) == len(FEATURE_SCHEMA)
+
+
+def test_defaults_fill_unset_features_and_zero_padding():
+    assert FEATURE_DEFAULTS.dtype == np.float32 and FEATURE_DEFAULTS.shape == (INPUT_FEATURES,)
+    assert np.array_equal(FEATURE_DEFAULTS, reference_row({}))
+    assert not FEATURE_DEFAULTS[len(FEATURE_SCHEMA):].any()
+    with pytest.raises(ValueError):
+        FEATURE_DEFAULTS[0] = 1.0
+
+
+def test_records_match_reference():
+    batch = features_from_records(RECORDS)
+    assert batch.shape == (len(RECORDS), INPUT_FEATURES) and batch.dtype == np.float32
+    for row, record in zip(batch, RECORDS):
+        assert np.array_equal(row, reference_row(record))
+
+
+def test_columns_match_records():
+    columns = {name: [record.get(name, spec_default) for record in RECORDS]
+               for name, spec_default in ((spec.name, spec.default) for spec in FEATURE_SCHEMA)}
+    assert np.array_equal(features_from_columns(columns), features_from_records(RECORDS))
+
+
+def test_columns_default_missing_features():
+    batch = features_from_columns({'supply_air_temp': np.array([50.0, 60.0])})
+    assert batch.shape == (2, INPUT_FEATURES)
+    assert batch[:, FEATURE_INDEX['supply_air_temp']].tolist() == [50.0, 60.0]
+    assert np.array_equal(batch[:, 1:], np.tile(FEATURE_DEFAULTS[1:], (2, 1)))
+
+
+def test_columns_reject_ragged_lengths():
+    with pytest.raises(ValueError):
+        features_from_columns({'supply_air_temp': [1.0, 2.0], 'return_air_temp': [1.0]})
+
+
+def test_out_buffer_is_reused():
+    out = np.full((8, INPUT_FEATURES), np.nan, dtype=np.float32)
+    batch = features_from_records(RECORDS, out=out)
+    assert np.shares_memory(batch, out) and len(batch) == len(RECORDS)
+    assert np.array_equal(batch, features_from_records(RECORDS))
+    with pytest.raises(ValueError):
+        features_from_records(RECORDS, out=np.empty((2, INPUT_FEATURES), dtype=np.float32))
+    with pytest.raises(ValueError):
+        features_from_records(RECORDS, out=np.empty((8, INPUT_FEATURES), dtype=np.float64))
+
+
+def test_normalize_sensor_name():
+    assert normalize_sensor_name(' Supply Air Temp ') == 'supply_air_temp'
+    assert normalize_sensor_name('fan_status') == 'fan_status'
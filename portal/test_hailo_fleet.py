@@ -0,0 +1,254 @@
+"""Tests for the adaptive fleet scheduler"""
+
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+import hailo_fleet
+from hailo_backends import SimulatedBackend
+from hailo_fleet import (STABLE_POLLS, DatabaseReadings, FleetScheduler, RingReadings, consensus_tier,
+                         database_sink, fleet_main)
+from hailo_inference import MODEL_PATHS, HailoHVACDiagnostics
+from hailo_results import STATUS_OK, STATUS_SKIPPED, EnsembleResults
+from hailo_ring import SensorRingReader, SensorRingWriter, fill_defaults
+from hailo_rollup import FleetRollup
+
+MODELS = tuple(f'm{index}' for index in range(10))
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeReadings:
+    """Source whose 'reading' for a unit is the number of models that will report a fault"""
+
+    def __init__(self, faults):
+        self.faults = faults
+
+    def equipment_ids(self):
+        return sorted(self.faults)
+
+    def latest(self, equipment_ids):
+        return {equipment_id: {'faults': self.faults[equipment_id]}
+                for equipment_id in equipment_ids if equipment_id in self.faults}
+
+
+class FakeDiagnostics:
+    """Columnar diagnoses where `faults` of ten models vote fault; None means no model reports
+
+    Each diagnosed unit advances the clock by cost_s, as device time would.
+    """
+
+    def __init__(self, clock, cost_s=0.0):
+        self.clock = clock
+        self.cost_s = cost_s
+        self.batches = []
+        self.rollup = None
+
+    def diagnose_columnar(self, readings, mode='simultaneous'):
+        self.batches.append(len(readings))
+        self.clock.now += self.cost_s * len(readings)
+        results = EnsembleResults(MODELS, len(readings), mode)
+        for row, reading in enumerate(readings):
+            faults = reading['faults']
+            if faults is None:
+                results.models[row]['status'] = STATUS_SKIPPED
+                continue
+            results.models[row]['status'] = STATUS_OK
+            results.models[row]['fault_detected'][:faults] = True
+            results.models[row]['confidence'] = np.where(results.models[row]['fault_detected'], 0.9, 0.1)
+        return results.aggregate()
+
+
+def run_until(fleet, clock, end):
+    """Step the scheduler at each wake-up until the clock passes `end`"""
+    while True:
+        wake = fleet.next_wake()
+        if wake is None or wake > end:
+            return
+        clock.now = max(clock.now, wake)
+        fleet.step()
+        # A real clock has moved on by the time the scheduler looks again
+        clock.now += 1e-6
+
+
+def test_consensus_tier():
+    assert consensus_tier(0.9, 0) == 'fault'
+    assert consensus_tier(0.5, 10) == 'watch'
+    assert consensus_tier(0.1, STABLE_POLLS - 1) == 'normal'
+    assert consensus_tier(0.0, STABLE_POLLS) == 'stable'
+
+
+def test_units_poll_at_their_tier_cadence():
+    clock = FakeClock()
+    diag = FakeDiagnostics(clock)
+    fleet = FleetScheduler(diag, FakeReadings({1: 9, 2: 5, 3: 0}), [1, 2, 3], budget=1.0, clock=clock)
+    run_until(fleet, clock, 600.0)
+
+    units = fleet.units
+    assert [units[equipment_id].tier for equipment_id in (1, 2, 3)] == ['fault', 'watch', 'stable']
+    # Every 5 s and every 10 s; the normal unit polls at 0, 30, 60, 90, then every 120 s from 90
+    assert [units[equipment_id].polls for equipment_id in (1, 2, 3)] == [121, 61, 8]
+    # Units that are due together share a batch
+    assert diag.batches[0] == 3 and fleet.batches == 121
+
+    report = fleet.report()
+    assert report['units']['1']['target_per_min'] == 12.0
+    assert report['units']['1']['achieved_per_min'] == pytest.approx(12.0, rel=0.01)
+    assert report['units']['3']['interval_s'] == 120.0
+    assert report['interval_stretch'] == 1.0 and report['device_utilization'] == 0.0
+
+
+def test_budget_stretches_every_interval_alike():
+    clock = FakeClock()
+    diag = FakeDiagnostics(clock, cost_s=0.1)
+    faults = {equipment_id: 9 for equipment_id in range(10)}
+    faults.update({equipment_id: 0 for equipment_id in range(10, 20)})
+    fleet = FleetScheduler(diag, FakeReadings(faults), list(faults), budget=0.1, clock=clock)
+    run_until(fleet, clock, 3600.0)
+
+    report = fleet.report()
+    # Within the budget, give or take the banked burst and the last batch's debt
+    assert report['device_utilization'] <= 0.1 + (2.0 * 0.1 + 10 * 0.1) / 3600.0
+    assert report['device_utilization'] > 0.09
+    # Ten fault units at 0.1 s each every 5 s need twice the budget on their own
+    assert report['interval_stretch'] > 2.0
+    # Each unit gets the same fraction of its target rate
+    stretch = report['interval_stretch']
+    for equipment_id, unit in report['units'].items():
+        expected = unit['target_per_min'] / stretch
+        assert unit['achieved_per_min'] == pytest.approx(expected, rel=0.05, abs=0.05), equipment_id
+
+
+def test_max_batch_runs_the_most_overdue_first():
+    clock = FakeClock()
+    diag = FakeDiagnostics(clock)
+    fleet = FleetScheduler(diag, FakeReadings({1: 0, 2: 9, 3: 0}), [1, 2, 3], budget=1.0, max_batch=2, clock=clock)
+    assert fleet.step() == 2
+    assert fleet.step() == 1
+    assert fleet.step() == 0
+    clock.now = 5.0
+    assert fleet.units[2].tier == 'fault'
+    assert fleet.step() == 1 and fleet.units[2].polls == 2
+
+    # Fault unit 2 is 5 s late on a 5 s interval; units 1 and 3 are 25 s late on 30 s
+    clock.now = 30.0
+    fleet.max_batch = 1
+    assert fleet.step() == 1
+    assert fleet.units[2].polls == 3
+
+
+def test_units_without_readings_or_results(tmp_path):
+    clock = FakeClock()
+    stored = []
+    fleet = FleetScheduler(FakeDiagnostics(clock), FakeReadings({1: None, 2: 0}), [1, 2, 3], budget=1.0,
+                           clock=clock, sink=lambda unit, result, ms: stored.append((unit.equipment_id, result, ms)))
+    assert fleet.step() == 2
+    assert [equipment_id for equipment_id, _, _ in stored] == [1, 2]
+    assert stored[0][1]['final']['diagnosis'] == 'Unable to complete diagnosis'
+
+    # No reading yet: counted as skipped and looked at again on the normal cadence
+    assert fleet.units[3].skipped == 1 and fleet.units[3].due == 30.0
+    # A run with no reporting model does not count toward a stable streak
+    assert fleet.units[1].normal_streak == 0 and fleet.units[2].normal_streak == 1
+
+    report = fleet.report()
+    assert report['units']['3']['polls'] == 0 and report['units']['3']['skipped'] == 1
+    assert report['units']['2']['diagnosis'] == stored[1][1]['final']['diagnosis']
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE sensor_readings (id INTEGER PRIMARY KEY AUTOINCREMENT, equipment_id INTEGER NOT NULL, '
+                 'timestamp REAL NOT NULL, sensor_values TEXT NOT NULL)')
+    conn.execute('CREATE TABLE model_inferences (id INTEGER PRIMARY KEY AUTOINCREMENT, equipment_id INTEGER, '
+                 'model_output TEXT, inference_time_ms REAL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
+    for equipment_id, temp in ((1, 50), (2, 60), (1, 55)):
+        conn.execute('INSERT INTO sensor_readings (equipment_id, timestamp, sensor_values) VALUES (?, 0, ?)',
+                     (equipment_id, json.dumps({'Supply Air Temp': temp})))
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope='module')
+def diag():
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+def test_database_source_and_sink(conn, diag):
+    source = DatabaseReadings(conn)
+    assert source.equipment_ids() == [1, 2]
+    assert source.latest([1, 2, 9]) == {1: {'supply_air_temp': 55.0}, 2: {'supply_air_temp': 60.0}}
+
+    fleet = FleetScheduler(diag, source, [1, 2], sink=database_sink(conn), clock=FakeClock())
+    assert fleet.step() == 2
+    rows = conn.execute('SELECT equipment_id, model_output, inference_time_ms FROM model_inferences').fetchall()
+    assert [row[0] for row in rows] == [1, 2]
+    result = json.loads(rows[0][1])
+    assert result['equipmentId'] == 1 and result['cadence'] == fleet.units[1].tier
+    assert result['inferenceTimeMs'] == rows[0][2] and 'batch_size' not in result
+    expected = diag.diagnose({'supply_air_temp': 55.0}, mode='simultaneous', use_cache=False)
+    assert result['final']['consensus'] == pytest.approx(expected['final']['consensus'])
+
+
+def test_ring_source_feeds_the_rollup(tmp_path, diag):
+    path = str(tmp_path / 'ring')
+    writer = SensorRingWriter(path, slot_count=16)
+    rows = np.random.default_rng(4).uniform(0, 1500, size=(3, 32)).astype(np.float32)
+    writer.append_batch([7, 8, 7], [1.0, 2.0, 3.0], rows)
+    reader = SensorRingReader(path)
+    source = RingReadings(reader)
+    assert source.equipment_ids() == [7, 8]
+
+    diag.rollup = FleetRollup(MODEL_PATHS.keys())
+    try:
+        stored = {}
+        fleet = FleetScheduler(diag, source, [7, 8], clock=FakeClock(),
+                               sink=lambda unit, result, ms: stored.update({unit.equipment_id: result}))
+        assert fleet.step() == 2
+        expected = diag.diagnose_columnar(fill_defaults(rows[[2, 1]]))
+        for row, equipment_id in enumerate((7, 8)):
+            assert stored[equipment_id]['final']['consensus'] == pytest.approx(float(expected.consensus[row]))
+        summary = diag.rollup.summary()
+        assert summary['diagnoses'] == 2 and summary['units']['total'] == 2
+    finally:
+        diag.rollup = None
+        reader.close()
+        writer.close()
+
+
+def test_fleet_from_a_ring_without_storing_needs_no_database(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'ring')
+    writer = SensorRingWriter(path, slot_count=16)
+    writer.append_batch([3, 4], [1.0, 2.0], np.full((2, 32), 100.0, dtype=np.float32))
+    writer.close()
+    monkeypatch.setattr(hailo_fleet.signal, 'signal', lambda signum, handler: None)
+
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    status_file = tmp_path / 'status.json'
+    fleet_main(diag, ['--ring', path, '--no-store', '--db', str(tmp_path / 'missing.db'), '--duration', '0',
+                      '--status-file', str(status_file), '--rollup-file', str(tmp_path / 'rollup.npz'),
+                      '--sites', ''])
+    report = json.loads(capsys.readouterr().out)
+    assert sorted(report['units']) == ['3', '4']
+    assert all(unit['polls'] == 1 for unit in report['units'].values())
+    assert json.loads(status_file.read_text()) == report
+    assert (tmp_path / 'rollup.npz').exists()
+
+    # Storing results still needs the database
+    with pytest.raises(SystemExit):
+        fleet_main(HailoHVACDiagnostics(backend=SimulatedBackend()), ['--ring', path, '--db',
+                                                                      str(tmp_path / 'missing.db')])
+    assert 'Sensor database not found' in capsys.readouterr().out
@@ -0,0 +1,95 @@
+"""Tests for batched, cascade and async diagnosis"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_inference import CASCADE_GATE_MODELS, CASCADE_SPECIALISTS, MODEL_PATHS, HailoHVACDiagnostics
+
+BATCH = np.random.default_rng(5).uniform(0, 1500, size=(12, 32)).astype(np.float32)
+READING = {'supply_air_temp': 55.0, 'return_air_temp': 72.0, 'supply_air_flow': 850.0}
+
+
+@pytest.fixture
+def diag():
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+def confidences(result):
+    return {name: model.get('confidence') for name, model in result['models'].items()}
+
+
+def test_cascade_escalates_only_rows_above_the_threshold(diag):
+    full = diag.diagnose_batch(BATCH, mode='simultaneous')
+    gate = np.array([max(result['models'][name]['confidence'] for name in CASCADE_GATE_MODELS) for result in full])
+    threshold = float(np.median(gate))
+    results = diag.diagnose_batch(BATCH, mode='cascade', cascade_threshold=threshold)
+
+    escalated = [result['cascade']['escalated'] for result in results]
+    assert escalated == (gate >= threshold).tolist() and any(escalated) and not all(escalated)
+    for result, reference in zip(results, full):
+        assert result['cascade']['gate_confidence'] == pytest.approx(
+            max(reference['models'][name]['confidence'] for name in CASCADE_GATE_MODELS))
+        if result['cascade']['escalated']:
+            assert confidences(result) == pytest.approx(confidences(reference), abs=1e-6)
+            assert result['cascade']['skipped'] == []
+        else:
+            assert result['cascade']['skipped'] == list(CASCADE_SPECIALISTS)
+            assert all(result['models'][name]['skipped'] for name in CASCADE_SPECIALISTS)
+
+
+def test_cascade_runs_everything_when_a_gate_model_fails(diag):
+    broken = CASCADE_GATE_MODELS[0]
+    del diag.pipelines[broken]
+    diag.models[broken] = {'loaded': False, 'state': 'failed', 'error': 'File not found'}
+    result = diag.diagnose_batch(BATCH[:2], mode='cascade', cascade_threshold=1.0)[0]
+    assert result['cascade']['escalated']
+    assert result['cascade']['reason'] == 'Gate model unavailable - ran all models'
+    assert result['models'][broken] == {'error': 'Model not loaded'}
+    assert all('confidence' in result['models'][name] for name in CASCADE_SPECIALISTS)
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'simultaneous', 'cascade'])
+def test_async_matches_blocking(diag, mode):
+    async def run():
+        single = await diag.diagnose_async(READING, mode=mode, cascade_threshold=0.5)
+        batch = await diag.diagnose_batch_async(BATCH, mode=mode, cascade_threshold=0.5)
+        return single, batch
+
+    single, batch = asyncio.run(run())
+    assert confidences(single) == pytest.approx(confidences(diag.diagnose(READING, mode=mode, cascade_threshold=0.5)))
+    expected = diag.diagnose_batch(BATCH, mode=mode, cascade_threshold=0.5)
+    assert [result['final'] for result in batch] == [result['final'] for result in expected]
+    assert asyncio.run(diag.diagnose_batch_async([])) == []
+
+
+def test_async_timeout_reports_slow_models():
+    # The last model in device order, so the others are not queued behind it
+    slow = list(MODEL_PATHS)[-1]
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(latency_ms={slow: 300.0}), load_policy='eager')
+    assert diag.initialize()
+    try:
+        result = asyncio.run(diag.diagnose_async(READING, mode='simultaneous', timeout=0.1))
+        assert result['models'][slow] == {'error': 'Inference timed out'}
+        assert all('confidence' in model for name, model in result['models'].items() if name != slow)
+    finally:
+        diag.close()
+
+
+def test_many_concurrent_requests_share_the_device(diag):
+    async def run():
+        return await asyncio.gather(*(diag.diagnose_async(dict(READING, supply_air_temp=float(t)), mode='simultaneous')
+                                      for t in range(50)))
+
+    results = asyncio.run(run())
+    for t in (0, 49):
+        expected = diag.diagnose(dict(READING, supply_air_temp=float(t)), mode='simultaneous')
+        assert confidences(results[t]) == pytest.approx(confidences(expected))
+    stats = diag.scheduler.snapshot()
+    assert all(model['requests'] >= 50 for model in stats.values())
+    assert any(model['batches'] < model['requests'] for model in stats.values())
@@ -0,0 +1,86 @@
+"""Tests for stage histograms, their exports and one-shot profiling"""
+
+import pytest
+
+from hailo_metrics import Histogram, Metrics, profile_call
+
+
+def test_histogram_counts_and_quantiles():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0, 8.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 5
+    assert snapshot['sum_ms'] == 14.5 and snapshot['mean_ms'] == 2.9 and snapshot['max_ms'] == 8.0
+    assert snapshot['buckets'] == {'1.0': 1, '2.0': 2, '4.0': 1, '+Inf': 1}
+    # Rank 2.5 falls three quarters of the way into the (1, 2] bucket
+    assert snapshot['p50_ms'] == 1.75
+    # The overflow bucket interpolates up to the largest observation
+    assert snapshot['p99_ms'] == pytest.approx(4.0 + 4.0 * 0.95)
+
+
+def test_empty_histogram():
+    snapshot = Histogram().snapshot()
+    assert snapshot['count'] == 0
+    assert snapshot['mean_ms'] is None and snapshot['p50_ms'] is None
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = Histogram(buckets=(1.0, 2.0))
+    histogram.observe(1.0)
+    histogram.observe(2.0)
+    assert histogram.counts == [1, 1, 0]
+
+
+def test_metrics_snapshot_by_stage_and_model():
+    metrics = Metrics(buckets=(1.0, 10.0))
+    metrics.observe('device_infer', 0.5, 'apollo')
+    metrics.observe('device_infer', 5.0, 'gaia')
+    metrics.observe('ensemble', 7.0)
+    with metrics.timer('prepare'):
+        pass
+    snapshot = metrics.snapshot()
+    assert list(snapshot) == ['device_infer', 'ensemble', 'prepare']
+    assert set(snapshot['device_infer']) == {'apollo', 'gaia'}
+    assert snapshot['ensemble']['all']['count'] == 1
+    assert snapshot['prepare']['all']['count'] == 1
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_timer_records_failed_blocks():
+    metrics = Metrics()
+    with pytest.raises(RuntimeError):
+        with metrics.timer('postprocess', 'boreas'):
+            raise RuntimeError('boom')
+    assert metrics.snapshot()['postprocess']['boreas']['count'] == 1
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = Metrics(buckets=(1.0, 10.0))
+    for value in (0.5, 2.0, 20.0):
+        metrics.observe('device_infer', value, 'apollo')
+    text = metrics.render_prometheus(prefix='stage_ms')
+    assert text.endswith('\n')
+    lines = text.splitlines()
+    assert lines[:2] == ['# HELP stage_ms Inference engine stage latency in milliseconds',
+                         '# TYPE stage_ms histogram']
+    assert lines[2:] == [
+        'stage_ms_bucket{stage="device_infer",model="apollo",le="1.0"} 1',
+        'stage_ms_bucket{stage="device_infer",model="apollo",le="10.0"} 2',
+        'stage_ms_bucket{stage="device_infer",model="apollo",le="+Inf"} 3',
+        'stage_ms_sum{stage="device_infer",model="apollo"} 22.5',
+        'stage_ms_count{stage="device_infer",model="apollo"} 3',
+    ]
+
+
+@pytest.mark.parametrize('kind, marker', [('cprofile', 'function calls'), ('tracemalloc', 'peak=')])
+def test_profile_call(kind, marker):
+    result, report = profile_call(lambda: sum(range(1000)), kind=kind)
+    assert result == 499500
+    assert marker in report
+
+
+def test_profile_call_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        profile_call(lambda: None, kind='perf')
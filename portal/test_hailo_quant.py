@@ -0,0 +1,62 @@
+"""Tests for host-side UINT8 quantization"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend, SimulatedPipeline, simulated_quant_params
+from hailo_quant import PROBABILITY_PARAMS, QuantParams, Quantizer, dequantize, quant_params_from_info
+
+
+def vstream_info(*pairs, per_channel=True):
+    infos = [SimpleNamespace(qp_scale=scale, qp_zp=zero_point) for scale, zero_point in pairs]
+    return SimpleNamespace(quant_info=infos[0], quant_infos=infos if per_channel else None)
+
+
+def test_quant_params_from_info():
+    params = quant_params_from_info(vstream_info((0.5, 3.0), per_channel=False))
+    assert np.ndim(params.scale) == 0 and (params.scale, params.zero_point) == (0.5, 3.0)
+    params = quant_params_from_info(vstream_info((0.5, 3.0), (0.25, 0.0)))
+    assert params.scale.tolist() == [0.5, 0.25] and params.zero_point.tolist() == [3.0, 0.0]
+
+
+def test_round_trip_within_half_a_step():
+    params = simulated_quant_params()
+    low = (0 - params.zero_point) * params.scale
+    high = (255 - params.zero_point) * params.scale
+    batch = np.random.default_rng(2).uniform(low, high, size=(64, len(params.scale))).astype(np.float32)
+    quantized = Quantizer(params, batch.shape[1]).quantize(batch)
+    assert quantized.dtype == np.uint8
+    error = np.abs(dequantize(quantized, params) - batch)
+    assert (error <= params.scale / 2 + 1e-4).all()
+
+
+def test_quantize_clamps_out_of_range_values():
+    params = QuantParams(np.float32(0.5), np.float32(10.0))
+    quantized = Quantizer(params, 3).quantize(np.array([[-100.0, 0.0, 1000.0]], dtype=np.float32))
+    assert quantized.tolist() == [[0, 10, 255]]
+
+
+def test_quantizer_reuses_its_buffer():
+    quantizer = Quantizer(QuantParams(np.float32(1.0), np.float32(0.0)), 2)
+    first = quantizer.quantize(np.ones((4, 2), dtype=np.float32))
+    second = quantizer.quantize(np.full((2, 2), 2.0, dtype=np.float32))
+    assert second.shape == (2, 2) and np.shares_memory(first, second)
+    assert first[:2].tolist() == [[2, 2], [2, 2]]
+    bigger = quantizer.quantize(np.zeros((16, 2), dtype=np.float32))
+    assert bigger.shape == (16, 2) and not bigger.any()
+
+
+def test_dequantize_probabilities():
+    output = dequantize(np.array([[0], [128], [255]], dtype=np.uint8), PROBABILITY_PARAMS)
+    assert output.dtype == np.float32
+    assert output.ravel().tolist() == pytest.approx([0.0, 128 / 255, 1.0])
+
+
+def test_quantized_pipeline_tracks_float():
+    batch = np.random.default_rng(1).uniform(0, 100, size=(16, 32)).astype(np.float32)
+    exact = SimulatedPipeline(SimulatedBackend(), 'boreas').infer(batch)
+    quantized = SimulatedPipeline(SimulatedBackend(quantized=True), 'boreas').infer(batch)
+    assert quantized.dtype == np.float32
+    assert np.abs(quantized - exact).max() < 0.02
@@ -0,0 +1,104 @@
+"""Tests for model loading policies and warm-up"""
+
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_inference import MODEL_PATHS, MODEL_PRIORITY
+from hailo_registry import ModelRegistry
+
+
+class RecordingBackend(SimulatedBackend):
+    """Simulated backend that records configure order and can break chosen models"""
+
+    def __init__(self, broken_warmup=(), **kwargs):
+        super().__init__(**kwargs)
+        self.configured = []
+        self.broken_warmup = set(broken_warmup)
+        self.pipelines = []
+
+    def configure_model(self, model_name, weights):
+        self.configured.append(model_name)
+        pipeline = super().configure_model(model_name, weights)
+        if model_name in self.broken_warmup:
+            def infer(batch):
+                raise RuntimeError('warm-up failed')
+            pipeline.infer = infer
+        self.pipelines.append(pipeline)
+        return pipeline
+
+
+class FileBackend(RecordingBackend):
+    requires_model_files = True
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ModelRegistry(SimulatedBackend(), MODEL_PATHS, policy='sometimes')
+
+
+def test_eager_configures_in_priority_order():
+    backend = RecordingBackend()
+    registry = ModelRegistry(backend, MODEL_PATHS, priority=MODEL_PRIORITY, policy='eager').initialize()
+    assert backend.configured == registry.priority
+    assert registry.priority[:len(MODEL_PRIORITY)] == [name for name in MODEL_PRIORITY if name in MODEL_PATHS]
+    assert set(registry.pipelines) == set(MODEL_PATHS)
+    report = registry.report()
+    assert report['policy'] == 'eager' and list(report['models']) == registry.priority
+    for model in report['models'].values():
+        assert model['state'] == 'loaded' and model['io_format'] == 'float32'
+        assert model['warmup_time_ms'] is not None
+    registry.close()
+
+
+def test_lazy_loads_on_first_use():
+    backend = RecordingBackend()
+    registry = ModelRegistry(backend, MODEL_PATHS, policy='lazy').initialize()
+    assert backend.configured == [] and 'apollo' in registry
+    pipeline = registry.get('apollo')
+    assert registry.get('apollo') is pipeline
+    assert backend.configured == ['apollo']
+    assert registry.models['apollo']['state'] == 'loaded'
+    assert registry.models['gaia']['state'] == 'pending'
+    registry.close()
+
+
+def test_background_loads_everything():
+    backend = RecordingBackend(parse_ms=5.0)
+    registry = ModelRegistry(backend, MODEL_PATHS, policy='background').initialize()
+    # A request may load its model ahead of the loader thread
+    assert registry.get('gaia') is not None
+    registry.wait(10.0)
+    assert sorted(backend.configured) == sorted(MODEL_PATHS)
+    assert all(report['loaded'] for report in registry.models.values())
+    registry.close()
+
+
+def test_missing_model_file_fails_the_model(tmp_path):
+    paths = {'apollo': str(tmp_path / 'apollo.hef'), 'gaia': str(tmp_path / 'gaia.hef')}
+    (tmp_path / 'gaia.hef').write_bytes(b'\0' * 1024)
+    backend = FileBackend()
+    registry = ModelRegistry(backend, paths, policy='eager').initialize()
+    assert registry.models['apollo'] == {'loaded': False, 'state': 'failed', 'error': 'File not found',
+                                         'path': paths['apollo']}
+    assert 'apollo' not in registry and registry.get('apollo') is None
+    assert registry.models['gaia']['loaded']
+    assert backend.configured == ['gaia']
+    registry.close()
+
+
+def test_warmup_failure_closes_the_pipeline(capsys):
+    backend = RecordingBackend(broken_warmup={'boreas'})
+    registry = ModelRegistry(backend, MODEL_PATHS, policy='eager').initialize()
+    report = registry.models['boreas']
+    assert (report['state'], report['error']) == ('failed', 'warm-up failed')
+    assert 'boreas' not in registry.pipelines
+    broken = [pipeline for pipeline in backend.pipelines if pipeline.model_name == 'boreas']
+    assert len(broken) == 1 and broken[0].closed
+    assert 'Error loading boreas' in capsys.readouterr().err
+    registry.close()
+
+
+def test_warmup_can_be_disabled():
+    registry = ModelRegistry(RecordingBackend(), MODEL_PATHS, policy='eager', warmup=False).initialize()
+    assert all(report['warmup_time_ms'] is None for report in registry.models.values())
+    registry.close()
@@ -0,0 +1,118 @@
+"""Tests for columnar ensemble results against the per-row dict aggregation"""
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_inference import MODEL_PATHS, HailoHVACDiagnostics
+from hailo_results import STATUS_SKIPPED, EnsembleResults
+
+MODEL_NAMES = list(MODEL_PATHS)
+
+
+@pytest.fixture(scope='module')
+def diag():
+    return HailoHVACDiagnostics(backend=SimulatedBackend())
+
+
+def random_outputs(count, seed):
+    rng = np.random.default_rng(seed)
+    outputs = {}
+    for name in MODEL_NAMES:
+        draw = rng.uniform()
+        if draw < 0.1:
+            continue
+        if draw < 0.2:
+            outputs[name] = {'error': f'{name} failed'}
+            continue
+        outputs[name] = {'probs': rng.choice([0.1, 0.45, 0.55, 0.8, 0.95], size=count).astype(np.float32),
+                         'inference_time_ms': float(rng.uniform(0, 5))}
+    return outputs
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_rows_match_dict_aggregation(diag, seed):
+    outputs = random_outputs(40, seed)
+    results = EnsembleResults.from_model_outputs(MODEL_NAMES, outputs, 40, 'simultaneous', total_time_ms=3.5)
+    assert len(results) == 40
+    for index, entry in enumerate(results):
+        assert list(entry['models']) == MODEL_NAMES
+        assert entry['batch_size'] == 40 and entry['mode'] == 'simultaneous'
+        for name, model in entry['models'].items():
+            outcome = outputs.get(name)
+            if outcome is None:
+                assert model['skipped']
+            elif 'error' in outcome:
+                assert model == {'error': outcome['error']}
+            else:
+                assert model['confidence'] == pytest.approx(float(outcome['probs'][index]))
+                assert model['fault_detected'] == (outcome['probs'][index] > 0.5)
+                assert model['diagnosis'] == diag.interpret_diagnosis(name, model['confidence'])
+                assert model['total_ensemble_time_ms'] == 3.5
+        expected = diag._aggregate_diagnoses(entry['models'])
+        assert entry['final']['diagnosis'] == expected['diagnosis']
+        assert entry['final']['consensus'] == pytest.approx(expected['consensus'])
+
+
+def test_indexing_matches_iteration():
+    results = EnsembleResults.from_model_outputs(MODEL_NAMES, random_outputs(5, 9), 5, 'sequential')
+    rows = results.to_dicts()
+    assert [results[index] for index in range(5)] == rows
+    assert results[-1] == rows[-1]
+    with pytest.raises(IndexError):
+        results[5]
+
+
+def test_confidences_mark_missing_results_nan():
+    outputs = {'apollo': {'probs': np.array([0.2, 0.9], dtype=np.float32), 'inference_time_ms': 1.0},
+               'gaia': {'error': 'boom'}}
+    confidences = EnsembleResults.from_model_outputs(MODEL_NAMES, outputs, 2, 'simultaneous').confidences()
+    assert confidences.shape == (2, len(MODEL_NAMES))
+    assert confidences[:, 0].tolist() == pytest.approx([0.2, 0.9])
+    assert np.isnan(confidences[:, 1:]).all()
+
+
+def test_no_results_is_unable_to_diagnose():
+    entry = EnsembleResults.from_model_outputs(MODEL_NAMES, {}, 1, 'simultaneous')[0]
+    assert entry['final'] == {'diagnosis': 'Unable to complete diagnosis', 'consensus': 0}
+
+
+def test_sub_batch_outcome_skips_other_rows():
+    outputs = {name: {'probs': np.full(3, 0.2, dtype=np.float32), 'inference_time_ms': 1.0}
+               for name in MODEL_NAMES[:2]}
+    outputs[MODEL_NAMES[2]] = {'probs': np.array([0.9], dtype=np.float32), 'inference_time_ms': 2.0,
+                               'rows': np.array([1])}
+    results = EnsembleResults.from_model_outputs(MODEL_NAMES, outputs, 3, 'simultaneous')
+    assert results.models['status'][:, 2].tolist() == [STATUS_SKIPPED, 0, STATUS_SKIPPED]
+    assert results[1]['models'][MODEL_NAMES[2]]['confidence'] == pytest.approx(0.9)
+    # Outside cascade mode a skipped model carries a neutral reason
+    assert results[0]['models'][MODEL_NAMES[2]] == {'skipped': True, 'reason': 'Model skipped'}
+    assert 'cascade' not in results[0]
+
+
+def test_scheduler_fields_only_when_present():
+    outputs = {'apollo': {'probs': np.array([0.2], dtype=np.float32), 'inference_time_ms': 1.0,
+                          'queue_depth': 3, 'switches': 1},
+               'gaia': {'probs': np.array([0.2], dtype=np.float32), 'inference_time_ms': 1.0}}
+    models = EnsembleResults.from_model_outputs(MODEL_NAMES, outputs, 1, 'simultaneous')[0]['models']
+    assert (models['apollo']['queue_depth'], models['apollo']['switches']) == (3, 1)
+    assert 'queue_depth' not in models['gaia'] and 'switches' not in models['gaia']
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'simultaneous', 'cascade'])
+def test_diagnose_columnar_matches_diagnose_batch(mode):
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    try:
+        rng = np.random.default_rng(5)
+        readings = [{'supply_air_temp': float(rng.uniform(40, 90)), 'supply_air_flow': float(rng.uniform(500, 1500))}
+                    for _ in range(12)]
+        columnar = diag.diagnose_columnar(readings, mode=mode, cascade_threshold=0.4)
+        expected = diag.diagnose_batch(readings, mode=mode, cascade_threshold=0.4)
+        for entry, reference in zip(columnar, expected):
+            assert entry['final'] == reference['final']
+            assert set(entry['models']) == set(reference['models'])
+            for name, model in entry['models'].items():
+                assert model.get('confidence') == reference['models'][name].get('confidence')
+    finally:
+        diag.close()
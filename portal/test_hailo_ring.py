@@ -0,0 +1,160 @@
+"""Tests for the shared-memory sensor ring"""
+
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from hailo_features import FEATURE_DEFAULTS, FEATURE_INDEX, INPUT_FEATURES
+from hailo_ring import SensorRingReader, SensorRingWriter, fill_defaults, row_from_readings
+
+SUPPLY = FEATURE_INDEX['supply_air_temp']
+
+
+def marked_rows(values):
+    """Rows whose every feature equals the record's marker value"""
+    return np.repeat(np.asarray(values, dtype=np.float32)[:, None], INPUT_FEATURES, axis=1)
+
+
+@pytest.fixture
+def ring_path(tmp_path):
+    return str(tmp_path / 'ring')
+
+
+def test_row_from_readings_and_defaults():
+    row = row_from_readings({'Supply Air Temp': 55.0, 'fan_status': None, 'not_a_sensor': 1.0})
+    assert row[SUPPLY] == 55.0
+    assert np.isnan(np.delete(row, SUPPLY)).all()
+    filled = fill_defaults(row[None, :])
+    assert filled[0, SUPPLY] == 55.0
+    assert np.array_equal(np.delete(filled[0], SUPPLY), np.delete(FEATURE_DEFAULTS, SUPPLY))
+
+
+def test_read_since_follows_the_stream(ring_path):
+    writer = SensorRingWriter(ring_path, slot_count=8)
+    reader = SensorRingReader(ring_path)
+    writer.append_batch([1, 2, 3], [10.0, 11.0, 12.0], marked_rows([10.0, 11.0, 12.0]))
+    records, cursor, lost = reader.read_since(0)
+    assert (cursor, lost) == (3, 0)
+    assert records['equipment_id'].tolist() == [1, 2, 3]
+    assert records['values'][:, 0].tolist() == [10.0, 11.0, 12.0]
+
+    writer.append(4, 13.0, marked_rows([13.0])[0])
+    records, cursor, lost = reader.read_since(cursor)
+    assert (records['equipment_id'].tolist(), cursor, lost) == ([4], 4, 0)
+    assert len(reader.read_since(cursor)[0]) == 0
+    writer.close()
+    reader.close()
+
+
+def test_lagging_reader_counts_lost_records(ring_path):
+    writer = SensorRingWriter(ring_path, slot_count=4)
+    reader = SensorRingReader(ring_path)
+    values = np.arange(10, dtype=np.float32)
+    writer.append_batch(list(range(10)), values, marked_rows(values))
+    records, cursor, lost = reader.read_since(0)
+    assert (cursor, lost) == (10, 6)
+    assert records['equipment_id'].tolist() == [6, 7, 8, 9]
+
+
+def test_latest_picks_newest_rows_per_unit(ring_path):
+    writer = SensorRingWriter(ring_path, slot_count=16)
+    reader = SensorRingReader(ring_path)
+    writer.append_batch([5, 6, 5, 7, 5], [1.0, 2.0, 3.0, 4.0, 5.0], marked_rows([1.0, 2.0, 3.0, 4.0, 5.0]))
+    latest = reader.latest(per_unit=2)
+    assert sorted(latest) == [5, 6, 7]
+    timestamps, rows = latest[5]
+    assert timestamps.tolist() == [5.0, 3.0] and rows[:, 0].tolist() == [5.0, 3.0]
+
+    units, timestamps, rows = reader.latest_batch([6, 5, 99])
+    assert units == [5, 6] and timestamps.tolist() == [5.0, 2.0]
+    assert rows.shape == (2, INPUT_FEATURES)
+    assert set(reader.latest_rows([7])) == {7}
+
+
+def test_slot_being_written_is_skipped(ring_path):
+    writer = SensorRingWriter(ring_path, slot_count=4)
+    reader = SensorRingReader(ring_path)
+    writer.append_batch([1, 2], [1.0, 2.0], marked_rows([1.0, 2.0]))
+    # A writer zeroes a slot's seq before filling it
+    writer.slots['seq'][1] = 0
+    writer.slots['values'][1] = 99.0
+    assert sorted(reader.latest()) == [1]
+    records, cursor, lost = reader.read_since(0)
+    assert (records['equipment_id'].tolist(), cursor, lost) == ([1], 2, 1)
+
+
+class RacingSlots:
+    """Slot array proxy that lets a writer land between a reader's copy and its recheck"""
+
+    def __init__(self, slots, writes):
+        self.slots = slots
+        self.writes = list(writes)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.slots[key]
+        records = self.slots[key]
+        if self.writes:
+            self.writes.pop(0)()
+        return records
+
+    def __len__(self):
+        return len(self.slots)
+
+
+def test_copy_overwritten_during_read_is_rejected(ring_path):
+    writer = SensorRingWriter(ring_path, slot_count=4)
+    reader = SensorRingReader(ring_path)
+    writer.append_batch([1, 2, 3, 4], [1.0, 2.0, 3.0, 4.0], marked_rows([1.0, 2.0, 3.0, 4.0]))
+
+    def overwrite(units):
+        return lambda: writer.append_batch(units, units, marked_rows(units))
+
+    reader.slots = RacingSlots(reader.slots, [overwrite([5, 6]), overwrite([7])])
+    records, cursor, lost = reader.read_since(0)
+    # Slots 0 and 1 changed under the copy; 2 and 3 still hold the records read
+    assert records['equipment_id'].tolist() == [3, 4]
+    assert (cursor, lost) == (4, 2)
+
+    # Slot 2 changes under this copy, so unit 3's old row is dropped too
+    latest = reader.latest()
+    assert sorted(latest) == [4, 5, 6]
+    assert all((rows == timestamps[:, None]).all() for timestamps, rows in latest.values())
+
+
+def test_reader_rejects_foreign_files(tmp_path):
+    path = tmp_path / 'not-a-ring'
+    path.write_bytes(b'\0' * 4096)
+    with pytest.raises(ValueError):
+        SensorRingReader(str(path))
+
+
+def hammer(path, rounds):
+    writer = SensorRingWriter(path)
+    for start in range(0, rounds * 8, 8):
+        values = np.arange(start, start + 8, dtype=np.float32)
+        writer.append_batch((values % 50).astype(np.int32), values, marked_rows(values))
+    writer.close()
+
+
+def test_concurrent_writer_never_yields_torn_rows(ring_path):
+    SensorRingWriter(ring_path, slot_count=16).close()
+    reader = SensorRingReader(ring_path)
+    process = multiprocessing.get_context('fork').Process(target=hammer, args=(ring_path, 5000))
+    process.start()
+    reads = 0
+    cursor = 0
+    try:
+        while process.is_alive() or reads == 0:
+            records, cursor, lost = reader.read_since(cursor)
+            for record in records:
+                assert (record['values'] == record['timestamp']).all()
+                assert record['equipment_id'] == int(record['timestamp']) % 50
+            for unit, (timestamps, rows) in reader.latest().items():
+                assert (rows == timestamps[:, None]).all()
+                assert all(int(timestamp) % 50 == unit for timestamp in timestamps)
+            reads += 1
+    finally:
+        process.join()
+    assert process.exitcode == 0
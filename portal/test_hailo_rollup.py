@@ -0,0 +1,210 @@
+"""Tests for incremental fleet rollups"""
+
+import json
+import math
+
+import numpy as np
+import pytest
+
+from hailo_inference import MODEL_PATHS
+from hailo_results import EnsembleResults
+from hailo_rollup import FleetRollup, load_site_map, rollup_main, unit_id
+
+MODELS = ('apollo', 'gaia', 'boreas')
+
+
+class FakeClock:
+    def __init__(self, now=60000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def result(*confidences, error=None):
+    """diagnose()-style dict; a None confidence is a model without a result"""
+    models = {}
+    for name, confidence in zip(MODELS, confidences):
+        if confidence is not None:
+            models[name] = {'confidence': confidence, 'fault_detected': confidence > 0.5}
+    if error:
+        models[error] = {'error': 'boom'}
+    reported = [confidence for confidence in confidences if confidence is not None]
+    consensus = sum(confidence > 0.5 for confidence in reported) / len(reported) if reported else 0
+    return {'models': models, 'final': {'consensus': consensus}}
+
+
+def make_rollup(clock, **kwargs):
+    return FleetRollup(MODELS, site_map={'1': 'north', 2: 'north', 3: 'south'}, bucket_s=60, buckets=10,
+                       decay_s=300.0, clock=clock, **kwargs)
+
+
+def test_unit_id():
+    assert unit_id(12) == 12 and unit_id('12') == 12
+    for bad in ('AHU-1', None, 'twelve'):
+        with pytest.raises(ValueError):
+            unit_id(bad)
+
+
+def test_counts_verdicts_bands_and_errors():
+    clock = FakeClock()
+    rollup = make_rollup(clock)
+    rollup.observe(1, result(0.9, 0.8, 0.1))
+    rollup.observe(2, result(0.1, 0.4, None, error='boreas'))
+    rollup.observe(3, result(None, None, None))
+    summary = rollup.summary()
+    assert summary['sites'] == ['north', 'south']
+    assert summary['diagnoses'] == 3
+    assert summary['verdicts'] == {'unable': 1, 'normal': 1, 'watch': 1, 'fault': 0}
+    assert summary['models']['apollo']['bands'] == {'normal': 1, 'watch': 0, 'fault': 1}
+    assert summary['models']['gaia']['bands'] == {'normal': 0, 'watch': 1, 'fault': 1}
+    assert summary['models']['boreas']['errors'] == 1
+    assert sum(summary['models']['gaia']['histogram']) == 2
+    assert summary['units']['total'] == 3
+
+    north = rollup.summary(site='north')
+    assert north['diagnoses'] == 2 and north['sites'] == ['north']
+    assert 'error' in rollup.summary(site='west')
+
+
+def test_units_move_between_bands():
+    rollup = make_rollup(FakeClock())
+    rollup.observe(1, result(0.9, 0.9, 0.9))
+    assert rollup.summary()['units'] == {'unable': 0, 'normal': 0, 'watch': 0, 'fault': 1, 'total': 1}
+    rollup.observe(1, result(0.1, 0.1, 0.1))
+    summary = rollup.summary()
+    assert summary['units'] == {'unable': 0, 'normal': 1, 'watch': 0, 'fault': 0, 'total': 1}
+    assert summary['models']['apollo']['units'] == {'normal': 1, 'watch': 0, 'fault': 0}
+    # Both results still count towards the window
+    assert summary['diagnoses'] == 2
+
+
+def test_buckets_are_recycled_after_the_window():
+    clock = FakeClock()
+    rollup = make_rollup(clock)
+    rollup.observe(1, result(0.9, 0.9, 0.9))
+    clock.now += 120.0
+    rollup.observe(1, result(0.1, 0.1, 0.1))
+    assert rollup.summary()['diagnoses'] == 2
+    assert rollup.summary(window_s=60)['diagnoses'] == 1
+
+    # A full window after the first result its bucket is reused for a new period
+    clock.now += 480.0
+    rollup.observe(2, result(0.1, 0.1, 0.1))
+    summary = rollup.summary()
+    assert summary['diagnoses'] == 2
+    assert summary['verdicts'] == {'unable': 0, 'normal': 2, 'watch': 0, 'fault': 0}
+    assert summary['totals'] == {'unable': 0, 'normal': 2, 'watch': 0, 'fault': 1}
+
+
+def test_results_older_than_the_window_only_update_totals():
+    clock = FakeClock()
+    rollup = make_rollup(clock)
+    rollup.observe(1, result(0.9, 0.9, 0.9), timestamp=clock.now - 3600.0)
+    summary = rollup.summary()
+    assert summary['diagnoses'] == 0
+    assert summary['totals']['fault'] == 1
+    assert summary['units']['fault'] == 1
+
+
+def test_decayed_averages_match_brute_force():
+    clock = FakeClock()
+    rollup = make_rollup(clock)
+    observations = [(0.0, 0.9), (40.0, 0.2), (100.0, 0.7), (130.0, 0.4)]
+    start = clock.now
+    for offset, confidence in observations:
+        clock.now = start + offset
+        rollup.observe(1, result(confidence, 0.1, 0.1))
+    clock.now = start + 200.0
+
+    weights = [math.exp(-(200.0 - offset) / 300.0) for offset, _ in observations]
+    expected = sum(w * c for w, (_, c) in zip(weights, observations)) / sum(weights)
+    summary = rollup.summary()
+    assert summary['models']['apollo']['decayed_confidence'] == pytest.approx(expected, abs=1e-4)
+    assert summary['models']['gaia']['decayed_confidence'] == pytest.approx(0.1, abs=1e-4)
+
+
+def test_non_integer_ids_are_skipped(capsys):
+    rollup = make_rollup(FakeClock())
+    rollup.observe('AHU-1', result(0.9, 0.9, 0.9))
+    rollup.observe('3', result(0.1, 0.1, 0.1))
+    summary = rollup.summary()
+    assert summary['diagnoses'] == 1 and summary['sites'] == ['south']
+    assert 'Rollup skipped a result' in capsys.readouterr().err
+
+
+def test_observe_columnar_matches_observe():
+    outputs = {name: {'probs': np.array([0.9, 0.2, 0.6], dtype=np.float32), 'inference_time_ms': 1.0}
+               for name in MODELS}
+    results = EnsembleResults.from_model_outputs(MODELS, outputs, 3, 'simultaneous')
+    columnar, single = make_rollup(FakeClock()), make_rollup(FakeClock())
+    columnar.observe_columnar([1, 2, '3'], results)
+    for equipment_id, entry in zip([1, 2, 3], results):
+        single.observe(equipment_id, entry)
+    assert columnar.summary() == single.summary()
+    with pytest.raises(ValueError):
+        columnar.observe_columnar([1, 2], results)
+    with pytest.raises(ValueError):
+        columnar.observe_columnar([1, 2, 'AHU-3'], results)
+
+
+def test_snapshot_round_trip(tmp_path):
+    clock = FakeClock()
+    rollup = make_rollup(clock)
+    for offset, (equipment_id, confidences) in enumerate([(1, (0.9, 0.9, 0.1)), (2, (0.1, 0.4, 0.2)),
+                                                          (3, (0.6, None, 0.8)), (1, (0.2, 0.1, 0.1))]):
+        clock.now += 30.0 * offset
+        rollup.observe(equipment_id, result(*confidences))
+    path = str(tmp_path / 'rollup.npz')
+    rollup.save(path)
+
+    restored = make_rollup(clock)
+    assert restored.restore(path)
+    assert restored.summary() == rollup.summary()
+    assert restored.summary(site='south') == rollup.summary(site='south')
+
+    # Both keep moving units the same way after the restore
+    rollup.observe(1, result(0.9, 0.9, 0.9))
+    restored.observe(1, result(0.9, 0.9, 0.9))
+    assert restored.summary() == rollup.summary()
+
+
+def test_restore_rejects_missing_and_mismatched_snapshots(tmp_path):
+    path = str(tmp_path / 'rollup.npz')
+    rollup = make_rollup(FakeClock())
+    assert not rollup.restore(path)
+    rollup.observe(1, result(0.9, 0.9, 0.9))
+    rollup.save(path)
+    assert not FleetRollup(MODELS[:2], clock=FakeClock()).restore(path)
+    assert not FleetRollup(MODELS, bucket_s=30, clock=FakeClock()).restore(path)
+
+
+def test_stop_writes_a_final_snapshot(tmp_path):
+    path = str(tmp_path / 'rollup.npz')
+    rollup = make_rollup(FakeClock()).start(path, interval=3600.0)
+    rollup.observe(1, result(0.9, 0.9, 0.9))
+    rollup.stop()
+    restored = make_rollup(FakeClock())
+    assert restored.restore(path)
+    assert restored.summary()['diagnoses'] == 1
+
+
+def test_load_site_map(tmp_path):
+    path = tmp_path / 'sites.json'
+    path.write_text(json.dumps({'7': 'east', '8': 'west'}))
+    assert load_site_map(str(path)) == {7: 'east', 8: 'west'}
+    assert load_site_map(None) == {}
+
+
+def test_rollup_command(tmp_path, capsys):
+    path = str(tmp_path / 'rollup.npz')
+    with pytest.raises(SystemExit):
+        rollup_main(['--file', path])
+    assert 'No rollup snapshot' in json.loads(capsys.readouterr().out)['error']
+
+    rollup = FleetRollup(MODEL_PATHS.keys(), site_map={4: 'east'})
+    rollup.observe(4, {'models': {'apollo': {'confidence': 0.9}}, 'final': {'consensus': 1.0}})
+    rollup.save(path)
+    rollup_main(['--file', path, '--site', 'east'])
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['sites'] == ['east'] and summary['verdicts']['fault'] == 1
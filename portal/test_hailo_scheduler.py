@@ -0,0 +1,162 @@
+"""Tests for the per-model queue scheduler"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from hailo_scheduler import ModelScheduler
+
+
+class FakePipeline:
+    """Returns each row's sum; can hold its first call until released"""
+
+    def __init__(self, name, calls, hold=None, error=None):
+        self.name = name
+        self.calls = calls
+        self.hold = hold
+        self.error = error
+        self.entered = threading.Event()
+
+    def infer(self, batch):
+        self.calls.append((self.name, len(batch)))
+        self.entered.set()
+        if self.hold is not None:
+            self.hold.wait(5.0)
+        if self.error is not None:
+            raise self.error
+        return batch.sum(axis=1, keepdims=True)
+
+
+def batch(*values):
+    return np.array([[value] * 32 for value in values], dtype=np.float32)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+def start(calls, hold_first=True, **pipelines):
+    """Scheduler over models 'a', 'b', 'c' with one device worker; 'a' blocks until released"""
+    release = threading.Event()
+    names = {name: FakePipeline(name, calls) for name in 'abc'}
+    names['a'].hold = release if hold_first else None
+    names.update(pipelines)
+    scheduler = ModelScheduler(SimpleNamespace(manual_activation=True), names)
+    return scheduler, names, release
+
+
+def test_queued_requests_for_a_model_run_as_one_batch(calls):
+    scheduler, pipelines, release = start(calls)
+    first = scheduler.submit('a', batch(1))
+    assert pipelines['a'].entered.wait(5.0)
+    pipelines['a'].hold = None
+    queued = [scheduler.submit('a', batch(2, 3)), scheduler.submit('b', batch(4)), scheduler.submit('a', batch(5))]
+    assert scheduler.queue_depths() == {'a': 2, 'b': 1, 'c': 0}
+    release.set()
+
+    outputs = [future.result(5.0) for future in [first] + queued]
+    assert [output.ravel().tolist() for output, info in outputs] == [[32.0], [64.0, 96.0], [128.0], [160.0]]
+    # 'b' is next in round-robin order after 'a', then 'a' again with both queued requests at once
+    assert calls == [('a', 1), ('b', 1), ('a', 3)]
+    infos = [info for output, info in outputs]
+    assert [info['coalesced'] for info in infos] == [1, 2, 1, 2]
+    assert [info['queue_depth'] for info in infos] == [1, 1, 1, 2]
+    assert [info['switched'] for info in infos] == [True, True, True, True]
+
+    stats = scheduler.snapshot()
+    assert (stats['a']['requests'], stats['a']['batches'], stats['a']['switches']) == (3, 2, 2)
+    assert stats['a']['max_queue_depth'] == 2 and stats['a']['queue_depth'] == 0
+    scheduler.close()
+
+
+def test_back_to_back_batches_of_one_model_do_not_switch(calls):
+    scheduler, pipelines, release = start(calls, hold_first=False)
+    for value in range(3):
+        output, info = scheduler.submit('c', batch(value)).result(5.0)
+    assert not info['switched']
+    assert scheduler.snapshot()['c']['switches'] == 1
+    scheduler.close()
+
+
+def test_errors_fail_every_coalesced_request(calls):
+    scheduler, pipelines, release = start(calls, b=FakePipeline('b', calls, error=RuntimeError('device lost')))
+    scheduler.submit('a', batch(1))
+    assert pipelines['a'].entered.wait(5.0)
+    failed = [scheduler.submit('b', batch(1)), scheduler.submit('b', batch(2))]
+    release.set()
+    for future in failed:
+        with pytest.raises(RuntimeError, match='device lost'):
+            future.result(5.0)
+    scheduler.close()
+
+
+def test_submit_validates_model_and_state(calls):
+    scheduler, pipelines, release = start(calls, hold_first=False)
+    with pytest.raises(KeyError):
+        scheduler.submit('zeta', batch(1))
+    scheduler.close()
+    with pytest.raises(RuntimeError):
+        scheduler.submit('a', batch(1))
+
+
+def test_close_finishes_queued_requests(calls):
+    scheduler, pipelines, release = start(calls)
+    running = scheduler.submit('a', batch(1))
+    assert pipelines['a'].entered.wait(5.0)
+    queued = [scheduler.submit(name, batch(2)) for name in 'bc']
+    closer = threading.Thread(target=scheduler.close)
+    closer.start()
+    release.set()
+    closer.join(5.0)
+    assert not closer.is_alive()
+    assert all(future.done() and not future.exception() for future in [running] + queued)
+
+
+def test_one_worker_per_model_without_manual_activation(calls):
+    pipelines = {name: FakePipeline(name, calls) for name in 'ab'}
+    scheduler = ModelScheduler(SimpleNamespace(manual_activation=False), pipelines, order=['b', 'a', 'x'])
+    assert scheduler.order == ['b', 'a']
+    assert len(scheduler.workers) == 2
+    scheduler.close()
+
+
+def test_missing_pipeline_fails_the_request(calls):
+    scheduler = ModelScheduler(SimpleNamespace(manual_activation=True), {'a': None})
+    with pytest.raises(RuntimeError, match='Model not loaded'):
+        scheduler.submit('a', batch(1)).result(5.0)
+    scheduler.close()
+
+
+def test_cancelled_request_leaves_the_queue(calls):
+    scheduler, pipelines, release = start(calls)
+    scheduler.submit('a', batch(1))
+    assert pipelines['a'].entered.wait(5.0)
+    cancelled = scheduler.submit('b', batch(1))
+    kept = scheduler.submit('b', batch(2))
+    assert cancelled.cancel()
+    assert scheduler.queue_depths()['b'] == 1
+    release.set()
+    assert kept.result(5.0)[0].ravel().tolist() == [64.0]
+    assert calls == [('a', 1), ('b', 1)]
+    assert scheduler.snapshot()['b']['cancelled'] == 1
+    scheduler.close()
+
+
+def test_queue_latency_tracks_the_oldest_waiting_request(calls):
+    scheduler, pipelines, release = start(calls)
+    assert scheduler.queue_latency_ms() == 0.0
+    scheduler.submit('a', batch(1))
+    assert pipelines['a'].entered.wait(5.0)
+    # The running request no longer counts as queued
+    assert scheduler.queue_latency_ms() == 0.0
+    scheduler.submit('b', batch(1))
+    first = scheduler.queue_latency_ms()
+    time.sleep(0.02)
+    assert scheduler.queue_latency_ms() >= first + 15.0
+    release.set()
+    scheduler.close()
+    assert scheduler.queue_latency_ms() == 0.0
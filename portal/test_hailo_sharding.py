@@ -0,0 +1,149 @@
+"""Tests for sharded diagnostics against the unsharded reference"""
+
+import time
+
+import numpy as np
+import pytest
+
+from hailo_backends import SimulatedBackend
+from hailo_inference import MODEL_PATHS, HailoHVACDiagnostics
+from hailo_sharding import HashRing, ShardedDiagnostics
+
+WORKER_SPECS = [{'backend': 'simulated'}, {'backend': 'simulated'}]
+EQUIPMENT_IDS = list(range(100, 124))
+
+
+def readings(count):
+    rng = np.random.default_rng(7)
+    return [{'supply_air_temp': float(rng.uniform(40, 90)), 'return_air_temp': float(rng.uniform(60, 80)),
+             'supply_air_flow': float(rng.uniform(600, 1400))} for _ in range(count)]
+
+
+def confidences(result):
+    return {name: model.get('confidence') for name, model in result['models'].items()}
+
+
+def start_sharded(strategy):
+    diag = ShardedDiagnostics(workers=len(WORKER_SPECS), strategy=strategy, backend_specs=WORKER_SPECS)
+    assert diag.initialize()
+    return diag
+
+
+def wait_for_rebalance(diag, count=1, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while diag.rebalances < count:
+        assert time.monotonic() < deadline, 'worker death was not noticed'
+        time.sleep(0.01)
+
+
+@pytest.fixture(scope='module')
+def reference():
+    diag = HailoHVACDiagnostics(backend=SimulatedBackend(), load_policy='eager')
+    assert diag.initialize()
+    yield diag
+    diag.close()
+
+
+@pytest.fixture(scope='module', params=['equipment', 'models'])
+def sharded(request):
+    diag = start_sharded(request.param)
+    yield diag
+    diag.close()
+
+
+def test_hash_ring_removal_only_moves_the_removed_nodes_keys():
+    ring = HashRing([0, 1, 2])
+    before = {key: ring.lookup(key) for key in range(500)}
+    assert set(before.values()) == {0, 1, 2}
+    ring.remove(1)
+    after = {key: ring.lookup(key) for key in range(500)}
+    assert all(after[key] == owner for key, owner in before.items() if owner != 1)
+    assert set(after.values()) == {0, 2}
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'simultaneous', 'cascade'])
+def test_diagnose_matches_reference(sharded, reference, mode):
+    for equipment_id, reading in zip(EQUIPMENT_IDS[:4], readings(4)):
+        expected = reference.diagnose(reading, mode=mode, cascade_threshold=0.35, use_cache=False)
+        result = sharded.diagnose(reading, mode=mode, cascade_threshold=0.35, equipment_id=equipment_id)
+        assert confidences(result) == pytest.approx(confidences(expected), abs=1e-6)
+        assert result['final']['consensus'] == pytest.approx(expected['final']['consensus'])
+        assert result['final']['diagnosis'] == expected['final']['diagnosis']
+
+
+@pytest.mark.parametrize('routed', [False, True])
+def test_diagnose_batch_matches_reference(sharded, reference, routed):
+    batch = readings(len(EQUIPMENT_IDS))
+    expected = reference.diagnose_batch(batch, mode='simultaneous')
+    results = sharded.diagnose_batch(batch, mode='simultaneous', equipment_ids=EQUIPMENT_IDS if routed else None)
+    assert len(results) == len(expected)
+    for result, reference_result in zip(results, expected):
+        assert confidences(result) == pytest.approx(confidences(reference_result), abs=1e-6)
+        assert result['batch_size'] == len(batch)
+
+
+def test_equipment_rows_go_to_their_owner(reference):
+    diag = start_sharded('equipment')
+    try:
+        results = diag.diagnose_batch(readings(len(EQUIPMENT_IDS)), equipment_ids=EQUIPMENT_IDS)
+        owners = [diag.ring.lookup(equipment_id) for equipment_id in EQUIPMENT_IDS]
+        assert [result['shard'] for result in results] == owners
+        assert set(owners) == {0, 1}
+        single = diag.diagnose(readings(1)[0], equipment_id=EQUIPMENT_IDS[0], use_cache=False)
+        assert single['shard'] == owners[0]
+    finally:
+        diag.close()
+
+
+def test_models_are_dealt_across_workers():
+    diag = start_sharded('models')
+    try:
+        owners = {name: report['shard'] for name, report in diag.models.items()}
+        assert set(owners) == set(MODEL_PATHS)
+        assert sorted(list(owners.values()).count(index) for index in (0, 1)) == [4, 4]
+        assert all(diag.model_available(name) for name in MODEL_PATHS)
+    finally:
+        diag.close()
+
+
+def test_equipment_worker_death_rebalances(reference):
+    diag = start_sharded('equipment')
+    try:
+        owners = {equipment_id: diag.ring.lookup(equipment_id) for equipment_id in EQUIPMENT_IDS}
+        victim = diag.workers[owners[EQUIPMENT_IDS[0]]]
+        victim.process.kill()
+        wait_for_rebalance(diag)
+
+        survivor = 1 - victim.index
+        assert not victim.alive
+        assert all(diag.ring.lookup(equipment_id) == survivor for equipment_id in EQUIPMENT_IDS)
+        assert diag.get_device_status()['rebalances'] == 1
+
+        batch = readings(len(EQUIPMENT_IDS))
+        results = diag.diagnose_batch(batch, mode='simultaneous', equipment_ids=EQUIPMENT_IDS)
+        expected = reference.diagnose_batch(batch, mode='simultaneous')
+        assert {result['shard'] for result in results} == {survivor}
+        for result, reference_result in zip(results, expected):
+            assert confidences(result) == pytest.approx(confidences(reference_result), abs=1e-6)
+    finally:
+        diag.close()
+
+
+def test_models_worker_death_moves_models_to_survivor(reference):
+    diag = start_sharded('models')
+    try:
+        moved = sorted(name for name, owner in diag.model_owner.items() if owner == 0)
+        diag.workers[0].process.kill()
+        wait_for_rebalance(diag)
+
+        assert all(diag.model_owner[name] == 1 for name in MODEL_PATHS)
+        assert all(diag.model_available(name) for name in MODEL_PATHS)
+        assert moved and all(diag.models[name]['shard'] == 1 for name in moved)
+        assert all(diag.models[name]['loaded'] for name in moved)
+
+        reading = readings(1)[0]
+        result = diag.diagnose(reading, mode='simultaneous', use_cache=False)
+        expected = reference.diagnose(reading, mode='simultaneous', use_cache=False)
+        assert confidences(result) == pytest.approx(confidences(expected), abs=1e-6)
+    finally:
+        diag.close()
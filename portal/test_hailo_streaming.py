@@ -0,0 +1,107 @@
+"""Tests for rolling window statistics and the streaming diagnoser"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from hailo_features import FEATURE_INDEX, features_from_records
+from hailo_streaming import RollingWindow, StreamingDiagnoser
+
+SUPPLY = FEATURE_INDEX['supply_air_temp']
+
+
+class FakeDiagnostics:
+    """Records every batch it is asked to diagnose"""
+
+    def __init__(self):
+        self.batches = []
+
+    def diagnose_batch(self, input_batch, mode='simultaneous'):
+        self.batches.append((np.array(input_batch), mode))
+        return [{'supply_air_temp': float(row[SUPPLY])} for row in input_batch]
+
+
+def stream(count, seed=3):
+    rng = np.random.default_rng(seed)
+    timestamps = np.cumsum(rng.uniform(0.5, 1.5, size=count))
+    readings = [{'supply_air_temp': float(rng.normal(55, 5)), 'supply_air_flow': float(rng.normal(900, 50))}
+                for _ in range(count)]
+    return timestamps, readings
+
+
+@pytest.mark.parametrize('size', [2, 7, 16])
+def test_rolling_statistics_match_numpy(size):
+    timestamps, readings = stream(5 * size + 3)
+    window = RollingWindow(size)
+    rows = features_from_records(readings).astype(np.float64)
+    for index, (timestamp, reading) in enumerate(zip(timestamps, readings)):
+        window.push(timestamp, reading)
+        start = max(0, index + 1 - size)
+        values, times = rows[start:index + 1], timestamps[start:index + 1]
+        assert window.count == len(values)
+        assert np.array_equal(window.rows(), values.astype(np.float32))
+        assert window.mean() == pytest.approx(values.mean(axis=0), rel=1e-9, abs=1e-6)
+        assert window.variance() == pytest.approx(values.var(axis=0), rel=1e-6, abs=1e-3)
+        if len(values) >= 2:
+            span = times[-1] - times[0]
+            expected = np.polyfit(np.arange(len(values)), values, 1)[0] / (span / (len(values) - 1))
+            assert window.slope() == pytest.approx(expected, rel=1e-6, abs=1e-6)
+            assert window.span_seconds() == pytest.approx(span)
+        else:
+            assert not window.slope().any()
+
+
+def test_rolling_window_rejects_tiny_size():
+    with pytest.raises(ValueError):
+        RollingWindow(1)
+
+
+def test_summary_reports_schema_features():
+    window = RollingWindow(4)
+    for step in range(4):
+        window.push(float(step), {'supply_air_temp': 50.0 + 2.0 * step})
+    summary = window.summary()
+    assert summary['supply_air_temp']['mean'] == pytest.approx(53.0)
+    assert summary['supply_air_temp']['slope_per_s'] == pytest.approx(2.0)
+    assert summary['return_air_temp'] == {'mean': 22.0, 'variance': 0.0, 'slope_per_s': 0.0}
+
+
+def test_diagnoser_emits_on_stride_after_min_samples():
+    diag = FakeDiagnostics()
+    streamer = StreamingDiagnoser(diag, window=5, stride=2, min_samples=4)
+    records = [(7, float(step), {'supply_air_temp': float(step)}) for step in range(8)]
+    results = list(streamer.process(records))
+    assert [result['timestamp'] for result in results] == [3.0, 5.0, 7.0]
+    assert [result['supply_air_temp'] for result in results] == [3.0, 5.0, 7.0]
+    assert all(result['equipment_id'] == 7 for result in results)
+    assert [result['window']['samples'] for result in results] == [4, 5, 5]
+    assert results[-1]['window']['rolling']['supply_air_temp']['mean'] == pytest.approx(5.0)
+
+
+def test_diagnoser_keeps_units_apart_and_batches():
+    diag = FakeDiagnostics()
+    streamer = StreamingDiagnoser(diag, window=4, stride=2, batch_size=2)
+    records = [(unit, float(step), {'supply_air_temp': unit * 100.0 + step})
+               for step in range(4) for unit in (1, 2)]
+    results = list(streamer.process(records))
+    assert [(result['equipment_id'], result['supply_air_temp']) for result in results] == [
+        (1, 101.0), (2, 201.0), (1, 103.0), (2, 203.0)]
+    assert [len(batch) for batch, mode in diag.batches] == [2, 2]
+    assert all(mode == 'simultaneous' for batch, mode in diag.batches)
+
+
+def test_aprocess_matches_process():
+    records = [(unit, float(step), {'supply_air_temp': unit + step * 0.5}) for step in range(12) for unit in (1, 2, 3)]
+
+    async def source():
+        for record in records:
+            yield record
+
+    async def collect(streamer):
+        return [result async for result in streamer.aprocess(source())]
+
+    expected = list(StreamingDiagnoser(FakeDiagnostics(), window=6, stride=3, batch_size=4).process(records))
+    results = asyncio.run(collect(StreamingDiagnoser(FakeDiagnostics(), window=6, stride=3, batch_size=4)))
+    assert [(r['equipment_id'], r['timestamp']) for r in results] == [(r['equipment_id'], r['timestamp'])
+                                                                       for r in expected]
@@ -0,0 +1,201 @@
+"""Tests for the telemetry collector and the `status` command's file fallback"""
+
+import json
+import sys
+import threading
+
+import pytest
+
+import hailo_inference
+import hailo_telemetry
+from hailo_telemetry import MAX_TOPS, TelemetryCollector, TelemetrySource, read_status_file, sample_status
+
+
+class FakeSource(TelemetrySource):
+    """Scripted probes that count how often each one is called"""
+
+    def __init__(self, device='Hailo-8 Test', power=1.25, temperature=48.5, running=False):
+        self.device = device
+        self.power = power
+        self.temperature = temperature
+        self.running = running
+        self.calls = {'identify': 0, 'measure_power': 0}
+
+    def identify(self):
+        self.calls['identify'] += 1
+        if isinstance(self.device, Exception):
+            raise self.device
+        return self.device
+
+    def measure_power(self):
+        self.calls['measure_power'] += 1
+        return self.power
+
+    def read_temperature(self):
+        return self.temperature
+
+    def inference_running(self):
+        return self.running
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_sample_status():
+    status = sample_status(FakeSource())
+    assert status == {'online': True, 'device': 'Hailo-8 Test', 'temperature': 48.5, 'power': 1.25,
+                      'utilization': 50, 'tops': 13.0, 'max_tops': MAX_TOPS}
+
+
+def test_sample_status_offline():
+    assert sample_status(FakeSource(device=None)) == {'online': False, 'error': 'Device not detected'}
+
+
+def test_sample_status_running_floor():
+    status = sample_status(FakeSource(power=None, running=True))
+    assert (status['power'], status['utilization'], status['tops']) == (None, 15, 3.9)
+
+
+def test_collector_caches_identity():
+    source, clock = FakeSource(), FakeClock()
+    collector = TelemetryCollector(source, identify_interval=300.0, clock=clock)
+    for _ in range(3):
+        collector.sample_once()
+        clock.now += 5.0
+    assert source.calls == {'identify': 1, 'measure_power': 3}
+    clock.now += 300.0
+    collector.sample_once()
+    assert source.calls['identify'] == 2
+
+
+def test_collector_probe_failure_goes_offline():
+    source = FakeSource(device=RuntimeError('hailortcli missing'))
+    collector = TelemetryCollector(source, clock=FakeClock())
+    assert collector.sample_once() == {'online': False, 'error': 'hailortcli missing', 'sampled_at': 1000.0}
+    assert collector.device_name is None
+
+
+def test_snapshot_averages_recent_samples():
+    clock = FakeClock()
+    source = FakeSource(power=1.0)
+    collector = TelemetryCollector(source, window_seconds=60.0, clock=clock)
+    assert collector.snapshot() == {'online': False, 'error': 'No telemetry collected yet'}
+    collector.sample_once()
+    clock.now += 90.0
+    source.power = 2.0
+    collector.sample_once()
+    clock.now += 10.0
+    source.power = 1.5
+    collector.sample_once()
+    clock.now += 2.0
+
+    snapshot = collector.snapshot()
+    assert snapshot['power'] == 1.5
+    assert snapshot['age_s'] == 2.0
+    # The first sample is outside the window
+    assert snapshot['averages']['samples'] == 2
+    assert snapshot['averages']['power'] == 1.75
+    assert snapshot['averages']['temperature'] == 48.5
+
+
+def test_status_file_round_trip(tmp_path):
+    path = tmp_path / 'status.json'
+    collector = TelemetryCollector(FakeSource(), status_file=str(path))
+    collector.sample_once()
+    status = read_status_file(str(path))
+    assert status['online'] and status['device'] == 'Hailo-8 Test'
+    assert status['age_s'] < 5.0
+
+
+def test_read_status_file_rejects_stale_and_missing(tmp_path):
+    path = tmp_path / 'status.json'
+    assert read_status_file(str(path)) is None
+    path.write_text(json.dumps({'online': True, 'sampled_at': 0}))
+    assert read_status_file(str(path)) is None
+    path.write_text('not json')
+    assert read_status_file(str(path)) is None
+
+
+def run_status_command(monkeypatch, capsys, status_file, source):
+    monkeypatch.setattr(hailo_telemetry, 'STATUS_FILE', str(status_file))
+    monkeypatch.setattr(hailo_telemetry, 'HailortcliSource', lambda: source)
+    monkeypatch.setattr(sys, 'argv', ['hailo_inference.py', 'status'])
+    hailo_inference.main()
+    return json.loads(capsys.readouterr().out)
+
+
+def test_status_command_prefers_status_file(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'status.json'
+    TelemetryCollector(FakeSource(device='From Collector'), status_file=str(path)).sample_once()
+    source = FakeSource(device='From Probe')
+    status = run_status_command(monkeypatch, capsys, path, source)
+    assert status['device'] == 'From Collector'
+    assert source.calls['identify'] == 0
+
+
+def test_status_command_falls_back_to_sampling(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'status.json'
+    path.write_text(json.dumps({'online': True, 'device': 'Stale', 'sampled_at': 0}))
+    status = run_status_command(monkeypatch, capsys, path, FakeSource(device='From Probe'))
+    assert status['device'] == 'From Probe'
+    assert 'age_s' not in status
+
+
+def test_status_command_reports_probe_errors(tmp_path, monkeypatch, capsys):
+    status = run_status_command(monkeypatch, capsys, tmp_path / 'missing.json',
+                                FakeSource(device=OSError('hailortcli not found')))
+    assert status == {'online': False, 'error': 'hailortcli not found'}
+
+
+def test_status_command_without_probing(tmp_path, monkeypatch, capsys):
+    source = FakeSource()
+    monkeypatch.setattr(hailo_telemetry, 'HailortcliSource', lambda: source)
+    path = tmp_path / 'status.json'
+    hailo_telemetry.status_main(['--status-file', str(path), '--no-probe'])
+    status = json.loads(capsys.readouterr().out)
+    assert not status['online'] and 'No telemetry collector running' in status['error']
+    assert source.calls['identify'] == 0
+
+    TelemetryCollector(FakeSource(device='From Collector'), status_file=str(path)).sample_once()
+    hailo_telemetry.status_main(['--status-file', str(path), '--no-probe', '--max-age', '60'])
+    assert json.loads(capsys.readouterr().out)['device'] == 'From Collector'
+
+
+def test_stop_joins_the_sampling_thread():
+    source = FakeSource()
+    sampled = threading.Event()
+    collector = TelemetryCollector(source, interval=3600.0)
+    original = collector.sample_once
+
+    def sample_once():
+        status = original()
+        sampled.set()
+        return status
+
+    collector.sample_once = sample_once
+    collector.start()
+    assert sampled.wait(5.0)
+    thread = collector.thread
+    collector.stop()
+    assert collector.thread is None
+    assert not thread.is_alive()
+    assert source.calls['measure_power'] == 1
+    # Stopping twice is harmless and the collector can be restarted
+    collector.stop()
+    sampled.clear()
+    collector.start()
+    assert sampled.wait(5.0)
+    collector.stop()
+
+
+@pytest.mark.parametrize('interval', [0.0, 0.01])
+def test_stop_with_short_interval(interval):
+    collector = TelemetryCollector(FakeSource(), interval=interval)
+    collector.start()
+    collector.stop()
+    assert collector.thread is None
@@ -0,0 +1,103 @@
+"""Tests for the binary frame protocol"""
+
+import io
+import math
+import struct
+
+import numpy as np
+import pytest
+
+from hailo_wire import (LENGTH_PREFIX, MAX_FRAME_BYTES, REQUEST_HEADER, decode_request, decode_response,
+                        encode_error, encode_request, encode_response, read_frame)
+
+
+def rows(count):
+    return np.random.default_rng(4).uniform(-50, 1500, size=(count, 32)).astype(np.float32)
+
+
+def request_frame(*args, **kwargs):
+    header, payload = encode_request(*args, **kwargs)
+    return read_frame(io.BytesIO(header + bytes(payload)))
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'simultaneous', 'cascade'])
+def test_request_round_trip(mode):
+    batch = rows(3)
+    request_id, decoded_mode, threshold, decoded = decode_request(request_frame(42, batch, mode, 0.25))
+    assert (request_id, decoded_mode, threshold) == (42, mode, 0.25)
+    assert np.array_equal(decoded, batch)
+
+
+def test_request_without_threshold_or_rows():
+    request_id, mode, threshold, decoded = decode_request(request_frame(7, np.empty((0, 32), dtype=np.float32)))
+    assert (request_id, mode, threshold) == (7, 'simultaneous', None)
+    assert decoded.shape == (0, 32)
+
+
+def test_decoded_rows_view_the_frame():
+    frame = request_frame(1, rows(2))
+    decoded = decode_request(frame)[3]
+    frame[REQUEST_HEADER.size:REQUEST_HEADER.size + 4] = struct.pack('<f', 123.5)
+    assert decoded[0, 0] == 123.5
+
+
+def test_encode_request_rejects_wrong_width():
+    with pytest.raises(ValueError):
+        encode_request(1, np.zeros((2, 31), dtype=np.float32))
+
+
+def test_response_round_trip():
+    confidences = np.array([[0.1, math.nan], [0.9, 0.4]], dtype=np.float32)
+    consensus = np.array([0.1, 0.65], dtype=np.float32)
+    response = decode_response(read_frame(io.BytesIO(encode_response(9, confidences, consensus))))
+    assert response['id'] == 9
+    assert np.array_equal(response['confidences'], confidences, equal_nan=True)
+    assert np.array_equal(response['consensus'], consensus)
+
+
+def test_error_round_trip():
+    response = decode_response(read_frame(io.BytesIO(encode_error(3, 'Model failed: ✗'))))
+    assert response == {'id': 3, 'error': 'Model failed: ✗'}
+
+
+def test_read_frame_eof_and_consecutive_frames():
+    stream = io.BytesIO(encode_error(1, 'a') + encode_error(2, 'b'))
+    assert decode_response(read_frame(stream))['id'] == 1
+    assert decode_response(read_frame(stream))['id'] == 2
+    assert read_frame(stream) is None
+
+
+@pytest.mark.parametrize('data', [b'\x01\x00', LENGTH_PREFIX.pack(10) + b'short'])
+def test_read_frame_rejects_truncation(data):
+    with pytest.raises(ValueError, match='Truncated'):
+        read_frame(io.BytesIO(data))
+
+
+def test_read_frame_rejects_oversized_prefix():
+    with pytest.raises(ValueError, match='limit'):
+        read_frame(io.BytesIO(LENGTH_PREFIX.pack(MAX_FRAME_BYTES + 1)))
+
+
+def corrupt(frame, offset, value):
+    frame = bytearray(frame)
+    frame[offset:offset + len(value)] = value
+    return frame
+
+
+@pytest.mark.parametrize('mutate, message', [
+    (lambda frame: frame[:10], 'shorter'),
+    (lambda frame: corrupt(frame, 0, b'XX'), 'Not an inference request'),
+    (lambda frame: corrupt(frame, 2, b'\x09'), 'version'),
+    (lambda frame: corrupt(frame, 12, struct.pack('<H', 31)), 'features'),
+    (lambda frame: corrupt(frame, 14, b'\x07'), 'mode'),
+    (lambda frame: frame[:-4], 'row count'),
+    (lambda frame: corrupt(frame, 8, struct.pack('<I', 3)), 'row count'),
+])
+def test_decode_request_rejects_malformed_frames(mutate, message):
+    with pytest.raises(ValueError, match=message):
+        decode_request(mutate(request_frame(1, rows(2))))
+
+
+def test_decode_response_rejects_requests():
+    with pytest.raises(ValueError):
+        decode_response(request_frame(1, rows(1)))